@@ -2,7 +2,7 @@ from math import radians
 
 import matplotlib.pyplot as plt
 
-from crop_irradiance.uniform_crops import inputs, params, shoot
+from crop_irradiance.uniform_crops import params, shoot
 
 
 def generate_plots(
@@ -203,32 +203,19 @@ if __name__ == "__main__":
     incident_direct_par = hourly_direct_par[hour]
     incident_diffuse_par = hourly_diffuse_par[hour]
 
-    common_inputs = dict(
+    # the coefficients of the canopy are calculated once for both shoots, as params share leaf and sky attributes
+    canopies = shoot.calc_joint_shoots(
         leaf_layers={0: 1, 1: 1, 2: 1, 3: 1},
         incident_direct_irradiance=incident_direct_par,
         incident_diffuse_irradiance=incident_diffuse_par,
         solar_inclination=radians(solar_inclination[hour]),
+        lumped_params=params_lumped,
+        sunlit_shaded_params=params_sunlit_shaded,
     )
 
-    inputs_lumped = inputs.LumpedInputs(model="de_pury", **common_inputs)
-    params_lumped.update(inputs_lumped)
-    canopy_lumped = shoot.Shoot(
-        leaves_category="lumped", inputs=inputs_lumped, params=params_lumped
-    )
-    canopy_lumped.calc_absorbed_irradiance()
-
-    inputs_sunlit_shaded = inputs.SunlitShadedInputs(**common_inputs)
-    params_sunlit_shaded.update(inputs_sunlit_shaded)
-    canopy_sunlit_shaded = shoot.Shoot(
-        leaves_category="sunlit-shaded",
-        inputs=inputs_sunlit_shaded,
-        params=params_sunlit_shaded,
-    )
-    canopy_sunlit_shaded.calc_absorbed_irradiance()
-
     generate_plots(
         incident_direct_irradiance=incident_direct_par,
         incident_diffuse_irradiance=incident_diffuse_par,
-        lumped_canopy=canopy_lumped,
-        sunlit_shaded_canopy=canopy_sunlit_shaded,
+        lumped_canopy=canopies["lumped"],
+        sunlit_shaded_canopy=canopies["sunlit-shaded"],
     )
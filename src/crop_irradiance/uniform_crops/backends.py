@@ -0,0 +1,524 @@
+"""Registry of the compute backends of params, shoots and batches of timesteps.
+
+The backends give identical results (up to floating point rounding) through different implementations:
+
+    'python'  the reference implementation, evaluating leaf layers one by one with the functions of
+              :mod:`lumped_leaves` and :mod:`sunlit_shaded_leaves`
+    'numpy'   the vectorized implementation of :mod:`crop_irradiance.uniform_crops.vectorized`, evaluating all leaf
+              layers (and timesteps) at once
+    'jit'     the fused per-layer kernels of :mod:`kernels`, compiled by Numba when it is installed
+
+The backend of a call is, by order of precedence, that given by its `backend` argument, that selected by
+:func:`set_backend`, that named by the environment variable :data:`BACKEND_ENVIRONMENT_VARIABLE`, or else the default
+backend of the calling API ('python' for params and shoots, 'numpy' for batches). Other backends may be added with
+:func:`register_backend`.
+"""
+
+import os
+from contextlib import contextmanager
+
+from crop_irradiance.uniform_crops.formalisms import kernels, sunlit_shaded_leaves
+
+BACKEND_ENVIRONMENT_VARIABLE = "CROP_IRRADIANCE_BACKEND"
+
+DEFAULT_BACKEND = "python"
+
+# names of the batch results that all backends return, besides the absorbed irradiance categories
+BATCH_RESULTS_NAMES = (
+    "transmitted_irradiance",
+    "reflected_irradiance",
+    "soil_absorbed_irradiance",
+)
+
+SUNLIT_SHADED_BATCH_RESULTS_NAMES = BATCH_RESULTS_NAMES + (
+    "sunlit_fraction",
+    "shaded_fraction",
+    "abs_direct_by_sunlit",
+    "abs_diffuse_by_sunlit",
+    "abs_scattered_by_sunlit",
+    "abs_diffuse_by_shaded",
+    "abs_scattered_by_shaded",
+)
+
+# outputs that callers may ask for, the absorbed irradiance of leaf layers being either their total, its split among
+#   sunlit and shaded leaves, or the five components of the latter
+OUTPUTS_NAMES = (
+    "total",
+    "sunlit_shaded",
+    "components",
+    "sunlit_fraction",
+    "canopy_budget",
+)
+
+DEFAULT_OUTPUTS = ("sunlit_shaded", "components", "sunlit_fraction", "canopy_budget")
+
+_backends = {}
+_selected_backend_name = None
+
+
+def check_outputs(outputs: tuple or str = None) -> tuple:
+    """Returns the names of the outputs asked for by a call.
+
+    Args:
+        outputs: one or several names of :data:`OUTPUTS_NAMES`, or None for :data:`DEFAULT_OUTPUTS`
+
+    Returns:
+        The tuple of the names of the outputs
+    """
+    if outputs is None:
+        return DEFAULT_OUTPUTS
+    if isinstance(outputs, str):
+        outputs = (outputs,)
+    outputs = tuple(outputs)
+    for name in outputs:
+        assert name in OUTPUTS_NAMES, f"Unknown output: {name}"
+    return outputs
+
+
+def get_batch_results_names(
+    leaves_category: str, outputs: tuple or str = None
+) -> tuple:
+    """Returns the names of the batch results of the outputs asked for by a call.
+
+    Args:
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        outputs: see :func:`check_outputs`
+
+    Returns:
+        The names of the results having a leaf layers axis, and those of the results of the whole canopy
+
+    Notes:
+        The absorbed irradiance by lumped leaves ('lumped') is returned whenever any of the 'total', 'sunlit_shaded'
+            and 'components' outputs is asked for, lumped leaves having neither sunlit fraction nor components.
+    """
+    outputs = check_outputs(outputs)
+    if leaves_category == "sunlit-shaded":
+        layers_names = ()
+        if "total" in outputs:
+            layers_names += ("total",)
+        if "sunlit_shaded" in outputs:
+            layers_names += ("sunlit", "shaded")
+        if "sunlit_fraction" in outputs:
+            layers_names += ("sunlit_fraction", "shaded_fraction")
+        if "components" in outputs:
+            layers_names += SUNLIT_SHADED_BATCH_RESULTS_NAMES[-5:]
+    elif {"total", "sunlit_shaded", "components"}.intersection(outputs):
+        layers_names = ("lumped",)
+    else:
+        layers_names = ()
+    canopy_names = BATCH_RESULTS_NAMES if "canopy_budget" in outputs else ()
+    return layers_names, canopy_names
+
+
+class PythonBackend:
+    """Reference backend, evaluating leaf layers one by one with the scalar formalisms."""
+
+    def update_params(self, params, inputs):
+        """Sets the extinction and reflection coefficients of `params` (see `SunlitShadedParams.update`)."""
+        params.direct_black_extinction_coefficient = (
+            sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
+                solar_inclination=inputs.solar_inclination,
+                leaf_angle_distribution_factor=params.leaf_angle_distribution_factor,
+                clumping_factor=params.clumping_factor,
+                leaf_angle_distribution=params.leaf_angle_distribution,
+            )
+        )
+
+        params.direct_extinction_coefficient = (
+            sunlit_shaded_leaves.calc_direct_extinction_coefficient(
+                solar_inclination=inputs.solar_inclination,
+                leaf_scattering_coefficient=params.leaf_scattering_coefficient,
+                leaf_angle_distribution_factor=params.leaf_angle_distribution_factor,
+                clumping_factor=params.clumping_factor,
+                leaf_angle_distribution=params.leaf_angle_distribution,
+            )
+        )
+
+        params.diffuse_extinction_coefficient = (
+            sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
+                leaf_area_index=sum(inputs.leaf_layers.values()),
+                leaf_angle_distribution_factor=params.leaf_angle_distribution_factor,
+                clumping_factor=params.clumping_factor,
+                leaf_scattering_coefficient=params.leaf_scattering_coefficient,
+                sky_sectors_number=params.sky_sectors_number,
+                sky_type=params.sky_type,
+                leaf_angle_distribution=params.leaf_angle_distribution,
+            )[0]
+        )
+
+        params.canopy_reflectance_to_direct_irradiance = sunlit_shaded_leaves.calc_canopy_reflectance_to_direct_irradiance(
+            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
+            leaf_scattering_coefficient=params.leaf_scattering_coefficient,
+        )
+
+    def calc_layers_absorbed_irradiance(
+        self, shoot, outputs: tuple = None, layer_indexes: list = None
+    ):
+        """Sets the absorbed irradiance attributes of the leaf layers of `shoot` (see `Shoot.calc_absorbed_irradiance`).
+
+        Only the layers of `layer_indexes` (ordered from the top to the bottom of the canopy) are evaluated, or all
+            layers if it is None. Sunlit-shaded leaf layers calculating their attributes on first access, `outputs`
+            needs not be used.
+        """
+        if layer_indexes is None:
+            layer_indexes = shoot._leaf_layer_indexes
+        for index in layer_indexes:
+            shoot[index].calc_absorbed_irradiance(shoot.inputs, shoot.canopy_optics)
+
+    def calc_batch_absorbed_irradiance(
+        self,
+        leaves_category: str,
+        leaf_layers: dict,
+        params,
+        outputs: tuple = None,
+        out: dict = None,
+        **forcing,
+    ) -> dict:
+        """Evaluates one shoot per timestep (see :func:`calc_batch_absorbed_irradiance`)."""
+        import numpy
+
+        from crop_irradiance.uniform_crops.inputs import (
+            LumpedInputs,
+            SunlitShadedInputs,
+        )
+        from crop_irradiance.uniform_crops.params import calc_canopy_optics
+        from crop_irradiance.uniform_crops.shoot import Shoot
+
+        forcing = dict(
+            zip(
+                forcing,
+                numpy.broadcast_arrays(
+                    *(numpy.asarray(value, dtype=float) for value in forcing.values())
+                ),
+            )
+        )
+        shape = next(iter(forcing.values())).shape if forcing else ()
+        layers_names, canopy_names = get_batch_results_names(leaves_category, outputs)
+        layers_shape = shape + (len(leaf_layers),)
+        out = out or {}
+        results = {
+            name: out[name] if name in out else numpy.empty(layers_shape)
+            for name in layers_names
+        }
+        results.update(
+            (name, out[name] if name in out else numpy.empty(shape))
+            for name in canopy_names
+        )
+
+        for position in numpy.ndindex(shape):
+            values = {name: float(value[position]) for name, value in forcing.items()}
+            if leaves_category == "sunlit-shaded":
+                inputs = SunlitShadedInputs(leaf_layers=leaf_layers, **values)
+            else:
+                inputs = LumpedInputs(
+                    model=params.model, leaf_layers=leaf_layers, **values
+                )
+            optics = None
+            if getattr(params, "model", None) != "beer":
+                optics = calc_canopy_optics(
+                    params,
+                    inputs.solar_inclination,
+                    sum(leaf_layers.values()),
+                    backend=self.name,
+                )
+            shoot = Shoot(leaves_category, inputs, params, optics)
+            shoot.calc_absorbed_irradiance(backend=self.name, outputs=outputs)
+
+            for name in canopy_names:
+                results[name][position] = getattr(shoot, name)
+            for layer_position, layer in enumerate(shoot.values()):
+                for name in layers_names:
+                    if name == "total":
+                        value = sum(layer.absorbed_irradiance.values())
+                    elif name in ("lumped", "sunlit", "shaded"):
+                        value = layer.absorbed_irradiance[name]
+                    else:
+                        value = getattr(layer, name)
+                    results[name][position + (layer_position,)] = value
+        return results
+
+
+class NumpyBackend(PythonBackend):
+    """Vectorized backend, evaluating all leaf layers (and timesteps) at once."""
+
+    def update_params(self, params, inputs):
+        from crop_irradiance.uniform_crops import vectorized
+
+        coefficients = vectorized.calc_sunlit_shaded_coefficients(
+            solar_inclination=inputs.solar_inclination,
+            leaf_area_index=sum(inputs.leaf_layers.values()),
+            params=params,
+        )
+        for name in (
+            "direct_black_extinction_coefficient",
+            "direct_extinction_coefficient",
+            "diffuse_extinction_coefficient",
+            "canopy_reflectance_to_direct_irradiance",
+        ):
+            setattr(params, name, float(coefficients[name]))
+
+    def calc_layers_absorbed_irradiance(
+        self, shoot, outputs: tuple = None, layer_indexes: list = None
+    ):
+        if layer_indexes is not None:
+            # layers are evaluated one by one, at a cost proportional to their number rather than to that of the profile
+            super().calc_layers_absorbed_irradiance(shoot, outputs, layer_indexes)
+            return
+        inputs = shoot.inputs
+        forcing = {
+            name: getattr(inputs, name)
+            for name in (
+                "incident_irradiance",
+                "incident_direct_irradiance",
+                "incident_diffuse_irradiance",
+                "solar_inclination",
+            )
+            if hasattr(inputs, name)
+        }
+        if shoot.optics is not None:
+            # coefficients are calculated from params at the solar inclination of the optics, which may be shared by
+            #   shoots of similar solar inclinations
+            forcing["solar_inclination"] = shoot.optics.solar_inclination
+        results = self.calc_batch_absorbed_irradiance(
+            shoot.leaves_category,
+            inputs.leaf_layers,
+            shoot.params,
+            outputs=_get_layers_outputs(shoot.leaves_category, outputs),
+            **forcing,
+        )
+        for position, index in enumerate(shoot._leaf_layer_indexes):
+            layer = shoot[index]
+            layer.absorbed_irradiance = {
+                category: float(results[category][position])
+                for category in ("lumped", "sunlit", "shaded")
+                if category in results
+            }
+            for name in layer.absorbed_irradiance_attributes[1:]:
+                setattr(
+                    layer,
+                    name,
+                    float(results[name][position]) if name in results else None,
+                )
+
+    def calc_batch_absorbed_irradiance(
+        self,
+        leaves_category: str,
+        leaf_layers: dict,
+        params,
+        outputs: tuple = None,
+        out: dict = None,
+        **forcing,
+    ) -> dict:
+        from crop_irradiance.uniform_crops import vectorized
+
+        if leaves_category == "sunlit-shaded":
+            return vectorized.calc_sunlit_shaded_absorbed_irradiance(
+                leaf_layers, params=params, outputs=outputs, out=out, **forcing
+            )
+        return vectorized.calc_lumped_absorbed_irradiance(
+            leaf_layers, params=params, outputs=outputs, out=out, **forcing
+        )
+
+
+class JitBackend(PythonBackend):
+    """Backend evaluating leaf layers one by one with the fused kernels of :mod:`kernels`."""
+
+    def calc_layers_absorbed_irradiance(
+        self, shoot, outputs: tuple = None, layer_indexes: list = None
+    ):
+        inputs, params = shoot.inputs, shoot.canopy_optics
+        if layer_indexes is None:
+            layer_indexes = shoot._leaf_layer_indexes
+        layers = [shoot[index] for index in layer_indexes]
+        outputs = check_outputs(outputs)
+        if not {"total", "sunlit_shaded", "components"}.intersection(outputs):
+            # the sunlit fraction and the canopy budget are calculated by shoots themselves
+            if shoot.leaves_category == "sunlit-shaded":
+                for layer in layers:
+                    for name in layer.absorbed_irradiance_attributes:
+                        setattr(layer, name, None)
+            return
+        if shoot.leaves_category == "sunlit-shaded":
+            coefficients = (
+                params.leaf_scattering_coefficient,
+                params.canopy_reflectance_to_direct_irradiance,
+                params.canopy_reflectance_to_diffuse_irradiance,
+                params.direct_extinction_coefficient,
+                params.direct_black_extinction_coefficient,
+                params.diffuse_extinction_coefficient,
+            )
+            if "components" in outputs:
+                kernel = kernels.get_kernel("sunlit_shaded")
+                for layer in layers:
+                    (
+                        _,
+                        layer.abs_direct_by_sunlit,
+                        layer.abs_diffuse_by_sunlit,
+                        layer.abs_scattered_by_sunlit,
+                        layer.abs_diffuse_by_shaded,
+                        layer.abs_scattered_by_shaded,
+                    ) = kernel(
+                        inputs.incident_direct_irradiance,
+                        inputs.incident_diffuse_irradiance,
+                        layer.upper_cumulative_leaf_area_index,
+                        layer.thickness,
+                        *coefficients,
+                    )
+                    layer.absorbed_irradiance = {
+                        "sunlit": layer.abs_direct_by_sunlit
+                        + layer.abs_diffuse_by_sunlit
+                        + layer.abs_scattered_by_sunlit,
+                        "shaded": layer.abs_diffuse_by_shaded
+                        + layer.abs_scattered_by_shaded,
+                    }
+                return
+            kernel = kernels.get_kernel("sunlit_shaded_totals")
+            for layer in layers:
+                sunlit, shaded = kernel(
+                    inputs.incident_direct_irradiance,
+                    inputs.incident_diffuse_irradiance,
+                    layer.upper_cumulative_leaf_area_index,
+                    layer.thickness,
+                    *coefficients,
+                )
+                layer.absorbed_irradiance = {"sunlit": sunlit, "shaded": shaded}
+                for name in layer.absorbed_irradiance_attributes[1:]:
+                    setattr(layer, name, None)
+        elif params.model == "beer":
+            kernel = kernels.get_kernel("beer")
+            for layer in layers:
+                layer.absorbed_irradiance["lumped"] = kernel(
+                    inputs.incident_irradiance,
+                    params.extinction_coefficient,
+                    layer.upper_cumulative_leaf_area_index,
+                    layer.thickness,
+                )
+        else:
+            kernel = kernels.get_kernel("de_pury")
+            for layer in layers:
+                layer.absorbed_irradiance["lumped"] = kernel(
+                    inputs.incident_direct_irradiance,
+                    inputs.incident_diffuse_irradiance,
+                    layer.upper_cumulative_leaf_area_index,
+                    layer.thickness,
+                    params.direct_extinction_coefficient,
+                    params.diffuse_extinction_coefficient,
+                    params.canopy_reflectance_to_direct_irradiance,
+                    params.canopy_reflectance_to_diffuse_irradiance,
+                )
+
+
+def _get_layers_outputs(leaves_category: str, outputs: tuple = None) -> tuple:
+    """Returns the batch outputs from which the absorbed irradiance attributes of leaf layers are set, the sunlit
+    fraction and canopy budget being calculated by shoots themselves."""
+    outputs = check_outputs(outputs)
+    if leaves_category == "sunlit-shaded":
+        return tuple(
+            name
+            for name in ("sunlit_shaded", "components")
+            if name in outputs or (name == "sunlit_shaded" and "total" in outputs)
+        )
+    return tuple(
+        name for name in outputs if name in ("total", "sunlit_shaded", "components")
+    )
+
+
+def register_backend(name: str, backend: PythonBackend):
+    """Registers a backend under `name`, replacing any backend already registered under the same name.
+
+    Args:
+        name: name of the backend
+        backend: object implementing the methods of :class:`PythonBackend`
+    """
+    backend.name = name
+    _backends[name] = backend
+
+
+def get_backend_names() -> tuple:
+    """Returns the names of the registered backends."""
+    return tuple(_backends)
+
+
+def get_backend_name(name: str = None, default: str = DEFAULT_BACKEND) -> str:
+    """Resolves the name of the backend of a call.
+
+    Args:
+        name: the backend asked for by the call, if any
+        default: the backend used when none is asked for, selected or set by environment variable
+
+    Returns:
+        The name of the backend
+    """
+    name = (
+        name
+        or _selected_backend_name
+        or os.environ.get(BACKEND_ENVIRONMENT_VARIABLE)
+        or default
+    )
+    assert name in _backends, f"Unknown backend: {name}"
+    return name
+
+
+def get_backend(name: str = None, default: str = DEFAULT_BACKEND) -> PythonBackend:
+    """Returns the backend of a call (see :func:`get_backend_name`)."""
+    return _backends[get_backend_name(name, default)]
+
+
+def set_backend(name: str = None):
+    """Selects the backend of all calls that do not ask for one, or resets the selection if `name` is None."""
+    global _selected_backend_name
+    assert name is None or name in _backends, f"Unknown backend: {name}"
+    _selected_backend_name = name
+
+
+@contextmanager
+def use_backend(name: str):
+    """Selects a backend within a `with` block (see :func:`set_backend`)."""
+    previous_backend_name = _selected_backend_name
+    set_backend(name)
+    try:
+        yield
+    finally:
+        set_backend(previous_backend_name)
+
+
+def calc_batch_absorbed_irradiance(
+    leaves_category: str,
+    leaf_layers: dict,
+    params,
+    backend: str = None,
+    outputs: tuple or str = None,
+    out: dict = None,
+    **forcing,
+) -> dict:
+    """Calculates the absorbed irradiance by all leaf layers for a batch of timesteps.
+
+    Args:
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        leaf_layers: [m2leaf m-2ground] leaf layers thicknesses, as expected by the `leaf_layers` attribute of inputs
+        params: see class`LumpedParams` and `SunlitShadedParams` (there is no need to call its `update()` method
+            beforehand)
+        backend: name of the backend (default: the selected backend, else 'numpy')
+        outputs: names of the outputs to calculate (see :data:`OUTPUTS_NAMES`), all but 'total' by default
+        out: optional dictionary of preallocated arrays, into which the results of the same names are written in place
+            and which are returned instead of new arrays, e.g. to step a coupled model without allocating results
+        **forcing: inputs of the leaves category (e.g. 'incident_direct_irradiance', 'incident_diffuse_irradiance' and
+            'solar_inclination' of sunlit-shaded leaves) as scalars or broadcasting arrays
+
+    Returns:
+        A dictionary of arrays having as keys the absorbed irradiance categories ('lumped', or 'sunlit' and 'shaded')
+            and the names of :data:`BATCH_RESULTS_NAMES` (and of :data:`SUNLIT_SHADED_BATCH_RESULTS_NAMES` for
+            sunlit-shaded leaves), as returned by the functions of `vectorized`, or only the results of `outputs` (see
+            :func:`get_batch_results_names`)
+
+    Notes:
+        This function requires NumPy, whatever the backend.
+    """
+    return get_backend(backend, "numpy").calc_batch_absorbed_irradiance(
+        leaves_category, leaf_layers, params, outputs=outputs, out=out, **forcing
+    )
+
+
+register_backend("python", PythonBackend())
+register_backend("numpy", NumpyBackend())
+register_backend("jit", JitBackend())
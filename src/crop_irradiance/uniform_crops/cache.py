@@ -0,0 +1,178 @@
+import os
+import pickle
+from collections import OrderedDict
+from hashlib import sha256
+from numbers import Number
+
+from crop_irradiance.uniform_crops.inputs import LumpedInputs, SunlitShadedInputs
+from crop_irradiance.uniform_crops.params import (
+    CanopyOptics,
+    LumpedParams,
+    SunlitShadedParams,
+)
+
+INCIDENT_IRRADIANCE_NAMES = (
+    "incident_irradiance",
+    "incident_direct_irradiance",
+    "incident_diffuse_irradiance",
+)
+
+
+def _canonicalize(value):
+    """Returns a representation of `value` that is independent of dictionaries order and of numbers types."""
+    if isinstance(value, dict):
+        return tuple(
+            sorted((repr(key), _canonicalize(item)) for key, item in value.items())
+        )
+    if isinstance(value, (list, tuple)):
+        return tuple(_canonicalize(item) for item in value)
+    if isinstance(value, Number) and not isinstance(value, bool):
+        return float(value).hex()
+    return repr(value)
+
+
+def calc_cache_key(
+    leaves_category: str,
+    inputs: LumpedInputs or SunlitShadedInputs,
+    params: LumpedParams or SunlitShadedParams,
+    optics: CanopyOptics = None,
+) -> str:
+    """Calculates a canonical hash of the leaves category, inputs, params and canopy optics of a shoot.
+
+    Args:
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        inputs: see class`LumpedInputs` and `SunlitShadedInputs`
+        params: see class`LumpedParams` and `SunlitShadedParams`
+        optics: the canopy optics read by the shoot in place of the coefficients of `params` (see
+            :class:`CanopyOptics`), if any
+
+    Returns:
+        The hexadecimal SHA-256 digest of the canonical representation of all fields of `inputs`, `params` and
+            `optics`, so that results of optics shared at an approximated solar inclination are not mistaken for
+            exact ones
+
+    Notes:
+        When all incident irradiance values are nil (e.g. at night), the absorbed irradiance is nil whatever the
+            solar inclination and params are, so that only the leaves category and leaf layers are hashed.
+    """
+    inputs_fields = vars(inputs)
+    is_night = all(
+        inputs_fields[name] == 0
+        for name in INCIDENT_IRRADIANCE_NAMES
+        if name in inputs_fields
+    )
+    if is_night:
+        state = (
+            leaves_category,
+            getattr(params, "model", None),
+            _canonicalize(inputs.leaf_layers),
+        )
+    else:
+        state = (
+            leaves_category,
+            type(params).__name__,
+            _canonicalize(inputs_fields),
+            _canonicalize(vars(params)),
+            None if optics is None else _canonicalize(optics.as_dict()),
+        )
+    return sha256(repr(state).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries: int = 4096, path: str = None):
+        """Creates a bounded cache of shoots results with least-recently-used eviction.
+
+        Args:
+            max_entries: maximum number of results held in memory, the least recently used results being evicted
+                beyond this number
+            path: optional path to a file in which the cache is persisted by :meth:`save`, and from which it is
+                loaded if the file exists
+
+        Notes:
+            The cache is passed to :meth:`Shoot.calc_absorbed_irradiance`, which uses :func:`calc_cache_key` to
+                identify its results.
+        """
+        assert max_entries > 0, "The cache must hold at least one entry"
+
+        self.max_entries = max_entries
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    calc_key = staticmethod(calc_cache_key)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key: str):
+        return key in self._entries
+
+    @property
+    def hit_rate(self) -> float:
+        """[-] ratio of the number of hits to the number of lookups."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, key: str):
+        """Returns the result stored under `key` (None if missing) and marks it as the most recently used one."""
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: str, value):
+        """Stores `value` under `key`, evicting the least recently used results if the cache is full."""
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        """Removes all results and resets statistics."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        """Returns the cache statistics."""
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+        }
+
+    def save(self, path: str = None):
+        """Persists the cached results to disk, the file being atomically replaced.
+
+        Args:
+            path: path to the file, defaults to the `path` given at creation
+        """
+        path = path or self.path
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "wb") as f:
+            pickle.dump(
+                list(self._entries.items()), f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(temporary_path, path)
+
+    def load(self, path: str = None):
+        """Loads cached results from disk, keeping at most `max_entries` of the most recently used ones.
+
+        Args:
+            path: path to the file, defaults to the `path` given at creation
+        """
+        with open(path or self.path, "rb") as f:
+            for key, value in pickle.load(f):
+                self.put(key, value)
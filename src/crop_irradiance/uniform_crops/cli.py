@@ -0,0 +1,519 @@
+"""Command-line batch runner of uniform crops canopies.
+
+The `crop-irradiance` command evaluates one leaf layers profile for each timestep of a forcing file and writes the
+absorbed irradiance by each leaf layer. Forcing is read, evaluated by the selected compute backend (by default the
+vectorized one, see :mod:`crop_irradiance.uniform_crops.backends`) and written by chunks of timesteps, so that memory
+use is bounded whatever the length of the forcing. Chunks may be evaluated by several processes, outputs being written
+in the order of the forcing.
+
+Files:
+    forcing: CSV file having a header and one column per input of the leaves category (see
+        :data:`service.SUNLIT_SHADED_INPUTS_NAMES` and :data:`service.LUMPED_INPUTS_NAMES`), other columns being ignored
+    layers: JSON object mapping leaf layers indexes to their thicknesses (as the `leaf_layers` attribute of inputs)
+    params: JSON object of the keyword arguments of class`SunlitShadedParams` or `LumpedParams`
+    output: one row per timestep and leaf layer, having as columns 'timestep' (the row number in the forcing file),
+        'layer' (the leaf layer index) and the absorbed irradiance categories ('sunlit' and 'shaded', or 'lumped'),
+        written as CSV or as a NumPy structured array ('.npy', which may be memory-mapped by `numpy.load`)
+
+This module requires NumPy.
+"""
+
+import csv
+import io
+import json
+import os
+import sys
+from argparse import ArgumentParser
+from collections import deque
+from hashlib import sha256
+from itertools import islice
+from multiprocessing import Pool
+from time import perf_counter
+
+import numpy
+
+from crop_irradiance.uniform_crops import backends
+from crop_irradiance.uniform_crops.params import LumpedParams, SunlitShadedParams
+from crop_irradiance.uniform_crops.service import (
+    LUMPED_INPUTS_NAMES,
+    SUNLIT_SHADED_INPUTS_NAMES,
+)
+
+OUTPUT_FORMATS = ("csv", "npy")
+
+# [bytes] size reserved for the header of '.npy' outputs, whose shape is only known once all chunks are written
+NPY_HEADER_SIZE = 256
+
+
+def read_forcing_chunks(
+    forcing_file, inputs_names: tuple, chunk_size: int, skipped_timesteps: int = 0
+):
+    """Reads a CSV forcing file by chunks of timesteps.
+
+    Args:
+        forcing_file: text file object of the CSV forcing
+        inputs_names: names of the columns to be read
+        chunk_size: [-] maximum number of timesteps per chunk
+        skipped_timesteps: [-] number of first timesteps that are not read (e.g. when resuming a run)
+
+    Yields:
+        Arrays of shape (len(inputs_names), timesteps) of the inputs of each chunk
+    """
+    reader = csv.reader(forcing_file)
+    header = [name.strip() for name in next(reader)]
+    missing_names = [name for name in inputs_names if name not in header]
+    assert not missing_names, f"Missing forcing columns: {', '.join(missing_names)}"
+    columns = [header.index(name) for name in inputs_names]
+    for _ in islice(reader, skipped_timesteps):
+        pass
+    while True:
+        rows = list(islice(reader, chunk_size))
+        if not rows:
+            return
+        yield numpy.array(
+            [[float(row[column]) for row in rows] for column in columns], dtype=float
+        )
+
+
+def evaluate_chunk(
+    leaves_category: str,
+    params: LumpedParams or SunlitShadedParams,
+    leaf_layers: dict,
+    first_timestep: int,
+    inputs_values: numpy.ndarray,
+    backend: str = None,
+) -> numpy.ndarray:
+    """Evaluates the absorbed irradiance by all leaf layers for a chunk of timesteps.
+
+    Args:
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        params: see class`LumpedParams` and `SunlitShadedParams`
+        leaf_layers: [m2leaf m-2ground] leaf layers thicknesses, as expected by the `leaf_layers` attribute of inputs
+        first_timestep: [-] the number of the first timestep of the chunk
+        inputs_values: inputs values of the chunk (see :func:`read_forcing_chunks`)
+        backend: name of the compute backend (see :func:`backends.calc_batch_absorbed_irradiance`)
+
+    Returns:
+        The structured array of outputs, having one record per timestep and leaf layer
+    """
+    if leaves_category == "sunlit-shaded":
+        inputs_names = SUNLIT_SHADED_INPUTS_NAMES
+    else:
+        inputs_names = LUMPED_INPUTS_NAMES[params.model]
+    results = backends.calc_batch_absorbed_irradiance(
+        leaves_category,
+        leaf_layers,
+        params,
+        backend,
+        **dict(zip(inputs_names, inputs_values)),
+    )
+    categories = get_categories(leaves_category)
+
+    timesteps_number = inputs_values.shape[-1]
+    layer_indexes = sorted(leaf_layers, reverse=True)
+    outputs = numpy.empty(
+        (timesteps_number, len(layer_indexes)), dtype=get_output_dtype(categories)
+    )
+    outputs["timestep"] = numpy.arange(
+        first_timestep, first_timestep + timesteps_number
+    )[:, None]
+    outputs["layer"] = layer_indexes
+    for category in categories:
+        outputs[category] = results[category]
+    return outputs.ravel()
+
+
+def get_categories(leaves_category: str) -> tuple:
+    """Returns the absorbed irradiance categories of a leaves category."""
+    return ("sunlit", "shaded") if leaves_category == "sunlit-shaded" else ("lumped",)
+
+
+def get_output_dtype(categories: tuple) -> numpy.dtype:
+    """Returns the (little-endian) structured data type of output records."""
+    return numpy.dtype(
+        [("timestep", "<i8"), ("layer", "<i8")]
+        + [(category, "<f8") for category in categories]
+    )
+
+
+def encode_outputs(outputs: numpy.ndarray, output_format: str) -> bytes:
+    """Encodes output records as CSV rows (floating point values being written with all their digits) or as bytes."""
+    if output_format == "csv":
+        buffer = io.StringIO()
+        csv.writer(buffer, lineterminator="\n").writerows(outputs.tolist())
+        return buffer.getvalue().encode()
+    return outputs.tobytes()
+
+
+def evaluate_and_encode_chunk(output_format: str, *arguments) -> tuple:
+    """Evaluates a chunk (see :func:`evaluate_chunk`) and returns the number and the encoding of its records."""
+    outputs = evaluate_chunk(*arguments)
+    return len(outputs), encode_outputs(outputs, output_format)
+
+
+class CsvWriter:
+    def __init__(self, output_file, categories: tuple, records_number: int = None):
+        """Writes encoded output records to a CSV file, below a header.
+
+        Args:
+            output_file: binary file object
+            categories: absorbed irradiance categories
+            records_number: [-] number of records already written by a previous run, None for a new file
+        """
+        self._file = output_file
+        if records_number is None:
+            self._file.write(
+                (",".join(("timestep", "layer") + categories) + "\n").encode()
+            )
+
+    def write(self, records_number: int, encoded_outputs: bytes):
+        self._file.write(encoded_outputs)
+
+    def close(self):
+        pass
+
+
+class NpyWriter:
+    def __init__(self, output_file, categories: tuple, records_number: int = None):
+        """Writes encoded output records as a NumPy structured array, whose header is completed once all are written.
+
+        Args:
+            output_file: binary seekable file object
+            categories: absorbed irradiance categories
+            records_number: [-] number of records already written by a previous run, None for a new file
+        """
+        self._file = output_file
+        self._dtype = get_output_dtype(categories)
+        if records_number is None:
+            self.records_number = 0
+            self._write_header()
+        else:
+            self.records_number = records_number
+
+    def write(self, records_number: int, encoded_outputs: bytes):
+        self._file.write(encoded_outputs)
+        self.records_number += records_number
+
+    def close(self):
+        self._file.seek(0)
+        self._write_header()
+        self._file.seek(0, 2)
+
+    def _write_header(self):
+        header = repr(
+            {
+                "descr": numpy.lib.format.dtype_to_descr(self._dtype),
+                "fortran_order": False,
+                "shape": (self.records_number,),
+            }
+        )
+        prefix = numpy.lib.format.magic(1, 0)
+        padding = NPY_HEADER_SIZE - len(prefix) - 2 - len(header) - 1
+        assert padding >= 0, "The header of outputs exceeds its reserved size"
+        header = (header + " " * padding + "\n").encode("latin1")
+        self._file.write(prefix + len(header).to_bytes(2, "little") + header)
+
+
+class Checkpoint:
+    def __init__(self, path: str, fingerprint: str):
+        """Persists the progress of a run, so that a pre-empted run can be resumed from its last written chunk.
+
+        Args:
+            path: path of the checkpoint file
+            fingerprint: hash of the settings of the run, which must not change between a run and its resumption
+
+        Notes:
+            The output file is flushed to disk before the checkpoint is written to a temporary file which then
+                atomically replaces the previous checkpoint, so that the checkpoint never accounts for outputs that
+                were not written.
+        """
+        self.path = path
+        self.fingerprint = fingerprint
+
+    def load(self) -> dict:
+        """Returns the progress of the previous run, None if there is none."""
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as checkpoint_file:
+            progress = json.load(checkpoint_file)
+        assert (
+            progress["fingerprint"] == self.fingerprint
+        ), f"The checkpoint {self.path} belongs to a run having different settings"
+        return progress
+
+    def save(self, output_file, timesteps_number: int, records_number: int):
+        """Persists the progress of the run once all chunks up to `timesteps_number` are written to `output_file`."""
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        progress = {
+            "fingerprint": self.fingerprint,
+            "timesteps_number": timesteps_number,
+            "records_number": records_number,
+            "output_size": output_file.tell(),
+        }
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump(progress, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_path, self.path)
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def calc_run_fingerprint(
+    leaves_category: str,
+    params: LumpedParams or SunlitShadedParams,
+    leaf_layers: dict,
+    output_format: str,
+    chunk_size: int,
+) -> str:
+    """Calculates a hash of the settings of a run that determine its outputs and the boundaries of its chunks."""
+    return sha256(
+        repr(
+            (
+                leaves_category,
+                sorted(vars(params).items()),
+                sorted(leaf_layers.items()),
+                output_format,
+                chunk_size,
+            )
+        ).encode()
+    ).hexdigest()
+
+
+def run(
+    forcing_file,
+    output_file,
+    leaves_category: str,
+    params: LumpedParams or SunlitShadedParams,
+    leaf_layers: dict,
+    output_format: str = "csv",
+    chunk_size: int = 10000,
+    processes: int = 1,
+    checkpoint_path: str = None,
+    checkpoint_interval: float = 60.0,
+    backend: str = None,
+) -> dict:
+    """Evaluates all timesteps of a forcing file and writes their outputs.
+
+    Args:
+        forcing_file: text file object of the CSV forcing (see :func:`read_forcing_chunks`)
+        output_file: binary file object of the outputs, opened for reading and writing when resuming a run
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        params: see class`LumpedParams` and `SunlitShadedParams`
+        leaf_layers: [m2leaf m-2ground] leaf layers thicknesses, as expected by the `leaf_layers` attribute of inputs
+        output_format: one of :data:`OUTPUT_FORMATS`
+        chunk_size: [-] maximum number of timesteps evaluated at once (per process)
+        processes: [-] number of processes evaluating chunks, chunks being evaluated by the calling process if 1
+        checkpoint_path: optional path of a checkpoint file (see :class:`Checkpoint`). If it exists, the run resumes
+            after the last chunk it accounts for, outputs written beyond being discarded. It is removed once the run
+            completes.
+        checkpoint_interval: [s] minimum duration between two checkpoints
+        backend: name of the compute backend (see :func:`backends.calc_batch_absorbed_irradiance`)
+
+    Returns:
+        A dictionary having as keys 'timesteps_number' (including those of resumed runs), 'layers_number', 'runtime'
+            [s] and 'throughput' [timesteps s-1] (of this run)
+
+    Notes:
+        The outputs of a resumed run are identical to those of an uninterrupted run, as long as the forcing file is
+            the same: chunks have the same boundaries and are evaluated independently of each other.
+    """
+    assert output_format in OUTPUT_FORMATS, f"Unknown output format: {output_format}"
+    assert chunk_size > 0, "Chunks must hold at least one timestep"
+    assert processes > 0, "At least one process is required"
+
+    started_at = perf_counter()
+    # the backend is resolved once so that worker processes use the same backend as the calling process
+    backend = backends.get_backend_name(backend, "numpy")
+    if leaves_category == "sunlit-shaded":
+        inputs_names = SUNLIT_SHADED_INPUTS_NAMES
+    else:
+        inputs_names = LUMPED_INPUTS_NAMES[params.model]
+
+    checkpoint, progress = None, None
+    if checkpoint_path is not None:
+        checkpoint = Checkpoint(
+            checkpoint_path,
+            calc_run_fingerprint(
+                leaves_category, params, leaf_layers, output_format, chunk_size
+            ),
+        )
+        progress = checkpoint.load()
+    if progress is None:
+        timesteps_number, records_number = 0, 0
+        writer = (CsvWriter if output_format == "csv" else NpyWriter)(
+            output_file, get_categories(leaves_category)
+        )
+    else:
+        timesteps_number = progress["timesteps_number"]
+        records_number = progress["records_number"]
+        output_file.seek(progress["output_size"])
+        output_file.truncate()
+        writer = (CsvWriter if output_format == "csv" else NpyWriter)(
+            output_file, get_categories(leaves_category), records_number
+        )
+    resumed_timesteps_number = timesteps_number
+    checkpointed_at = perf_counter()
+
+    def iter_chunks_arguments():
+        first_timestep = resumed_timesteps_number
+        for inputs_values in read_forcing_chunks(
+            forcing_file, inputs_names, chunk_size, resumed_timesteps_number
+        ):
+            yield (
+                output_format,
+                leaves_category,
+                params,
+                leaf_layers,
+                first_timestep,
+                inputs_values,
+                backend,
+            )
+            first_timestep += inputs_values.shape[-1]
+
+    def write(chunk):
+        nonlocal timesteps_number, records_number, checkpointed_at
+        chunk_records_number, encoded_outputs = chunk
+        writer.write(chunk_records_number, encoded_outputs)
+        records_number += chunk_records_number
+        timesteps_number += chunk_records_number // len(leaf_layers)
+        if (
+            checkpoint is not None
+            and perf_counter() - checkpointed_at >= checkpoint_interval
+        ):
+            checkpoint.save(output_file, timesteps_number, records_number)
+            checkpointed_at = perf_counter()
+
+    if processes == 1:
+        for arguments in iter_chunks_arguments():
+            write(evaluate_and_encode_chunk(*arguments))
+    else:
+        with Pool(processes) as pool:
+            # outputs are encoded by workers, and at most two chunks per process are pending so that memory use is
+            #   bounded
+            pending = deque()
+            for arguments in iter_chunks_arguments():
+                pending.append(pool.apply_async(evaluate_and_encode_chunk, arguments))
+                while pending and (len(pending) >= 2 * processes or pending[0].ready()):
+                    write(pending.popleft().get())
+            while pending:
+                write(pending.popleft().get())
+    writer.close()
+    if checkpoint is not None:
+        checkpoint.remove()
+
+    runtime = perf_counter() - started_at
+    return {
+        "timesteps_number": timesteps_number,
+        "layers_number": len(leaf_layers),
+        "runtime": runtime,
+        "throughput": (timesteps_number - resumed_timesteps_number) / runtime,
+    }
+
+
+def main(args: list = None):
+    parser = ArgumentParser(prog="crop-irradiance", description=__doc__.splitlines()[0])
+    parser.add_argument("forcing", help="CSV forcing file ('-' for the standard input)")
+    parser.add_argument("layers", help="JSON file of leaf layers thicknesses")
+    parser.add_argument("params", help="JSON file of params")
+    parser.add_argument("output", help="output file ('-' for the standard output)")
+    parser.add_argument(
+        "--leaves-category",
+        choices=("lumped", "sunlit-shaded"),
+        default="sunlit-shaded",
+    )
+    parser.add_argument(
+        "--format",
+        choices=OUTPUT_FORMATS,
+        help="output format (default: from the output file extension, else 'csv')",
+    )
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=10000,
+        help="number of timesteps evaluated at once (default: 10000)",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=1,
+        help="number of processes evaluating chunks (default: 1)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        help="checkpoint file, from which the run is resumed if it exists (default: none)",
+    )
+    parser.add_argument(
+        "--checkpoint-interval",
+        type=float,
+        default=60.0,
+        help="minimum number of seconds between two checkpoints (default: 60)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=backends.get_backend_names(),
+        help=f"compute backend (default: ${backends.BACKEND_ENVIRONMENT_VARIABLE}, else 'numpy')",
+    )
+    options = parser.parse_args(args)
+
+    output_format = options.format or (
+        "npy" if options.output.endswith(".npy") else "csv"
+    )
+    with open(options.layers) as layers_file:
+        leaf_layers = {
+            int(index): float(thickness)
+            for index, thickness in json.load(layers_file).items()
+        }
+    with open(options.params) as params_file:
+        params_fields = json.load(params_file)
+    if options.leaves_category == "sunlit-shaded":
+        params = SunlitShadedParams(**params_fields)
+    else:
+        params = LumpedParams(**params_fields)
+
+    if options.forcing == "-":
+        forcing_file = sys.stdin
+    else:
+        forcing_file = open(options.forcing, newline="")
+    if options.output == "-":
+        assert output_format == "csv", "npy outputs must be written to a file"
+        assert (
+            options.checkpoint is None
+        ), "Checkpointed outputs must be written to a file"
+        output_file = sys.stdout.buffer
+    elif options.checkpoint is not None and os.path.exists(options.checkpoint):
+        output_file = open(options.output, "r+b")
+    else:
+        output_file = open(options.output, "wb")
+    try:
+        statistics = run(
+            forcing_file,
+            output_file,
+            options.leaves_category,
+            params,
+            leaf_layers,
+            output_format,
+            options.chunk_size,
+            options.processes,
+            options.checkpoint,
+            options.checkpoint_interval,
+            options.backend,
+        )
+    finally:
+        for file in (forcing_file, output_file):
+            if file not in (sys.stdin, sys.stdout.buffer):
+                file.close()
+
+    print(
+        f"{statistics['timesteps_number']} timesteps of {statistics['layers_number']} leaf layers evaluated in "
+        f"{statistics['runtime']:.3f} s ({statistics['throughput']:.0f} timesteps/s)",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""Console script of the `crop-irradiance` command.
+
+The command-line runner (see :mod:`crop_irradiance.uniform_crops.cli`) requires NumPy, which is an optional dependency
+of the package, so that a missing installation is reported before the runner is imported.
+"""
+
+import sys
+
+
+def main(args: list = None):
+    """Runs the `crop-irradiance` command, exiting with an installation hint if NumPy is not installed.
+
+    Args:
+        args: command-line arguments (see :func:`cli.main`), defaults to those of the process
+    """
+    try:
+        from crop_irradiance.uniform_crops import cli
+    except ImportError as error:
+        if error.name != "numpy":
+            raise
+        sys.exit(
+            "crop-irradiance requires NumPy, which is installed by: pip install crop-irradiance[vectorized]"
+        )
+    cli.main(args)
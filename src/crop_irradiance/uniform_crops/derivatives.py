@@ -0,0 +1,174 @@
+"""Analytic derivatives of the canopy coefficients and of the scaling factors of leaf layers, as used by the Jacobians
+of :mod:`crop_irradiance.uniform_crops.vectorized`.
+
+This module requires NumPy.
+"""
+
+import numpy
+
+
+def calc_scaling_factor_derivatives(
+    extinction_coefficient, cumulative_leaf_area_index
+) -> dict:
+    """Calculates the scaling factor :math:`e^{-k L_u} - e^{-k L_l}` of leaf layers and its partial derivatives.
+
+    Args:
+        extinction_coefficient: [m2ground m-2leaf] extinction coefficient, broadcastable against the leaf layers axis
+        cumulative_leaf_area_index: [m2leaf m-2ground] cumulative downwards leaf area index at the boundaries of the
+            leaf layers (the last axis has one more element than the number of leaf layers, with 0 at the top)
+
+    Returns:
+        A dictionary of arrays over the leaf layers axis, having as keys:
+            'value': [-] the scaling factor of each leaf layer
+            'extinction_coefficient': [m2leaf m-2ground] its derivative w.r.t. the extinction coefficient
+            'upper_cumulative_leaf_area_index': [m2ground m-2leaf] its derivative w.r.t. the cumulative leaf area
+                index at the top of each layer
+            'lower_cumulative_leaf_area_index': [m2ground m-2leaf] its derivative w.r.t. the cumulative leaf area
+                index at the bottom of each layer
+    """
+    attenuation = numpy.exp(-extinction_coefficient * cumulative_leaf_area_index)
+    attenuation_derivative = -cumulative_leaf_area_index * attenuation
+    return {
+        "value": attenuation[..., :-1] - attenuation[..., 1:],
+        "extinction_coefficient": attenuation_derivative[..., :-1]
+        - attenuation_derivative[..., 1:],
+        "upper_cumulative_leaf_area_index": -extinction_coefficient
+        * attenuation[..., :-1],
+        "lower_cumulative_leaf_area_index": extinction_coefficient
+        * attenuation[..., 1:],
+    }
+
+
+def calc_direct_black_extinction_coefficient_derivatives(
+    direct_black_extinction_coefficient, clumping_factor
+) -> dict:
+    """Calculates the derivatives of the extinction coefficient of direct (beam) irradiance for black leaves.
+
+    Args:
+        direct_black_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam)
+            irradiance for black leaves
+        clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves
+
+    Returns:
+        Derivatives w.r.t. 'leaf_scattering_coefficient' and 'clumping_factor'
+    """
+    return {
+        "leaf_scattering_coefficient": 0.0,
+        "clumping_factor": direct_black_extinction_coefficient / clumping_factor,
+    }
+
+
+def calc_direct_extinction_coefficient_derivatives(
+    direct_black_extinction_coefficient,
+    clumping_factor,
+    leaf_scattering_coefficient,
+) -> dict:
+    """Calculates the derivatives of the extinction coefficient of direct (beam) irradiance.
+
+    Args:
+        direct_black_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam)
+            irradiance for black leaves
+        clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves
+        leaf_scattering_coefficient: [-] leaf scattering coefficient
+
+    Returns:
+        Derivatives w.r.t. 'leaf_scattering_coefficient' and 'clumping_factor'
+    """
+    transmission_factor = numpy.sqrt(1 - leaf_scattering_coefficient)
+    return {
+        "leaf_scattering_coefficient": -direct_black_extinction_coefficient
+        / (2 * transmission_factor),
+        "clumping_factor": direct_black_extinction_coefficient
+        / clumping_factor
+        * transmission_factor,
+    }
+
+
+def calc_canopy_reflectance_to_direct_irradiance_derivatives(
+    direct_black_extinction_coefficient,
+    clumping_factor,
+    leaf_scattering_coefficient,
+) -> dict:
+    """Calculates the derivatives of canopy reflectance to direct (beam) irradiance.
+
+    Args:
+        direct_black_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam)
+            irradiance for black leaves
+        clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves
+        leaf_scattering_coefficient: [-] leaf scattering coefficient
+
+    Returns:
+        Derivatives w.r.t. 'leaf_scattering_coefficient' and 'clumping_factor'
+    """
+    transmission_factor = numpy.sqrt(1 - leaf_scattering_coefficient)
+    reflectance_of_horizontal_leaves = (1.0 - transmission_factor) / (
+        1.0 + transmission_factor
+    )
+    exponent_factor = 2.0 * numpy.exp(
+        -(2.0 * reflectance_of_horizontal_leaves * direct_black_extinction_coefficient)
+        / (1.0 + direct_black_extinction_coefficient)
+    )
+    return {
+        "leaf_scattering_coefficient": exponent_factor
+        * direct_black_extinction_coefficient
+        / (1.0 + direct_black_extinction_coefficient)
+        / (transmission_factor * (1.0 + transmission_factor) ** 2),
+        "clumping_factor": exponent_factor
+        * reflectance_of_horizontal_leaves
+        / (1.0 + direct_black_extinction_coefficient) ** 2
+        * direct_black_extinction_coefficient
+        / clumping_factor,
+    }
+
+
+def calc_diffuse_extinction_coefficient_derivatives(
+    leaf_area_index,
+    sky_sectors_direct_black_extinction_coefficient,
+    sky_sectors_weight,
+    clumping_factor,
+    leaf_scattering_coefficient,
+) -> dict:
+    """Calculates the derivatives of the extinction coefficient of diffuse irradiance through non-black leaves.
+
+    Args:
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy (with a trailing axis of length 1)
+        sky_sectors_direct_black_extinction_coefficient: [m2ground m-2leaf] the extinction coefficients of direct
+            (beam) irradiance for black leaves coming from the center of each sky sector (along the last axis)
+        sky_sectors_weight: [-] the contributions from sky sectors to diffuse irradiance (along the last axis)
+        clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves
+        leaf_scattering_coefficient: [-] leaf scattering coefficient
+
+    Returns:
+        Derivatives w.r.t. 'leaf_scattering_coefficient', 'clumping_factor' and 'leaf_area_index', reduced over the
+            sky sectors axis
+
+    References:
+        Goudriaan J. (1988)
+            The bare bones of leaf-angle distribution in radiation models for canopy photosynthesis and energy exchange.
+            Agricultural and Forest Meteorology 43, 155 - 169.
+    """
+    transmission_factor = numpy.sqrt(1 - leaf_scattering_coefficient)
+    sectors_extinction_coefficient = (
+        sky_sectors_direct_black_extinction_coefficient * transmission_factor
+    )
+    weighted_transmission = sky_sectors_weight * numpy.exp(
+        -sectors_extinction_coefficient * leaf_area_index
+    )
+    transmission = weighted_transmission.sum(axis=-1)
+    leaf_area_index = leaf_area_index[..., 0]
+    return {
+        "leaf_scattering_coefficient": -(
+            weighted_transmission * sky_sectors_direct_black_extinction_coefficient
+        ).sum(axis=-1)
+        / (2 * transmission_factor * transmission),
+        "clumping_factor": (weighted_transmission * sectors_extinction_coefficient).sum(
+            axis=-1
+        )
+        / (clumping_factor * transmission),
+        "leaf_area_index": (
+            numpy.log(transmission) / leaf_area_index
+            + (weighted_transmission * sectors_extinction_coefficient).sum(axis=-1)
+            / transmission
+        )
+        / leaf_area_index,
+    }
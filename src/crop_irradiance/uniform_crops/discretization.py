@@ -0,0 +1,154 @@
+"""Adaptive discretization of uniform crops canopies into leaf layers.
+
+A fine reference profile of the canopy is evaluated for a range of solar inclinations, then leaf layers are built from
+the top to the bottom of the canopy by merging as many reference sublayers as possible while the absorbed irradiance
+per unit sunlit and shaded leaf area of the merged layer stays within a tolerance of that of each merged sublayer.
+
+This module requires NumPy.
+"""
+
+import numpy
+
+from crop_irradiance.uniform_crops import vectorized
+from crop_irradiance.uniform_crops.params import SunlitShadedParams
+
+# [-] minimum fraction of a reference sublayer that must be sunlit (or shaded) for its absorbed irradiance per unit
+#   leaf area to be accounted for in the discretization error
+MINIMUM_LEAF_FRACTION = 1.0e-9
+
+
+def calc_adaptive_leaf_layers(
+    leaf_area_index: float,
+    params: SunlitShadedParams,
+    solar_inclination,
+    tolerance: float = 0.02,
+    incident_direct_irradiance=800.0,
+    incident_diffuse_irradiance=200.0,
+    reference_layers_number: int = 1000,
+) -> tuple:
+    """Calculates the coarsest leaf layers that keep the absorbed irradiance by sunlit and shaded leaves accurate.
+
+    Args:
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy
+        params: see class`SunlitShadedParams` (there is no need to call its `update()` method beforehand)
+        solar_inclination: [rad] angle(s) of solar inclination over which the accuracy is required (scalar or 1-D
+            array, e.g. covering the daily course of the sun)
+        tolerance: [-] maximum deviation of the absorbed irradiance per unit sunlit (or shaded) leaf area of each leaf
+            layer from that of the reference sublayers it contains, relative to the total incident irradiance
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy (scalar or
+            array broadcasting against `solar_inclination`)
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy (scalar or
+            array broadcasting against `solar_inclination`)
+        reference_layers_number: [-] number of leaf layers of identical thickness of the fine reference profile
+
+    Returns:
+        leaf_layers: [m2leaf m-2ground] leaf layers thicknesses, as expected by the `leaf_layers` attribute of inputs
+            (the top layer having the highest index)
+        error: [-] the achieved error, i.e. the maximum relative deviation over all leaf layers and solar inclinations
+
+    Notes:
+        Layers boundaries are taken among those of the reference profile, and each layer is extended downwards as long
+            as the tolerance is respected, so that the number of layers is minimal for this reference.
+    """
+    assert leaf_area_index > 0, "The leaf area index must be positive"
+    assert tolerance > 0, "The tolerance must be positive"
+
+    solar_inclination = numpy.atleast_1d(numpy.asarray(solar_inclination, dtype=float))
+    incident_direct_irradiance = numpy.broadcast_to(
+        incident_direct_irradiance, solar_inclination.shape
+    )
+    incident_diffuse_irradiance = numpy.broadcast_to(
+        incident_diffuse_irradiance, solar_inclination.shape
+    )
+    incident_irradiance = (incident_direct_irradiance + incident_diffuse_irradiance)[
+        :, None
+    ]
+    assert numpy.all(
+        incident_irradiance > 0
+    ), "The incident irradiance must be positive"
+
+    reference_thicknesses = numpy.full(
+        (len(solar_inclination), reference_layers_number),
+        leaf_area_index / reference_layers_number,
+    )
+    reference = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        leaf_layers=reference_thicknesses,
+        incident_direct_irradiance=incident_direct_irradiance,
+        incident_diffuse_irradiance=incident_diffuse_irradiance,
+        solar_inclination=solar_inclination,
+        params=params,
+    )
+
+    # arrays of shape (2, inclinations, sublayers) for sunlit and shaded leaves
+    absorbed_irradiance = numpy.stack([reference["sunlit"], reference["shaded"]])
+    leaf_area = numpy.stack(
+        [
+            reference["sunlit_fraction"] * reference_thicknesses,
+            reference["shaded_fraction"] * reference_thicknesses,
+        ]
+    )
+    is_relevant = leaf_area > MINIMUM_LEAF_FRACTION * reference_thicknesses
+    leaf_area_irradiance = numpy.divide(
+        absorbed_irradiance,
+        leaf_area,
+        out=numpy.zeros_like(absorbed_irradiance),
+        where=is_relevant,
+    )
+    cumulative_absorbed_irradiance = numpy.cumsum(absorbed_irradiance, axis=-1)
+    cumulative_leaf_area = numpy.cumsum(leaf_area, axis=-1)
+
+    boundaries = [0]
+    error = 0.0
+    while boundaries[-1] < reference_layers_number:
+        start = boundaries[-1]
+        merged_absorbed_irradiance = cumulative_absorbed_irradiance[..., start:]
+        merged_leaf_area = cumulative_leaf_area[..., start:]
+        if start > 0:
+            merged_absorbed_irradiance = (
+                merged_absorbed_irradiance
+                - cumulative_absorbed_irradiance[..., [start - 1]]
+            )
+            merged_leaf_area = merged_leaf_area - cumulative_leaf_area[..., [start - 1]]
+        merged_leaf_area_irradiance = numpy.divide(
+            merged_absorbed_irradiance,
+            merged_leaf_area,
+            out=numpy.zeros_like(merged_absorbed_irradiance),
+            where=merged_leaf_area > 0,
+        )
+
+        sublayers_irradiance = leaf_area_irradiance[..., start:]
+        sublayers_relevance = is_relevant[..., start:]
+        upper_irradiance = numpy.maximum.accumulate(
+            numpy.where(sublayers_relevance, sublayers_irradiance, -numpy.inf), axis=-1
+        )
+        lower_irradiance = numpy.minimum.accumulate(
+            numpy.where(sublayers_relevance, sublayers_irradiance, numpy.inf), axis=-1
+        )
+        deviation = numpy.maximum(
+            upper_irradiance - merged_leaf_area_irradiance,
+            merged_leaf_area_irradiance - lower_irradiance,
+        )
+        merged_error = (
+            numpy.where(numpy.isfinite(deviation), deviation, 0.0) / incident_irradiance
+        ).max(axis=(0, 1))
+
+        exceeds_tolerance = merged_error > tolerance
+        merged_number = (
+            int(exceeds_tolerance.argmax())
+            if exceeds_tolerance.any()
+            else len(merged_error)
+        )
+        merged_number = max(1, merged_number)
+        error = max(error, float(merged_error[merged_number - 1]))
+        boundaries.append(start + merged_number)
+
+    leaf_layer_thicknesses = (
+        numpy.diff(boundaries) * leaf_area_index / reference_layers_number
+    )
+    leaf_layers = {
+        index: float(thickness)
+        for index, thickness in zip(
+            reversed(range(len(leaf_layer_thicknesses))), leaf_layer_thicknesses
+        )
+    }
+    return leaf_layers, error
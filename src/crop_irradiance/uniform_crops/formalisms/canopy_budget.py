@@ -0,0 +1,102 @@
+from math import exp
+
+from crop_irradiance.uniform_crops.formalisms import config
+
+
+def calc_beer_transmitted_irradiance(
+    incident_irradiance: float, extinction_coefficient: float, leaf_area_index: float
+) -> float:
+    """Calculates the irradiance transmitted through the canopy down to the soil surface following Beer-Lambert's law.
+
+    Args:
+        incident_irradiance: [W m-2ground] incident irradiance at the top of the canopy
+        extinction_coefficient: [m2groud m-2leaf] extinction coefficient of the incident irradiance through the canopy
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy
+
+    Returns:
+        [W m-2ground] transmitted irradiance per unit ground area at the bottom of the canopy
+    """
+    return incident_irradiance * exp(-extinction_coefficient * leaf_area_index)
+
+
+def calc_transmitted_irradiance(
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    leaf_area_index: float,
+    direct_extinction_coefficient: float,
+    diffuse_extinction_coefficient: float,
+    canopy_reflectance_to_direct_irradiance: float,
+    canopy_reflectance_to_diffuse_irradiance: float,
+) -> float:
+    """Calculates the direct and diffuse irradiance transmitted through the canopy down to the soil surface.
+
+    Args:
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy
+        direct_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam) irradiance
+        diffuse_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of diffuse irradiance
+        canopy_reflectance_to_direct_irradiance: [-] canopy reflectance to direct (beam) irradiance
+        canopy_reflectance_to_diffuse_irradiance: [-] canopy reflectance to diffuse irradiance for the given irradiance
+            band
+
+    Returns:
+        [W m-2ground] transmitted irradiance per unit ground area at the bottom of the canopy
+    """
+    return incident_direct_irradiance * (
+        1 - canopy_reflectance_to_direct_irradiance
+    ) * exp(-direct_extinction_coefficient * leaf_area_index) + (
+        incident_diffuse_irradiance
+        * (1 - canopy_reflectance_to_diffuse_irradiance)
+        * exp(-diffuse_extinction_coefficient * leaf_area_index)
+    )
+
+
+def calc_reflected_irradiance(
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    canopy_reflectance_to_direct_irradiance: float,
+    canopy_reflectance_to_diffuse_irradiance: float,
+) -> float:
+    """Calculates the irradiance reflected by the canopy.
+
+    Args:
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        canopy_reflectance_to_direct_irradiance: [-] canopy reflectance to direct (beam) irradiance
+        canopy_reflectance_to_diffuse_irradiance: [-] canopy reflectance to diffuse irradiance for the given irradiance
+            band
+
+    Returns:
+        [W m-2ground] reflected irradiance per unit ground area at the top of the canopy
+    """
+    return (
+        canopy_reflectance_to_direct_irradiance * incident_direct_irradiance
+        + canopy_reflectance_to_diffuse_irradiance * incident_diffuse_irradiance
+    )
+
+
+def check_energy_balance(
+    incident_irradiance: float,
+    absorbed_irradiance: float,
+    reflected_irradiance: float,
+    transmitted_irradiance: float,
+):
+    """Checks that the incident irradiance equals the sum of the absorbed, reflected and transmitted irradiance.
+
+    Args:
+        incident_irradiance: [W m-2ground] incident irradiance at the top of the canopy
+        absorbed_irradiance: [W m-2ground] absorbed irradiance by the whole canopy
+        reflected_irradiance: [W m-2ground] reflected irradiance by the canopy
+        transmitted_irradiance: [W m-2ground] transmitted irradiance down to the soil surface
+
+    Raises:
+        AssertionError: if the imbalance exceeds `config.ENERGY_BALANCE_TOLERANCE` times the incident irradiance (or
+            times 1 for low irradiance values)
+    """
+    imbalance = incident_irradiance - (
+        absorbed_irradiance + reflected_irradiance + transmitted_irradiance
+    )
+    assert abs(imbalance) <= config.ENERGY_BALANCE_TOLERANCE * max(
+        1.0, abs(incident_irradiance)
+    ), f"Energy balance is not closed: imbalance of {imbalance} for an incident irradiance of {incident_irradiance}"
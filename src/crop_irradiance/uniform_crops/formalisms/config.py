@@ -1,2 +1,3 @@
 PRECISION = 1.0e-24
 SPHERICAL_ANGLES_FACTOR = 0.9773843811168246
+ENERGY_BALANCE_TOLERANCE = 1.0e-9
@@ -0,0 +1,264 @@
+"""Fused per-layer kernels of the lumped and sunlit-shaded leaves formalisms.
+
+Each kernel evaluates the absorbed irradiance by one leaf layer for one timestep, as the functions of
+:mod:`lumped_leaves` and :mod:`sunlit_shaded_leaves` do, but in a single call that shares the exponential terms common to
+all absorbed irradiance components. Kernels only take and return floats, so that they can be compiled by Numba when it
+is installed (see :func:`get_kernel`), which brings their per-call latency below the microsecond for models that step
+through layers and timesteps in Python. Numba is imported lazily and its absence silently falls back to pure Python.
+"""
+
+from functools import lru_cache
+from math import exp
+
+KERNELS_NAMES = ("beer", "de_pury", "sunlit_shaded", "sunlit_shaded_totals")
+
+_compiled_kernels = {}
+
+
+def calc_beer_kernel(
+    incident_irradiance: float,
+    extinction_coefficient: float,
+    upper_cumulative_leaf_area_index: float,
+    leaf_layer_thickness: float,
+) -> float:
+    """Calculates irradiance absorption by a uniform leaf layer following Beer-Lambert's law.
+
+    Args:
+        incident_irradiance: [W m-2ground] incident irradiance at the upper side of the leaf layer
+        extinction_coefficient: [m2groud m-2leaf] extinction coefficient of the incident irradiance through the canopy
+        upper_cumulative_leaf_area_index: [m2leaf m-2ground] cumulative downwards leaf area index at the top of the
+            considered layer
+        leaf_layer_thickness: [m2leaf m-2ground] leaf area index of the considered layer
+
+    Returns:
+        [W m-2ground] absorbed irradiance per unit ground area (see `lumped_leaves.calc_beer_absorption`)
+    """
+    lower_cumulative_leaf_area_index = (
+        upper_cumulative_leaf_area_index + leaf_layer_thickness
+    )
+    return incident_irradiance * (
+        exp(-extinction_coefficient * upper_cumulative_leaf_area_index)
+        - exp(-extinction_coefficient * lower_cumulative_leaf_area_index)
+    )
+
+
+def calc_de_pury_kernel(
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    upper_cumulative_leaf_area_index: float,
+    leaf_layer_thickness: float,
+    direct_extinction_coefficient: float,
+    diffuse_extinction_coefficient: float,
+    canopy_reflectance_to_direct_irradiance: float,
+    canopy_reflectance_to_diffuse_irradiance: float,
+) -> float:
+    """Calculates the absorbed direct and diffuse irradiance by a leaf layer per unit ground area.
+
+    Args:
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        upper_cumulative_leaf_area_index: [m2leaf m-2ground] cumulative downwards leaf area index at the top of the
+            considered layer
+        leaf_layer_thickness: [m2leaf m-2ground] leaf area index of the considered layer
+        direct_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam) irradiance
+        diffuse_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of diffuse irradiance
+        canopy_reflectance_to_direct_irradiance: [-] canopy reflectance to direct (beam) irradiance
+        canopy_reflectance_to_diffuse_irradiance: [-] canopy reflectance to diffuse irradiance
+
+    Returns:
+        [W m-2ground] the absorbed direct and diffuse irradiance by a leaf layer per unit ground area (see
+            `lumped_leaves.calc_de_pury_absorption`)
+    """
+    lower_cumulative_leaf_area_index = (
+        upper_cumulative_leaf_area_index + leaf_layer_thickness
+    )
+    absorbed_direct_irradiance = (
+        incident_direct_irradiance
+        * (1 - canopy_reflectance_to_direct_irradiance)
+        * (
+            exp(-direct_extinction_coefficient * upper_cumulative_leaf_area_index)
+            - exp(-direct_extinction_coefficient * lower_cumulative_leaf_area_index)
+        )
+    )
+    absorbed_diffuse_irradiance = (
+        incident_diffuse_irradiance
+        * (1 - canopy_reflectance_to_diffuse_irradiance)
+        * (
+            exp(-diffuse_extinction_coefficient * upper_cumulative_leaf_area_index)
+            - exp(-diffuse_extinction_coefficient * lower_cumulative_leaf_area_index)
+        )
+    )
+    return absorbed_direct_irradiance + absorbed_diffuse_irradiance
+
+
+def calc_sunlit_shaded_kernel(
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    upper_cumulative_leaf_area_index: float,
+    leaf_layer_thickness: float,
+    leaf_scattering_coefficient: float,
+    canopy_reflectance_to_direct_irradiance: float,
+    canopy_reflectance_to_diffuse_irradiance: float,
+    direct_extinction_coefficient: float,
+    direct_black_extinction_coefficient: float,
+    diffuse_extinction_coefficient: float,
+) -> tuple:
+    """Calculates the sunlit fraction and the absorbed irradiance components by sunlit and shaded leaves of a layer.
+
+    Args:
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        upper_cumulative_leaf_area_index: [m2leaf m-2ground] cumulative downwards leaf area index at the top of the
+            considered layer
+        leaf_layer_thickness: [m2leaf m-2ground] leaf area index of the considered layer
+        leaf_scattering_coefficient: [-] leaf scattering coefficient
+        canopy_reflectance_to_direct_irradiance: [-] canopy reflectance to direct (beam) irradiance
+        canopy_reflectance_to_diffuse_irradiance: [-] canopy reflectance to diffuse irradiance
+        direct_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam) irradiance
+        direct_black_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam)
+            irradiance for black leaves
+        diffuse_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of diffuse irradiance
+
+    Returns:
+        [-] fraction of sunlit leaves of the considered layer
+        [W m-2ground] the absorbed direct, diffuse and scattered irradiance by sunlit leaves, then the absorbed
+            diffuse and scattered irradiance by shaded leaves of the layer per unit ground area (see the
+            `calc_absorbed_*_leaf_layer` functions of `sunlit_shaded_leaves`)
+    """
+    upper_lai = upper_cumulative_leaf_area_index
+    lower_lai = upper_cumulative_leaf_area_index + leaf_layer_thickness
+    k_b = direct_black_extinction_coefficient
+    k_d = diffuse_extinction_coefficient
+    k_p = direct_extinction_coefficient
+    k_db = k_d + k_b
+    k_pb = k_p + k_b
+
+    # differences of the exponential extinction terms between the top and the bottom of the layer
+    delta_b = exp(-k_b * upper_lai) - exp(-k_b * lower_lai)
+    delta_2b = exp(-2 * k_b * upper_lai) - exp(-2 * k_b * lower_lai)
+    delta_d = exp(-k_d * upper_lai) - exp(-k_d * lower_lai)
+    delta_db = exp(-k_db * upper_lai) - exp(-k_db * lower_lai)
+    delta_p = exp(-k_p * upper_lai) - exp(-k_p * lower_lai)
+    delta_pb = exp(-k_pb * upper_lai) - exp(-k_pb * lower_lai)
+
+    absorbed_direct = incident_direct_irradiance * (1 - leaf_scattering_coefficient)
+    absorbed_diffuse = incident_diffuse_irradiance * (
+        1 - canopy_reflectance_to_diffuse_irradiance
+    )
+    absorbed_total_direct = incident_direct_irradiance * (
+        1 - canopy_reflectance_to_direct_irradiance
+    )
+
+    sunlit_fraction = delta_b / (k_b * leaf_layer_thickness)
+    direct_by_sunlit = absorbed_direct * delta_b
+    diffuse_by_sunlit = absorbed_diffuse * (k_d / k_db * delta_db)
+    scattered_by_sunlit = (
+        absorbed_total_direct * (k_p / k_pb * delta_pb)
+        - absorbed_direct * 0.5 * delta_2b
+    )
+    diffuse_by_shaded = absorbed_diffuse * (delta_d - k_d / k_db * delta_db)
+    scattered_by_shaded = absorbed_total_direct * (
+        delta_p - k_p / k_pb * delta_pb
+    ) - absorbed_direct * (delta_b - 0.5 * delta_2b)
+
+    return (
+        sunlit_fraction,
+        direct_by_sunlit,
+        diffuse_by_sunlit,
+        scattered_by_sunlit,
+        diffuse_by_shaded,
+        scattered_by_shaded,
+    )
+
+
+def calc_sunlit_shaded_totals_kernel(
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    upper_cumulative_leaf_area_index: float,
+    leaf_layer_thickness: float,
+    leaf_scattering_coefficient: float,
+    canopy_reflectance_to_direct_irradiance: float,
+    canopy_reflectance_to_diffuse_irradiance: float,
+    direct_extinction_coefficient: float,
+    direct_black_extinction_coefficient: float,
+    diffuse_extinction_coefficient: float,
+) -> tuple:
+    """Calculates the absorbed irradiance by sunlit and shaded leaves of a layer, without its components.
+
+    Args:
+        see :func:`calc_sunlit_shaded_kernel`
+
+    Returns:
+        [W m-2ground] the absorbed irradiance by sunlit leaves, then by shaded leaves of the layer per unit ground area
+
+    Notes:
+        The absorbed irradiance by shaded leaves is that by the whole layer (see :func:`calc_de_pury_kernel`) minus that
+            by sunlit leaves, which saves the evaluation of the sunlit fraction and of the shaded components.
+    """
+    upper_lai = upper_cumulative_leaf_area_index
+    lower_lai = upper_cumulative_leaf_area_index + leaf_layer_thickness
+    k_b = direct_black_extinction_coefficient
+    k_d = diffuse_extinction_coefficient
+    k_p = direct_extinction_coefficient
+    k_db = k_d + k_b
+    k_pb = k_p + k_b
+
+    absorbed_direct = incident_direct_irradiance * (1 - leaf_scattering_coefficient)
+    absorbed_diffuse = incident_diffuse_irradiance * (
+        1 - canopy_reflectance_to_diffuse_irradiance
+    )
+    absorbed_total_direct = incident_direct_irradiance * (
+        1 - canopy_reflectance_to_direct_irradiance
+    )
+
+    sunlit = (
+        absorbed_direct
+        * (
+            exp(-k_b * upper_lai)
+            - exp(-k_b * lower_lai)
+            - 0.5 * (exp(-2 * k_b * upper_lai) - exp(-2 * k_b * lower_lai))
+        )
+        + absorbed_diffuse
+        * (k_d / k_db)
+        * (exp(-k_db * upper_lai) - exp(-k_db * lower_lai))
+        + absorbed_total_direct
+        * (k_p / k_pb)
+        * (exp(-k_pb * upper_lai) - exp(-k_pb * lower_lai))
+    )
+    shaded = (
+        absorbed_diffuse * (exp(-k_d * upper_lai) - exp(-k_d * lower_lai))
+        + absorbed_total_direct * (exp(-k_p * upper_lai) - exp(-k_p * lower_lai))
+        - sunlit
+    )
+    return sunlit, shaded
+
+
+@lru_cache()
+def is_jit_available() -> bool:
+    """Returns whether Numba can be imported to compile the kernels."""
+    try:
+        import numba  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_kernel(name: str, jit: bool = True):
+    """Returns a kernel, compiled on first use by Numba if possible.
+
+    Args:
+        name: one of :data:`KERNELS_NAMES`
+        jit: if False, the pure Python kernel is returned even when Numba is available
+
+    Returns:
+        The kernel function, either compiled or pure Python when Numba is not installed
+    """
+    assert name in KERNELS_NAMES, f"Unknown kernel: {name}"
+    kernel = globals()[f"calc_{name}_kernel"]
+    if not (jit and is_jit_available()):
+        return kernel
+    if name not in _compiled_kernels:
+        import numba
+
+        _compiled_kernels[name] = numba.njit(cache=True, fastmath=False)(kernel)
+    return _compiled_kernels[name]
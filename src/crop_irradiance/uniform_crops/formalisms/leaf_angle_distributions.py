@@ -0,0 +1,191 @@
+"""Parametric leaf angle distributions and their projection (G) functions.
+
+The projection function :math:`G` of a distribution is the mean projection of a unit leaf area in the direction of the
+incident irradiance, so that the extinction coefficient of direct irradiance through black leaves is
+:math:`\\Omega G / \\sin \\beta`, where :math:`\\Omega` is the clumping factor and :math:`\\beta` the angle of solar
+inclination. Projection functions are integrated numerically once per distribution into a table of values at regularly
+spaced solar inclinations, which is then linearly interpolated by all extinction calculations.
+"""
+
+from functools import lru_cache
+from math import acos, cos, pi, sin, sqrt, tan
+
+# distributions of de Wit (1965) having a fixed shape, and the ellipsoidal distribution of Campbell (1990) whose shape
+#   is set by the leaf angle distribution factor
+LEAF_ANGLE_DISTRIBUTIONS = (
+    "ellipsoidal",
+    "planophile",
+    "erectophile",
+    "plagiophile",
+    "extremophile",
+    "uniform",
+    "spherical",
+)
+
+# [-] number of values of projection tables, regularly spaced from 0 to pi/2 rad of solar inclination
+PROJECTION_TABLE_SIZE = 91
+
+# [-] number of (midpoint) quadrature points over leaf inclination used to integrate projection functions
+LEAF_INCLINATION_POINTS = 360
+
+
+def calc_ellipsoidal_ratio(leaf_angle_distribution_factor: float) -> float:
+    """Calculates the ratio of the horizontal to the vertical semi-axes of the ellipsoid of an ellipsoidal distribution.
+
+    Args:
+        leaf_angle_distribution_factor: [-] factor describing leaf angle distribution (for spherical distributions its
+            value equals rad(56) = 0.9773843811168246)
+
+    Returns:
+        [-] the ratio of the horizontal to the vertical semi-axes of the ellipsoid (1 for spherical distributions,
+            higher for planophile canopies and lower for erectophile ones)
+
+    References:
+        Campbell G. S. (1990).
+            Derivation of an angle density function for canopies with ellipsoidal leaf angle distributions.
+            Agricultural and Forest Meteorology 49, 173 - 176.
+    """
+    return (leaf_angle_distribution_factor / 9.65) ** -0.6061 - 3.0
+
+
+def calc_leaf_inclination_density(
+    leaf_inclination: float,
+    leaf_angle_distribution: str,
+    leaf_angle_distribution_factor: float = None,
+) -> float:
+    """Calculates the (unnormalized) probability density of leaf inclination.
+
+    Args:
+        leaf_inclination: [rad] angle of inclination of leaves from the horizontal, from 0 to pi/2
+        leaf_angle_distribution: one of :data:`LEAF_ANGLE_DISTRIBUTIONS`
+        leaf_angle_distribution_factor: [-] factor describing leaf angle distribution, only used by 'ellipsoidal'
+            distributions
+
+    Returns:
+        [rad-1] the probability density of leaf inclination, up to a normalization constant
+
+    References:
+        de Wit C. T. (1965).
+            Photosynthesis of leaf canopies.
+            Agricultural Research Reports 663, Pudoc, Wageningen, 57 pp.
+        Campbell G. S. (1990).
+            Derivation of an angle density function for canopies with ellipsoidal leaf angle distributions.
+            Agricultural and Forest Meteorology 49, 173 - 176.
+    """
+    assert (
+        leaf_angle_distribution in LEAF_ANGLE_DISTRIBUTIONS
+    ), f"Unknown leaf angle distribution: {leaf_angle_distribution}"
+    if leaf_angle_distribution == "ellipsoidal":
+        ratio = calc_ellipsoidal_ratio(leaf_angle_distribution_factor)
+        return (
+            sin(leaf_inclination)
+            / (cos(leaf_inclination) ** 2 + ratio**2 * sin(leaf_inclination) ** 2) ** 2
+        )
+    elif leaf_angle_distribution == "planophile":
+        return 1 + cos(2 * leaf_inclination)
+    elif leaf_angle_distribution == "erectophile":
+        return 1 - cos(2 * leaf_inclination)
+    elif leaf_angle_distribution == "plagiophile":
+        return 1 - cos(4 * leaf_inclination)
+    elif leaf_angle_distribution == "extremophile":
+        return 1 + cos(4 * leaf_inclination)
+    elif leaf_angle_distribution == "uniform":
+        return 1.0
+    else:
+        return sin(leaf_inclination)
+
+
+def calc_leaf_projection(solar_inclination: float, leaf_inclination: float) -> float:
+    """Calculates the projection of a unit leaf area, averaged over leaf azimuths, in the direction of the sun.
+
+    Args:
+        solar_inclination: [rad] angle of solar inclination
+        leaf_inclination: [rad] angle of inclination of leaves from the horizontal
+
+    Returns:
+        [m2ground m-2leaf] the projection of leaves on a plane perpendicular to the direction of the sun
+
+    References:
+        Goudriaan J. (1988)
+            The bare bones of leaf-angle distribution in radiation models for canopy photosynthesis and energy exchange.
+            Agricultural and Forest Meteorology 43, 155 - 169.
+    """
+    if leaf_inclination <= solar_inclination:
+        return sin(solar_inclination) * cos(leaf_inclination)
+    cosine = tan(solar_inclination) / tan(leaf_inclination)
+    azimuth = acos(cosine)
+    return sin(solar_inclination) * cos(leaf_inclination) * (
+        1 - 2 * azimuth / pi
+    ) + 2 / pi * sin(leaf_inclination) * cos(solar_inclination) * sqrt(1 - cosine**2)
+
+
+@lru_cache(maxsize=256)
+def calc_projection_table(
+    leaf_angle_distribution: str, leaf_angle_distribution_factor: float = None
+) -> tuple:
+    """Calculates the projection function of a leaf angle distribution at regularly spaced solar inclinations.
+
+    Args:
+        leaf_angle_distribution: one of :data:`LEAF_ANGLE_DISTRIBUTIONS`
+        leaf_angle_distribution_factor: [-] factor describing leaf angle distribution, only used by 'ellipsoidal'
+            distributions
+
+    Returns:
+        [m2ground m-2leaf] the projection function at :data:`PROJECTION_TABLE_SIZE` solar inclinations regularly
+            spaced from 0 to pi/2 rad
+
+    Notes:
+        Tables are calculated once per distribution (and factor, for ellipsoidal distributions).
+    """
+    if leaf_angle_distribution != "ellipsoidal":
+        leaf_angle_distribution_factor = None
+    increment = (pi / 2) / LEAF_INCLINATION_POINTS
+    leaf_inclinations = [increment * (i + 0.5) for i in range(LEAF_INCLINATION_POINTS)]
+    densities = [
+        calc_leaf_inclination_density(
+            leaf_inclination, leaf_angle_distribution, leaf_angle_distribution_factor
+        )
+        for leaf_inclination in leaf_inclinations
+    ]
+    total_density = sum(densities)
+
+    table = []
+    for i in range(PROJECTION_TABLE_SIZE):
+        solar_inclination = (pi / 2) * i / (PROJECTION_TABLE_SIZE - 1)
+        table.append(
+            sum(
+                density * calc_leaf_projection(solar_inclination, leaf_inclination)
+                for density, leaf_inclination in zip(densities, leaf_inclinations)
+            )
+            / total_density
+        )
+    return tuple(table)
+
+
+def calc_projection_function(
+    solar_inclination: float,
+    leaf_angle_distribution: str,
+    leaf_angle_distribution_factor: float = None,
+) -> float:
+    """Calculates the projection (G) function of a leaf angle distribution by interpolation of its table.
+
+    Args:
+        solar_inclination: [rad] angle of solar inclination
+        leaf_angle_distribution: one of :data:`LEAF_ANGLE_DISTRIBUTIONS`
+        leaf_angle_distribution_factor: [-] factor describing leaf angle distribution, only used by 'ellipsoidal'
+            distributions
+
+    Returns:
+        [m2ground m-2leaf] the mean projection of a unit leaf area in the direction of the sun
+    """
+    if leaf_angle_distribution != "ellipsoidal":
+        leaf_angle_distribution_factor = None
+    table = calc_projection_table(
+        leaf_angle_distribution, leaf_angle_distribution_factor
+    )
+    # the sun is symmetrical about the zenith, e.g. below the horizon after sunset
+    solar_inclination = max(0.0, min(solar_inclination, pi - solar_inclination))
+    position = solar_inclination / (pi / 2) * (len(table) - 1)
+    index = min(int(position), len(table) - 2)
+    weight = position - index
+    return (1 - weight) * table[index] + weight * table[index + 1]
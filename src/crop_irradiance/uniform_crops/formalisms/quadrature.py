@@ -0,0 +1,72 @@
+from math import cos, pi
+
+
+def calc_gauss_legendre_points(points_number: int) -> (list, list):
+    """Calculates Gauss-Legendre abscissas and weights over the interval [-1, 1].
+
+    Args:
+        points_number: [-] number of quadrature points
+
+    Returns:
+        [-] abscissas of the quadrature points, in increasing order
+        [-] weights of the quadrature points (summing up to 2)
+
+    Notes:
+        The roots of the Legendre polynomial are found using Newton's method, starting from the approximation of
+            Tricomi (1950), which converges within a handful of iterations for the small number of points that are
+            typically used over canopy depth.
+    """
+    assert (
+        points_number > 0
+    ), "The number of quadrature points must be a positive integer"
+
+    abscissas = [0.0] * points_number
+    weights = [0.0] * points_number
+    for i in range((points_number + 1) // 2):
+        root = cos(pi * (i + 0.75) / (points_number + 0.5))
+        for _ in range(100):
+            polynomial, previous_polynomial = 1.0, 0.0
+            for j in range(1, points_number + 1):
+                polynomial, previous_polynomial = (
+                    (2 * j - 1) * root * polynomial - (j - 1) * previous_polynomial
+                ) / j, polynomial
+            derivative = (
+                points_number
+                * (root * polynomial - previous_polynomial)
+                / (root**2 - 1.0)
+            )
+            increment = polynomial / derivative
+            root -= increment
+            if abs(increment) < 1.0e-15:
+                break
+        weight = 2.0 / ((1.0 - root**2) * derivative**2)
+        abscissas[i], abscissas[-1 - i] = -root, root
+        weights[i], weights[-1 - i] = weight, weight
+
+    return abscissas, weights
+
+
+def calc_canopy_gauss_points(
+    leaf_area_index: float, points_number: int
+) -> (list, list):
+    """Calculates the depths and weights of Gauss-Legendre points along the cumulative leaf area index of a canopy.
+
+    Args:
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy
+        points_number: [-] number of quadrature points
+
+    Returns:
+        [m2leaf m-2ground] cumulative downwards leaf area index at each quadrature point, ordered from the top to the
+            bottom of the canopy
+        [m2leaf m-2ground] weights of each quadrature point (summing up to the leaf area index)
+
+    Notes:
+        The integral over the canopy of any quantity :math:`f` expressed per unit leaf area is approximated as
+            :math:`\\sum_i w_i f(L_i)`, which yields a value per unit ground area.
+    """
+    abscissas, weights = calc_gauss_legendre_points(points_number)
+    half_leaf_area_index = 0.5 * leaf_area_index
+    return (
+        [half_leaf_area_index * (1.0 + x) for x in abscissas],
+        [half_leaf_area_index * w for w in weights],
+    )
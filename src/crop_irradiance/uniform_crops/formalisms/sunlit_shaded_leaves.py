@@ -1,5 +1,7 @@
-from math import exp, log, pi, sin, sqrt, tan
+from functools import lru_cache
+from math import exp, expm1, log1p, pi, sin, sqrt, tan
 
+from crop_irradiance.uniform_crops.formalisms import leaf_angle_distributions
 from crop_irradiance.uniform_crops.formalisms.config import PRECISION
 
 
@@ -27,6 +29,7 @@ def calc_direct_black_extinction_coefficient(
     solar_inclination: float,
     leaf_angle_distribution_factor: float,
     clumping_factor: float,
+    leaf_angle_distribution: str = None,
 ) -> float:
     """Calculates the extinction coefficient of direct (beam) irradiance through a canopy of black leaves.
 
@@ -36,6 +39,9 @@ def calc_direct_black_extinction_coefficient(
             value equals rad(56) = 0.9773843811168246)
         clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves
             (Weiss et al. 2004)
+        leaf_angle_distribution: one of `leaf_angle_distributions.LEAF_ANGLE_DISTRIBUTIONS` whose tabulated
+            projection function is used, or None (default) to use the approximation of Campbell (1990) for ellipsoidal
+            distributions
 
     Returns:
         [m2ground m-2leaf] the extinction coefficient of direct (beam) irradiance through a canopy of black leaves
@@ -50,6 +56,11 @@ def calc_direct_black_extinction_coefficient(
 
     """
     solar_inclination = max(PRECISION, solar_inclination)
+    if leaf_angle_distribution is not None:
+        projection = leaf_angle_distributions.calc_projection_function(
+            solar_inclination, leaf_angle_distribution, leaf_angle_distribution_factor
+        )
+        return clumping_factor * projection / max(PRECISION, sin(solar_inclination))
     projection_ratio = (leaf_angle_distribution_factor / 9.65) ** -0.6061 - 3.0
     numerator = (projection_ratio**2 + tan(solar_inclination) ** -2) ** 0.5
     denominator = projection_ratio + 1.774 * (projection_ratio + 1.182) ** -0.733
@@ -61,6 +72,7 @@ def calc_direct_extinction_coefficient(
     leaf_scattering_coefficient: float,
     leaf_angle_distribution_factor: float,
     clumping_factor: float,
+    leaf_angle_distribution: str = None,
 ) -> float:
     """Calculates the extinction coefficient of direct (beam) irradiance through a canopy.
 
@@ -71,6 +83,9 @@ def calc_direct_extinction_coefficient(
             value equals rad(56) = 0.9773843811168246)
         clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves
             (Weiss et al. 2004)
+        leaf_angle_distribution: one of `leaf_angle_distributions.LEAF_ANGLE_DISTRIBUTIONS` whose tabulated
+            projection function is used, or None (default) to use the approximation of Campbell (1990) for ellipsoidal
+            distributions
 
     Returns:
         [m2ground m-2leaf] the extinction coefficient of direct (beam) irradiance through the canopy
@@ -89,11 +104,28 @@ def calc_direct_extinction_coefficient(
         solar_inclination=solar_inclination,
         leaf_angle_distribution_factor=leaf_angle_distribution_factor,
         clumping_factor=clumping_factor,
+        leaf_angle_distribution=leaf_angle_distribution,
     )
 
     return direct_black_extinction_coefficient * sqrt(1 - leaf_scattering_coefficient)
 
 
+@lru_cache(maxsize=None)
+def calc_sky_sectors_angle(sky_sectors_number: int) -> tuple:
+    """Calculates the angles of inclination of the centers of sky sectors (rings).
+
+    Args:
+        sky_sectors_number: [-] number of sky sectors to be used
+
+    Returns:
+        [rad] the angles of inclination of the centers of the sky sectors, from the horizon to the zenith
+    """
+    angle_increment = (
+        (pi / 2.0) / sky_sectors_number / 2.0
+    )  # half increment in sky ring declination angle
+    return tuple(angle_increment * (1.0 + 2.0 * i) for i in range(sky_sectors_number))
+
+
 def calc_sky_sectors_weight(sky_sectors_number: int, sky_type: str) -> list:
     """Calculates the contributions from sky sectors (rings) to diffuse irradiance.
 
@@ -103,16 +135,28 @@ def calc_sky_sectors_weight(sky_sectors_number: int, sky_type: str) -> list:
 
     Returns:
         [-] the contributions from sky sectors (rings) to diffuse irradiance
+
+    Notes:
+        Weights are calculated once per sky type and number of sectors.
     """
+    return list(_calc_sky_sectors_weight(sky_sectors_number, sky_type))
+
+
+@lru_cache(maxsize=None)
+def _calc_sky_sectors_weight(sky_sectors_number: int, sky_type: str) -> tuple:
     sky_weights = []
+    angle_increment = (
+        (pi / 2.0) / sky_sectors_number / 2.0
+    )  # half increment in sky ring declination angle
     if sky_type == "uoc":
-        assert sky_sectors_number == 3, ""
-        sky_weights = [0.25, 0.5, 0.25]
+        for i in range(sky_sectors_number):
+            lower_angle = i * 2.0 * angle_increment
+            upper_angle = (i + 1) * 2.0 * angle_increment
+            # The radiance of a uniform overcast sky is isotropic, hence its contribution to the irradiance of a
+            # horizontal plane is proportional to the integral of sin(2 * angle) over each sky ring.
+            weight = sin(upper_angle) ** 2 - sin(lower_angle) ** 2
+            sky_weights.append(weight)
     elif sky_type == "soc":
-        sky_weights = []
-        angle_increment = (
-            (pi / 2.0) / sky_sectors_number / 2.0
-        )  # half increment in sky ring declination angle
         for i in range(sky_sectors_number):
             lower_angle = i * 2.0 * angle_increment
             upper_angle = (i + 1) * 2.0 * angle_increment
@@ -124,7 +168,38 @@ def calc_sky_sectors_weight(sky_sectors_number: int, sky_type: str) -> list:
             ) / (7.0 / 6.0)
             sky_weights.append(weight)
 
-    return sky_weights
+    # weights are normalized so that the floating point noise of sine evaluations does not alter their sum
+    weights_sum = sum(sky_weights)
+    sky_weights = [weight / weights_sum for weight in sky_weights]
+    return tuple(sky_weights)
+
+
+@lru_cache(maxsize=1024)
+def _calc_sky_sectors_direct_black_extinction_coefficient(
+    sky_sectors_number: int,
+    leaf_angle_distribution_factor: float,
+    clumping_factor: float,
+    leaf_angle_distribution: str = None,
+) -> tuple:
+    return tuple(
+        calc_direct_black_extinction_coefficient(
+            solar_inclination=sector_angle,
+            leaf_angle_distribution_factor=leaf_angle_distribution_factor,
+            clumping_factor=clumping_factor,
+            leaf_angle_distribution=leaf_angle_distribution,
+        )
+        for sector_angle in calc_sky_sectors_angle(sky_sectors_number)
+    )
+
+
+@lru_cache(maxsize=None)
+def _calc_sky_sectors_black_leaves_extinction_coefficient(
+    sky_sectors_number: int,
+) -> tuple:
+    return tuple(
+        0.5 / sin(sector_angle)
+        for sector_angle in calc_sky_sectors_angle(sky_sectors_number)
+    )
 
 
 def calc_diffuse_extinction_coefficient(
@@ -134,6 +209,7 @@ def calc_diffuse_extinction_coefficient(
     leaf_scattering_coefficient: float,
     sky_sectors_number: int = 3,
     sky_type: str = "soc",
+    leaf_angle_distribution: str = None,
 ) -> (float, float):
     """Calculates the diffuse extinction coefficients for canopies with non-black and black leaves.
 
@@ -146,47 +222,60 @@ def calc_diffuse_extinction_coefficient(
         leaf_scattering_coefficient: [-] leaf scattering coefficient
         sky_sectors_number: [-] number of sky sectors to be used
         sky_type: one of 'soc' or 'uoc' (Sky OverCast and Uniform OverCast, respectively)
+        leaf_angle_distribution: one of `leaf_angle_distributions.LEAF_ANGLE_DISTRIBUTIONS`, or None (default) to use
+            the approximation of Campbell (1990) for ellipsoidal distributions
 
     Returns:
         [m2ground m-2leaf] the extinction coefficient of diffuse irradiance through a canopy of non-black leaves
         [m2ground m-2leaf] the extinction coefficient of diffuse irradiance through a canopy of black leaves
 
+    Notes:
+        The weights and the extinction coefficients of direct irradiance coming from the center of each sky sector
+            are calculated once per sky type, number of sectors, leaf angle distribution and clumping factor, so that
+            each call only sums the transmitted fractions over sectors (see
+            :func:`vectorized.calc_diffuse_extinction_coefficient` to sum them with NumPy).
+
     References:
         Goudriaan J. (1988)
             The bare bones of leaf-angle distribution in radiation models for canopy photosynthesis and energy exchange.
             Agricultural and Forest Meteorology 43, 155 - 169.
     """
     leaf_area_index = max(PRECISION, leaf_area_index)
-    sky_weights = calc_sky_sectors_weight(sky_sectors_number, sky_type)
-
-    angle_increment = (
-        (pi / 2.0) / sky_sectors_number / 2.0
-    )  # half increment in sky ring declination angle
-
-    diffuse_extinction_coefficient = 0.0
-    diffuse_black_extinction_coefficient = 0.0
-
-    for i in range(sky_sectors_number):
-        sector_angle = angle_increment * (1.0 + 2.0 * i)
-        direct_extinction_coefficient = calc_direct_extinction_coefficient(
-            solar_inclination=sector_angle,
-            leaf_scattering_coefficient=leaf_scattering_coefficient,
-            leaf_angle_distribution_factor=leaf_angle_distribution_factor,
-            clumping_factor=clumping_factor,
+    # single-valued arrays are read as floats, which are the keys of the cached coefficients of sky sectors
+    sky_sectors_number = int(sky_sectors_number)
+    leaf_angle_distribution_factor = float(leaf_angle_distribution_factor)
+    clumping_factor = float(clumping_factor)
+
+    sky_weights = _calc_sky_sectors_weight(sky_sectors_number, sky_type)
+    transmission_factor = sqrt(1 - leaf_scattering_coefficient)
+    diffuse_extinction_coefficient = sum(
+        weight
+        * expm1(-(extinction_coefficient * transmission_factor) * leaf_area_index)
+        for weight, extinction_coefficient in zip(
+            sky_weights,
+            _calc_sky_sectors_direct_black_extinction_coefficient(
+                sky_sectors_number,
+                leaf_angle_distribution_factor,
+                clumping_factor,
+                leaf_angle_distribution,
+            ),
         )
-        diffuse_extinction_coefficient += sky_weights[i] * exp(
-            -direct_extinction_coefficient * leaf_area_index
-        )
-
-        diffuse_black_extinction_coefficient += sky_weights[i] * exp(
-            -(0.5 / sin(sector_angle)) * leaf_area_index
+    )
+    diffuse_black_extinction_coefficient = sum(
+        weight * expm1(-extinction_coefficient * leaf_area_index)
+        for weight, extinction_coefficient in zip(
+            sky_weights,
+            _calc_sky_sectors_black_leaves_extinction_coefficient(sky_sectors_number),
         )
+    )
 
+    # the sums over sectors are those of the transmitted fractions minus 1 (weights summing up to 1), written with
+    #   expm1 and log1p to avoid cancellation errors in sparse canopies
     diffuse_extinction_coefficient = (
-        -1.0 / leaf_area_index * log(diffuse_extinction_coefficient)
+        -1.0 / leaf_area_index * log1p(diffuse_extinction_coefficient)
     )
     diffuse_black_extinction_coefficient = (
-        -1.0 / leaf_area_index * log(diffuse_black_extinction_coefficient)
+        -1.0 / leaf_area_index * log1p(diffuse_black_extinction_coefficient)
     )
 
     return diffuse_extinction_coefficient, diffuse_black_extinction_coefficient
@@ -337,6 +426,88 @@ def calc_absorbed_scattered_irradiance_at_given_depth(
     return incident_direct_irradiance * (gain_fraction - loss_fraction)
 
 
+def calc_absorbed_irradiance_by_shaded_leaves_at_given_depth(
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    cumulative_leaf_area_index: float,
+    leaf_scattering_coefficient: float,
+    canopy_reflectance_to_direct_irradiance: float,
+    canopy_reflectance_to_diffuse_irradiance: float,
+    direct_extinction_coefficient: float,
+    direct_black_extinction_coefficient: float,
+    diffuse_extinction_coefficient: float,
+) -> float:
+    """Calculates the absorbed irradiance per unit shaded leaf area at a given depth inside the canopy.
+
+    Args:
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        cumulative_leaf_area_index: [m2leaf m-2ground] cumulative downwards leaf area index
+        leaf_scattering_coefficient: [-] leaf scattering coefficient
+        canopy_reflectance_to_direct_irradiance: [-] canopy reflectance to direct (beam) irradiance
+        canopy_reflectance_to_diffuse_irradiance: [-] canopy reflectance to diffuse irradiance
+        direct_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam) irradiance
+        direct_black_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam)
+            irradiance for black leaves
+        diffuse_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of diffuse irradiance
+
+    Returns:
+        [W m-2leaf] the absorbed irradiance per unit shaded leaf area at the given depth inside the canopy
+    """
+    return calc_absorbed_diffuse_irradiance_at_given_depth(
+        incident_diffuse_irradiance,
+        cumulative_leaf_area_index,
+        canopy_reflectance_to_diffuse_irradiance,
+        diffuse_extinction_coefficient,
+    ) + calc_absorbed_scattered_irradiance_at_given_depth(
+        incident_direct_irradiance,
+        cumulative_leaf_area_index,
+        direct_extinction_coefficient,
+        direct_black_extinction_coefficient,
+        canopy_reflectance_to_direct_irradiance,
+        leaf_scattering_coefficient,
+    )
+
+
+def calc_absorbed_irradiance_by_sunlit_leaves_at_given_depth(
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    cumulative_leaf_area_index: float,
+    leaf_scattering_coefficient: float,
+    canopy_reflectance_to_direct_irradiance: float,
+    canopy_reflectance_to_diffuse_irradiance: float,
+    direct_extinction_coefficient: float,
+    direct_black_extinction_coefficient: float,
+    diffuse_extinction_coefficient: float,
+) -> float:
+    """Calculates the absorbed irradiance per unit sunlit leaf area at a given depth inside the canopy.
+
+    Args:
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        cumulative_leaf_area_index: [m2leaf m-2ground] cumulative downwards leaf area index
+        leaf_scattering_coefficient: [-] leaf scattering coefficient
+        canopy_reflectance_to_direct_irradiance: [-] canopy reflectance to direct (beam) irradiance
+        canopy_reflectance_to_diffuse_irradiance: [-] canopy reflectance to diffuse irradiance
+        direct_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam) irradiance
+        direct_black_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of direct (beam)
+            irradiance for black leaves
+        diffuse_extinction_coefficient: [m2ground m-2leaf] the extinction coefficient of diffuse irradiance
+
+    Returns:
+        [W m-2leaf] the absorbed irradiance per unit sunlit leaf area at the given depth inside the canopy
+
+    Notes:
+        Sunlit leaves absorb the same irradiance as shaded leaves in addition to the direct (beam) irradiance, which
+            is depth-independent.
+    """
+    return calc_absorbed_direct_irradiance(
+        incident_direct_irradiance,
+        leaf_scattering_coefficient,
+        direct_black_extinction_coefficient,
+    ) + calc_absorbed_irradiance_by_shaded_leaves_at_given_depth(**locals())
+
+
 def calc_sunlit_fraction_per_leaf_layer(
     upper_cumulative_leaf_area_index: float,
     leaf_layer_thickness: float,
@@ -0,0 +1,227 @@
+"""Tiled evaluation of gridded (raster) canopies with bounded memory.
+
+The leaf area index of each pixel of a grid is evaluated against forcing that is either given per pixel or broadcast
+over the grid, possibly along leading (e.g. time) axes. The grid is split into tiles of rows sized to a memory budget,
+each tile being evaluated at once by :mod:`crop_irradiance.uniform_crops.vectorized` and written to memory-mapped
+output grids, one NumPy '.npy' file per absorbed irradiance category. Tiles may be evaluated by several processes.
+
+This module requires NumPy.
+"""
+
+import os
+from collections import deque
+from multiprocessing import Pool
+from time import perf_counter
+
+import numpy
+
+from crop_irradiance.uniform_crops import vectorized
+from crop_irradiance.uniform_crops.params import LumpedParams, SunlitShadedParams
+from crop_irradiance.uniform_crops.service import (
+    LUMPED_INPUTS_NAMES,
+    SUNLIT_SHADED_INPUTS_NAMES,
+)
+
+# [-] approximate number of arrays of the size of the outputs of a tile that are held during its evaluation
+WORKING_ARRAYS_NUMBER = 32
+
+
+def calc_tile_rows_number(
+    row_shape: tuple, layers_number: int, dtype, memory_budget: int
+) -> int:
+    """Calculates the number of grid rows of tiles whose evaluation fits in a memory budget.
+
+    Args:
+        row_shape: shape of the outputs of one grid row per leaf layer (leading axes and columns)
+        layers_number: [-] number of leaf layers
+        dtype: floating point type of the evaluation
+        memory_budget: [bytes] memory available to the evaluation of one tile
+
+    Returns:
+        [-] the number of grid rows per tile (at least 1)
+    """
+    row_size = (
+        int(numpy.prod(row_shape))
+        * layers_number
+        * numpy.dtype(dtype).itemsize
+        * WORKING_ARRAYS_NUMBER
+    )
+    return max(1, memory_budget // max(1, row_size))
+
+
+def evaluate_tile(
+    leaves_category: str,
+    params: LumpedParams or SunlitShadedParams,
+    leaf_layer_thicknesses: numpy.ndarray,
+    forcing: dict,
+    dtype=numpy.float64,
+) -> dict:
+    """Evaluates the absorbed irradiance by the leaf layers of all pixels of a tile.
+
+    Args:
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        params: see class`LumpedParams` and `SunlitShadedParams`
+        leaf_layer_thicknesses: [m2leaf m-2ground] leaf layers thicknesses of the pixels of the tile, the last axis
+            being that of leaf layers ordered from the top to the bottom of the canopy
+        forcing: inputs values of the tile, as keyword arguments of the vectorized functions
+        dtype: floating point type of the evaluation (see `vectorized.COMPUTE_DTYPES`)
+
+    Returns:
+        A dictionary having as keys the absorbed irradiance categories ('sunlit' and 'shaded', or 'lumped')
+    """
+    if leaves_category == "sunlit-shaded":
+        results = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+            leaf_layer_thicknesses, params=params, dtype=dtype, **forcing
+        )
+        return {category: results[category] for category in ("sunlit", "shaded")}
+    results = vectorized.calc_lumped_absorbed_irradiance(
+        leaf_layer_thicknesses, params=params, dtype=dtype, **forcing
+    )
+    return {"lumped": results["lumped"]}
+
+
+def _run_tile(
+    output_paths: dict,
+    rows: slice,
+    leaves_category: str,
+    params: LumpedParams or SunlitShadedParams,
+    leaf_layer_thicknesses: numpy.ndarray,
+    forcing: dict,
+    dtype,
+) -> int:
+    """Evaluates a tile and writes its outputs to the memory-mapped output grids, returning its number of pixels."""
+    results = evaluate_tile(
+        leaves_category, params, leaf_layer_thicknesses, forcing, dtype
+    )
+    for category, values in results.items():
+        output = numpy.load(output_paths[category], mmap_mode="r+")
+        output[..., rows, :, :] = values
+        output.flush()
+        del output
+    return leaf_layer_thicknesses.shape[0] * leaf_layer_thicknesses.shape[1]
+
+
+def run_grid(
+    leaf_area_index,
+    output_directory: str,
+    leaves_category: str,
+    params: LumpedParams or SunlitShadedParams,
+    layers_number: int = 1,
+    memory_budget: int = 256 * 2**20,
+    processes: int = 1,
+    dtype=numpy.float64,
+    **forcing,
+) -> dict:
+    """Evaluates the absorbed irradiance by the leaf layers of all pixels of a grid, tile by tile.
+
+    Args:
+        leaf_area_index: [m2leaf m-2ground] either a 2-D array (rows, columns) of the leaf area index of each pixel,
+            which is divided into `layers_number` leaf layers of identical thickness, or a 3-D array (rows, columns,
+            leaf layers) of the leaf layers thicknesses of each pixel, ordered from the top to the bottom of the canopy
+        output_directory: directory in which the output grids are written
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        params: see class`LumpedParams` and `SunlitShadedParams`
+        layers_number: [-] number of leaf layers of 2-D leaf area index grids
+        memory_budget: [bytes] memory available to the evaluation of one tile (per process)
+        processes: [-] number of processes evaluating tiles, tiles being evaluated by the calling process if 1
+        dtype: floating point type of the evaluation and of the output grids (see `vectorized.COMPUTE_DTYPES`)
+        **forcing: inputs of the leaves category (see `service.SUNLIT_SHADED_INPUTS_NAMES` and
+            `service.LUMPED_INPUTS_NAMES`), as scalars or arrays broadcasting against the (rows, columns) grid, possibly
+            with leading (e.g. time) axes
+
+    Returns:
+        A dictionary having as keys
+            'outputs': a dictionary of the output grids of each absorbed irradiance category (read-only memory maps
+                whose shape is that of the broadcast forcing and grid, followed by the leaf layers axis)
+            'tiles_number': [-] number of evaluated tiles
+            'runtime': [s] wall-clock duration of the evaluation
+            'tiles_per_second' and 'pixels_per_second': [s-1] evaluation throughput
+    """
+    assert processes > 0, "At least one process is required"
+    if leaves_category == "sunlit-shaded":
+        inputs_names = SUNLIT_SHADED_INPUTS_NAMES
+        categories = ("sunlit", "shaded")
+    else:
+        inputs_names = LUMPED_INPUTS_NAMES[params.model]
+        categories = ("lumped",)
+    assert set(forcing) == set(
+        inputs_names
+    ), f"The forcing must be made of {', '.join(inputs_names)}"
+
+    started_at = perf_counter()
+    leaf_area_index = numpy.asarray(leaf_area_index, dtype=float)
+    if leaf_area_index.ndim == 2:
+        leaf_layer_thicknesses = numpy.broadcast_to(
+            leaf_area_index[..., None] / layers_number,
+            leaf_area_index.shape + (layers_number,),
+        )
+    else:
+        assert leaf_area_index.ndim == 3, "Leaf area index grids must be 2-D or 3-D"
+        leaf_layer_thicknesses = leaf_area_index
+    grid_shape = leaf_layer_thicknesses.shape[:2]
+    layers_number = leaf_layer_thicknesses.shape[-1]
+
+    outputs_shape = numpy.broadcast(numpy.empty(grid_shape), *forcing.values()).shape
+    forcing = {
+        name: numpy.broadcast_to(numpy.asarray(value, dtype=float), outputs_shape)
+        for name, value in forcing.items()
+    }
+    os.makedirs(output_directory, exist_ok=True)
+    output_paths = {
+        category: os.path.join(output_directory, f"{category}.npy")
+        for category in categories
+    }
+    for path in output_paths.values():
+        numpy.lib.format.open_memmap(
+            path, mode="w+", dtype=dtype, shape=outputs_shape + (layers_number,)
+        ).flush()
+
+    rows_number = calc_tile_rows_number(
+        outputs_shape[:-2] + outputs_shape[-1:], layers_number, dtype, memory_budget
+    )
+
+    def iter_tiles_arguments():
+        for first_row in range(0, grid_shape[0], rows_number):
+            rows = slice(first_row, first_row + rows_number)
+            yield (
+                output_paths,
+                rows,
+                leaves_category,
+                params,
+                numpy.ascontiguousarray(leaf_layer_thicknesses[rows]),
+                {
+                    name: numpy.ascontiguousarray(value[..., rows, :])
+                    for name, value in forcing.items()
+                },
+                dtype,
+            )
+
+    tiles_number, pixels_number = 0, 0
+    if processes == 1:
+        for arguments in iter_tiles_arguments():
+            pixels_number += _run_tile(*arguments)
+            tiles_number += 1
+    else:
+        with Pool(processes) as pool:
+            # at most two tiles per process are pending, so that memory use is bounded
+            pending = deque()
+            for arguments in iter_tiles_arguments():
+                pending.append(pool.apply_async(_run_tile, arguments))
+                while pending and (len(pending) >= 2 * processes or pending[0].ready()):
+                    pixels_number += pending.popleft().get()
+                    tiles_number += 1
+            while pending:
+                pixels_number += pending.popleft().get()
+                tiles_number += 1
+
+    runtime = perf_counter() - started_at
+    return {
+        "outputs": {
+            category: numpy.load(path, mmap_mode="r")
+            for category, path in output_paths.items()
+        },
+        "tiles_number": tiles_number,
+        "runtime": runtime,
+        "tiles_per_second": tiles_number / runtime,
+        "pixels_per_second": pixels_number / runtime,
+    }
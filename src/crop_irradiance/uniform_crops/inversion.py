@@ -0,0 +1,324 @@
+"""Inversion of canopy optical parameters from measured irradiance.
+
+The parameters of many plots (e.g. sensors pairs placed above and below the canopy) are fitted at once by a batched
+Levenberg-Marquardt algorithm that relies on :mod:`crop_irradiance.uniform_crops.vectorized`, so that each iteration
+evaluates the forward model once for all plots and timesteps.
+
+This module requires NumPy.
+"""
+
+from copy import copy
+from time import perf_counter
+
+import numpy
+
+from crop_irradiance.uniform_crops import derivatives, vectorized
+from crop_irradiance.uniform_crops.params import LumpedParams, SunlitShadedParams
+
+PARAMETERS_BOUNDS = {
+    "clumping_factor": (1.0e-3, 2.0),
+    "leaf_angle_distribution_factor": (1.0e-2, 1.5),
+    "extinction_coefficient": (1.0e-3, 10.0),
+}
+
+ANALYTIC_DERIVATIVES_PARAMETERS = ("clumping_factor", "extinction_coefficient")
+
+# names of the parameters that can be fitted for each model (None for `SunlitShadedParams`), the first being fitted by
+#   default
+FITTED_PARAMETERS = {
+    "beer": ("extinction_coefficient",),
+    "de_pury": ("clumping_factor", "leaf_angle_distribution_factor"),
+    None: ("clumping_factor", "leaf_angle_distribution_factor"),
+}
+
+
+class InversionResult:
+    def __init__(
+        self,
+        parameters: dict,
+        cost: numpy.ndarray,
+        iterations: numpy.ndarray,
+        converged: numpy.ndarray,
+        observations_number: numpy.ndarray,
+        function_evaluations: int,
+        runtime: float,
+    ):
+        """Holds the results of the inversion of canopy parameters.
+
+        Args:
+            parameters: fitted values of each parameter (arrays having one value per plot)
+            cost: half the sum of squared residuals of each plot
+            iterations: number of iterations performed for each plot
+            converged: whether the fitting of each plot converged
+            observations_number: number of (finite) observations of each plot
+            function_evaluations: number of evaluations of the (batched) forward model
+            runtime: [s] wall-clock duration of the inversion
+        """
+        self.parameters = parameters
+        self.cost = cost
+        self.iterations = iterations
+        self.converged = converged
+        self.observations_number = observations_number
+        self.function_evaluations = function_evaluations
+        self.runtime = runtime
+
+    @property
+    def root_mean_square_error(self) -> numpy.ndarray:
+        """[W m-2ground] root mean square error of each plot."""
+        return numpy.sqrt(2 * self.cost / numpy.maximum(1, self.observations_number))
+
+    def __repr__(self):
+        return (
+            f"{self.__class__.__name__}(plots={len(self.cost)}, "
+            f"converged={int(self.converged.sum())}, runtime={self.runtime:.3f}s)"
+        )
+
+
+def _evaluate(
+    observation: str, leaf_layers, params, values: dict, forcing: dict
+) -> numpy.ndarray:
+    """Evaluates the forward model for each plot, where `values` hold the parameters as arrays of shape (plots, 1)."""
+    params = copy(params)
+    for name, value in values.items():
+        setattr(params, name, value)
+
+    if observation == "transmitted":
+        return vectorized.calc_transmitted_irradiance(leaf_layers, params, **forcing)
+    return vectorized.calc_canopy_absorbed_irradiance(leaf_layers, params, **forcing)
+
+
+def _evaluate_derivatives(
+    observation: str,
+    leaf_layers,
+    params,
+    values: dict,
+    forcing: dict,
+    parameters: tuple,
+) -> dict:
+    """Evaluates the analytic derivatives of the forward model w.r.t. `parameters` (among
+    :data:`ANALYTIC_DERIVATIVES_PARAMETERS`) for each plot.
+
+    The derivatives of the absorbed irradiance by the whole canopy are the sums over leaf layers of those of lumped
+        leaves (see :func:`vectorized.calc_lumped_jacobian`), and those of the transmitted irradiance follow from the
+        energy balance of the canopy, the reflected irradiance depending on the clumping factor through the canopy
+        reflectance to direct irradiance.
+    """
+    params = copy(params)
+    for name, value in values.items():
+        setattr(params, name, value)
+
+    jacobian = vectorized.calc_lumped_jacobian(
+        leaf_layers, params, **forcing, with_leaf_layer_thickness=False
+    )["lumped"]
+    results = {name: jacobian[name].sum(axis=-1) for name in parameters}
+    if observation == "absorbed":
+        return results
+
+    if "clumping_factor" in results:
+        direct_black_extinction_coefficient = (
+            vectorized.calc_sunlit_shaded_coefficients(
+                forcing["solar_inclination"],
+                vectorized.calc_leaf_layer_thicknesses(leaf_layers).sum(axis=-1),
+                params,
+            )["direct_black_extinction_coefficient"]
+        )
+        reflected_irradiance_derivative = (
+            forcing["incident_direct_irradiance"]
+            * derivatives.calc_canopy_reflectance_to_direct_irradiance_derivatives(
+                direct_black_extinction_coefficient,
+                params.clumping_factor,
+                params.leaf_scattering_coefficient,
+            )["clumping_factor"]
+        )
+        results["clumping_factor"] = (
+            results["clumping_factor"] + reflected_irradiance_derivative
+        )
+    return {name: -value for name, value in results.items()}
+
+
+def fit_canopy_optics(
+    observed_irradiance,
+    leaf_layers,
+    params: LumpedParams or SunlitShadedParams,
+    parameters: tuple = None,
+    observation: str = "transmitted",
+    incident_irradiance=None,
+    incident_direct_irradiance=None,
+    incident_diffuse_irradiance=None,
+    solar_inclination=None,
+    bounds: dict = None,
+    max_iterations: int = 100,
+    tolerance: float = 1.0e-10,
+) -> InversionResult:
+    """Fits canopy optical parameters of many plots to observed transmitted or absorbed irradiance time series.
+
+    Args:
+        observed_irradiance: [W m-2ground] observed irradiance, array of shape (plots, timesteps), where missing
+            values are given as NaN
+        leaf_layers: leaf layers thicknesses of each plot, array of shape (plots, layers) ordered from the top to the
+            bottom of the canopy, or a single profile (dictionary or 1-D array) shared by all plots
+        params: see class`LumpedParams` and `SunlitShadedParams`, providing the initial guess of the fitted parameters
+            and the values of the remaining ones
+        parameters: names of the fitted parameters, among 'clumping_factor', 'leaf_angle_distribution_factor' (for
+            `SunlitShadedParams` and the 'de_pury' model) and 'extinction_coefficient' (for the 'beer' model), defaults
+            to the first parameter of the model in :data:`FITTED_PARAMETERS`
+        observation: one of ('transmitted', 'absorbed'), the observed irradiance being respectively that measured
+            at the soil surface or that absorbed by the whole canopy
+        incident_irradiance: [W m-2ground] incident irradiance at the top of the canopy ('beer' model only)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        solar_inclination: [rad] angle of solar inclination
+        bounds: lower and upper bounds of the fitted parameters (defaults to `PARAMETERS_BOUNDS`)
+        max_iterations: maximum number of iterations
+        tolerance: relative reduction of the cost below which the fitting of a plot is considered as converged
+
+    Returns:
+        The fitted parameters and convergence diagnostics (see :class:`InversionResult`)
+
+    Notes:
+        Forcing variables may be given as arrays of shape (timesteps,) shared by all plots, or (plots, timesteps).
+        Derivatives w.r.t. the clumping factor and the extinction coefficient are analytic (see
+            :data:`ANALYTIC_DERIVATIVES_PARAMETERS`), and those w.r.t. the other fitted parameters are evaluated by
+            central finite differences, all plots being perturbed at once.
+    """
+    start_time = perf_counter()
+    assert observation in (
+        "transmitted",
+        "absorbed",
+    ), f"Unknown observation: {observation}"
+    fitted_parameters = FITTED_PARAMETERS[getattr(params, "model", None)]
+    if parameters is None:
+        parameters = fitted_parameters[:1]
+    assert set(parameters).issubset(
+        fitted_parameters
+    ), f"The fitted parameters must be among {fitted_parameters}"
+    bounds = {**PARAMETERS_BOUNDS, **(bounds or {})}
+
+    observed_irradiance = numpy.atleast_2d(
+        numpy.asarray(observed_irradiance, dtype=float)
+    )
+    plots_number = observed_irradiance.shape[0]
+    is_observed = numpy.isfinite(observed_irradiance)
+    observed_irradiance = numpy.where(is_observed, observed_irradiance, 0.0)
+
+    leaf_layer_thicknesses = vectorized.calc_leaf_layer_thicknesses(leaf_layers)
+    leaf_layer_thicknesses = numpy.broadcast_to(
+        leaf_layer_thicknesses,
+        (plots_number, leaf_layer_thicknesses.shape[-1]),
+    )[:, None, :]
+
+    forcing = {
+        name: value
+        for name, value in (
+            ("incident_irradiance", incident_irradiance),
+            ("incident_direct_irradiance", incident_direct_irradiance),
+            ("incident_diffuse_irradiance", incident_diffuse_irradiance),
+            ("solar_inclination", solar_inclination),
+        )
+        if value is not None
+    }
+
+    lower_bounds = numpy.array([bounds[name][0] for name in parameters])
+    upper_bounds = numpy.array([bounds[name][1] for name in parameters])
+    estimates = numpy.tile(
+        numpy.array([getattr(params, name) for name in parameters], dtype=float),
+        (plots_number, 1),
+    )
+    estimates = numpy.clip(estimates, lower_bounds, upper_bounds)
+
+    function_evaluations = 0
+
+    def _calc_residuals(values: numpy.ndarray) -> numpy.ndarray:
+        nonlocal function_evaluations
+        function_evaluations += 1
+        simulated_irradiance = _evaluate(
+            observation,
+            leaf_layer_thicknesses,
+            params,
+            {name: values[:, [i]] for i, name in enumerate(parameters)},
+            forcing,
+        )
+        return numpy.where(is_observed, simulated_irradiance - observed_irradiance, 0.0)
+
+    analytic_parameters = tuple(
+        name for name in parameters if name in ANALYTIC_DERIVATIVES_PARAMETERS
+    )
+
+    def _calc_jacobian(values: numpy.ndarray) -> numpy.ndarray:
+        jacobian = numpy.empty(observed_irradiance.shape + (len(parameters),))
+        if analytic_parameters:
+            analytic_jacobian = _evaluate_derivatives(
+                observation,
+                leaf_layer_thicknesses,
+                params,
+                {name: values[:, [i]] for i, name in enumerate(parameters)},
+                forcing,
+                analytic_parameters,
+            )
+        for i, name in enumerate(parameters):
+            if name in analytic_parameters:
+                jacobian[..., i] = numpy.where(
+                    is_observed, analytic_jacobian[name], 0.0
+                )
+                continue
+            step = 1.0e-6 * numpy.maximum(1.0, numpy.abs(values[:, i]))
+            upper_values, lower_values = values.copy(), values.copy()
+            upper_values[:, i] += step
+            lower_values[:, i] -= step
+            jacobian[..., i] = (
+                _calc_residuals(upper_values) - _calc_residuals(lower_values)
+            ) / (2 * step[:, None])
+        return jacobian
+
+    residuals = _calc_residuals(estimates)
+    cost = 0.5 * (residuals**2).sum(axis=-1)
+    damping = numpy.full(plots_number, 1.0e-3)
+    iterations = numpy.zeros(plots_number, dtype=int)
+    converged = numpy.zeros(plots_number, dtype=bool)
+
+    for _ in range(max_iterations):
+        is_active = ~converged
+        if not is_active.any():
+            break
+        iterations[is_active] += 1
+
+        jacobian = _calc_jacobian(estimates)
+        gradient = numpy.einsum("pti,pt->pi", jacobian, residuals)
+        hessian = numpy.einsum("pti,ptj->pij", jacobian, jacobian)
+        diagonal = numpy.einsum("pii->pi", hessian)
+        damped_hessian = hessian + (
+            damping[:, None] * numpy.maximum(diagonal, 1.0e-12)
+        )[..., None] * numpy.eye(len(parameters))
+        increment = -numpy.linalg.solve(damped_hessian, gradient[..., None])[..., 0]
+
+        candidates = numpy.clip(estimates + increment, lower_bounds, upper_bounds)
+        candidates_residuals = _calc_residuals(candidates)
+        candidates_cost = 0.5 * (candidates_residuals**2).sum(axis=-1)
+
+        is_improved = is_active & (candidates_cost <= cost)
+        relative_reduction = (cost - candidates_cost) / numpy.maximum(cost, 1.0e-300)
+        has_stalled = numpy.all(
+            numpy.abs(candidates - estimates)
+            <= tolerance * numpy.maximum(1.0, numpy.abs(estimates)),
+            axis=-1,
+        )
+        converged |= is_active & (
+            (is_improved & (relative_reduction <= tolerance))
+            | has_stalled
+            | (cost <= 1.0e-300)
+        )
+
+        estimates[is_improved] = candidates[is_improved]
+        residuals[is_improved] = candidates_residuals[is_improved]
+        cost[is_improved] = candidates_cost[is_improved]
+        damping = numpy.where(is_improved, damping / 10.0, damping * 10.0)
+
+    return InversionResult(
+        parameters={name: estimates[:, i] for i, name in enumerate(parameters)},
+        cost=cost,
+        iterations=iterations,
+        converged=converged,
+        observations_number=is_observed.sum(axis=-1),
+        function_evaluations=function_evaluations,
+        runtime=perf_counter() - start_time,
+    )
@@ -0,0 +1,155 @@
+"""Evaluation of the shoots of many sites, sharing canopy optics among sites of similar solar inclination.
+
+Sites of a regional batch are grouped by params and by solar inclination, either identical or quantized to a given
+tolerance. The canopy optics of each group and leaf area index are calculated once by the compute backend (see
+:func:`calc_canopy_optics`), at the midpoint of the solar inclinations of the sites of the group. Each shoot then reads
+the canopy optics of its group (see :class:`CanopyOptics`), results being returned in the order of the sites.
+"""
+
+from crop_irradiance.uniform_crops import backends
+from crop_irradiance.uniform_crops.params import (
+    OPTICS_COEFFICIENTS_NAMES,
+    OPTICS_CONFIGURATION_NAMES,
+    CanopyOptics,
+    _as_hashable,
+    calc_canopy_optics,
+)
+from crop_irradiance.uniform_crops.shoot import Shoot
+
+
+def quantize_solar_inclination(
+    solar_inclination: float, solar_inclination_tolerance: float
+) -> float:
+    """Returns the quantized solar inclination by which a site is grouped.
+
+    Args:
+        solar_inclination: [rad] angle of solar inclination of the site
+        solar_inclination_tolerance: [rad] quantization step of solar inclinations (sites are grouped by identical solar
+            inclinations if it is nil)
+
+    Returns:
+        [rad] the multiple of `solar_inclination_tolerance` that is the closest to `solar_inclination`
+
+    Notes:
+        The quantized value only identifies the group, whose coefficients are calculated at the midpoint of the solar
+            inclinations of its sites (see :func:`evaluate_sites`), since it may be nil near the horizon, where the
+            extinction coefficients of direct irradiance diverge.
+    """
+    if solar_inclination_tolerance == 0:
+        return float(solar_inclination)
+    return round(solar_inclination / solar_inclination_tolerance) * (
+        solar_inclination_tolerance
+    )
+
+
+def evaluate_sites(
+    leaves_category: str,
+    sites: list,
+    solar_inclination_tolerance: float = 0.0,
+    cache=None,
+    backend: str = None,
+) -> dict:
+    """Calculates the absorbed irradiance by the shoots of many sites, sharing optics among groups of sites.
+
+    Args:
+        leaves_category: one of ('lumped', 'sunlit-shaded')
+        sites: (inputs, params) pairs of the sites (see class`SunlitShadedInputs` and `SunlitShadedParams`, or
+            `LumpedInputs` and `LumpedParams` of the 'de_pury' model), params being only read
+        solar_inclination_tolerance: [rad] quantization step of the solar inclinations of sites (see
+            :func:`quantize_solar_inclination`)
+        cache: optional :class:`ResultCache` object (see :meth:`Shoot.calc_absorbed_irradiance`)
+        backend: name of the compute backend of canopy optics and leaf layers (see
+            :mod:`crop_irradiance.uniform_crops.backends`)
+
+    Returns:
+        A dictionary having as keys
+            'shoots': the evaluated shoot of each site, in the order of `sites`
+            'groups_number': [-] number of groups of sites sharing the same solar inclination
+            'optics_number': [-] number of distinct canopy optics (per group and leaf area index)
+            'max_solar_inclination_error': [rad] maximum difference between the solar inclination of a site and that
+                of its group (the midpoint of the solar inclinations of its sites, at most half the tolerance apart)
+            'max_direct_black_extinction_coefficient_error': [-] maximum relative difference between the extinction
+                coefficient of direct irradiance through black leaves of a group and that at the extreme solar
+                inclinations of its sites
+
+    Notes:
+        Results are identical to those of shoots evaluated one by one when `solar_inclination_tolerance` is nil.
+            Otherwise, the results stored in `cache` are those of the approximated solar inclination of the group,
+            which are stored under the canopy optics of the group (see :func:`cache.calc_cache_key`) and are thus not
+            read by shoots of other groups or tolerances.
+    """
+    assert solar_inclination_tolerance >= 0, "The tolerance must not be negative"
+    backend = backends.get_backend_name(backend)
+
+    groups = {}
+    for position, (inputs, params) in enumerate(sites):
+        model = getattr(params, "model", None)
+        assert model != "beer", "Canopy optics are not defined for the 'beer' model"
+        key = (
+            type(params).__name__,
+            model,
+            tuple(
+                _as_hashable(name, getattr(params, name))
+                for name in OPTICS_CONFIGURATION_NAMES
+            ),
+            quantize_solar_inclination(
+                inputs.solar_inclination, solar_inclination_tolerance
+            ),
+        )
+        groups.setdefault(key, []).append(position)
+
+    shoots = [None] * len(sites)
+    optics_number = 0
+    max_solar_inclination_error, max_extinction_coefficient_error = 0.0, 0.0
+    for (_, model, _, _), positions in groups.items():
+        params = sites[positions[0]][1]
+        inclinations = [sites[position][0].solar_inclination for position in positions]
+        solar_inclination = (min(inclinations) + max(inclinations)) / 2
+
+        group_optics = {}
+        for position in positions:
+            inputs, site_params = sites[position]
+            leaf_area_index = sum(inputs.leaf_layers.values())
+            if leaf_area_index not in group_optics:
+                optics = calc_canopy_optics(
+                    params, solar_inclination, leaf_area_index, backend
+                )
+                group_optics[leaf_area_index] = CanopyOptics(
+                    model,
+                    optics.solar_inclination,
+                    optics.leaf_area_index,
+                    solar_inclination_tolerance,
+                    **{
+                        name: getattr(optics, name)
+                        for name in OPTICS_COEFFICIENTS_NAMES
+                    },
+                )
+            shoot = Shoot(
+                leaves_category, inputs, site_params, group_optics[leaf_area_index]
+            )
+            shoot.calc_absorbed_irradiance(cache=cache, backend=backend)
+            shoots[position] = shoot
+        optics_number += len(group_optics)
+
+        for inclination in {min(inclinations), max(inclinations)}:
+            if inclination == solar_inclination:
+                continue
+            max_solar_inclination_error = max(
+                max_solar_inclination_error, abs(inclination - solar_inclination)
+            )
+            coefficient = optics.direct_black_extinction_coefficient
+            exact_coefficient = calc_canopy_optics(
+                params, inclination, optics.leaf_area_index, backend
+            ).direct_black_extinction_coefficient
+            max_extinction_coefficient_error = max(
+                max_extinction_coefficient_error,
+                abs(coefficient - exact_coefficient) / exact_coefficient,
+            )
+
+    return {
+        "shoots": shoots,
+        "groups_number": len(groups),
+        "optics_number": optics_number,
+        "max_solar_inclination_error": max_solar_inclination_error,
+        "max_direct_black_extinction_coefficient_error": max_extinction_coefficient_error,
+    }
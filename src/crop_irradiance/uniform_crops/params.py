@@ -1,6 +1,193 @@
+from functools import lru_cache
+from types import SimpleNamespace
+
+from crop_irradiance.uniform_crops import backends
 from crop_irradiance.uniform_crops.formalisms import config, sunlit_shaded_leaves
 from crop_irradiance.uniform_crops.inputs import LumpedInputs, SunlitShadedInputs
 
+# names of the params attributes from which canopy optics are calculated
+OPTICS_CONFIGURATION_NAMES = (
+    "leaf_angle_distribution_factor",
+    "leaf_angle_distribution",
+    "clumping_factor",
+    "leaf_scattering_coefficient",
+    "sky_sectors_number",
+    "sky_type",
+    "canopy_reflectance_to_diffuse_irradiance",
+)
+
+# names of the coefficients of canopy optics, as the attributes of params set by `update()`
+OPTICS_COEFFICIENTS_NAMES = (
+    "leaf_scattering_coefficient",
+    "canopy_reflectance_to_diffuse_irradiance",
+    "direct_black_extinction_coefficient",
+    "direct_extinction_coefficient",
+    "diffuse_extinction_coefficient",
+    "canopy_reflectance_to_direct_irradiance",
+)
+
+
+class CanopyOptics:
+    __slots__ = (
+        "model",
+        "solar_inclination",
+        "leaf_area_index",
+        "solar_inclination_tolerance",
+    ) + OPTICS_COEFFICIENTS_NAMES
+
+    def __init__(
+        self,
+        model: str,
+        solar_inclination: float,
+        leaf_area_index: float,
+        solar_inclination_tolerance: float = 0.0,
+        **coefficients,
+    ):
+        """Holds the extinction and reflection coefficients of a canopy, as an immutable and hashable snapshot.
+
+        Args:
+            model: the 'model' attribute of the params from which optics are calculated (None for sunlit-shaded leaves)
+            solar_inclination: [rad] angle of solar inclination
+            leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy
+            solar_inclination_tolerance: [rad] maximum difference between the solar inclination of the shoots reading
+                the optics and `solar_inclination`, when optics are shared by shoots of similar solar inclinations
+            **coefficients: the values of :data:`OPTICS_COEFFICIENTS_NAMES`
+
+        Notes:
+            Optics are read by shoots in place of the coefficients of their params (see :class:`Shoot`), so that
+                shoots sharing the same params, solar inclination and leaf area index may share the same optics, and
+                be evaluated concurrently, without calling the `update()` method of params.
+        """
+        object.__setattr__(self, "model", model)
+        object.__setattr__(self, "solar_inclination", solar_inclination)
+        object.__setattr__(self, "leaf_area_index", leaf_area_index)
+        object.__setattr__(
+            self, "solar_inclination_tolerance", solar_inclination_tolerance
+        )
+        for name in OPTICS_COEFFICIENTS_NAMES:
+            object.__setattr__(self, name, coefficients[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} objects are immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} objects are immutable")
+
+    def _astuple(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def as_dict(self) -> dict:
+        """Returns the attributes of the optics as a dictionary."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        return type(other) is type(self) and other._astuple() == self._astuple()
+
+    def __hash__(self):
+        return hash(self._astuple())
+
+    def __reduce__(self):
+        return _restore_canopy_optics, (self.as_dict(),)
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}({', '.join(f'{name}={value!r}' for name, value in self.as_dict().items())})"
+
+
+def _restore_canopy_optics(fields: dict) -> CanopyOptics:
+    """Creates canopy optics from the dictionary of their attributes."""
+    return CanopyOptics(**fields)
+
+
+@lru_cache(maxsize=4096)
+def _calc_canopy_optics(
+    model: str,
+    configuration: tuple,
+    solar_inclination: float,
+    leaf_area_index: float,
+    backend: str,
+) -> CanopyOptics:
+    """Calculates canopy optics from the (name, value) pairs of the attributes of params named in
+    :data:`OPTICS_CONFIGURATION_NAMES`."""
+    params = SimpleNamespace(**dict(configuration))
+    backends.get_backend(backend).update_params(
+        params,
+        SunlitShadedInputs(
+            leaf_layers={0: leaf_area_index},
+            incident_direct_irradiance=0.0,
+            incident_diffuse_irradiance=0.0,
+            solar_inclination=solar_inclination,
+        ),
+    )
+    return CanopyOptics(
+        model,
+        solar_inclination,
+        leaf_area_index,
+        **{name: getattr(params, name) for name in OPTICS_COEFFICIENTS_NAMES},
+    )
+
+
+def _is_equal(value, other_value) -> bool:
+    """Returns whether two params values are equal, arrays being equal if they have the same shape and elements."""
+    is_equal = value == other_value
+    if isinstance(is_equal, bool):
+        return is_equal
+    import numpy
+
+    return numpy.array_equal(value, other_value)
+
+
+def have_same_optics_configuration(params, other_params) -> bool:
+    """Returns whether two params share the values of the attributes named in :data:`OPTICS_CONFIGURATION_NAMES`, from
+    which canopy optics are calculated, these values being either scalars or arrays."""
+    return all(
+        _is_equal(getattr(params, name), getattr(other_params, name))
+        for name in OPTICS_CONFIGURATION_NAMES
+    )
+
+
+def _as_hashable(name: str, value):
+    """Returns a params value as a key of the cache of canopy optics, single-valued arrays being replaced by their
+    scalar."""
+    try:
+        hash(value)
+    except TypeError:
+        assert (
+            getattr(value, "size", None) == 1
+        ), f"Canopy optics are calculated for a single value of '{name}'"
+        return value.item()
+    return value
+
+
+def calc_canopy_optics(
+    params, solar_inclination: float, leaf_area_index: float, backend: str = None
+) -> CanopyOptics:
+    """Calculates the optics of a canopy, which are calculated once per params, solar inclination and leaf area index.
+
+    Args:
+        params: see class`SunlitShadedParams` and `LumpedParams` of the 'de_pury' model, whose attributes are only read
+        solar_inclination: [rad] angle of solar inclination
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy
+        backend: name of the compute backend (see :mod:`crop_irradiance.uniform_crops.backends`)
+
+    Returns:
+        The canopy optics (see :class:`CanopyOptics`)
+
+    Notes:
+        Params values may be arrays of a single value, which are read as their scalar.
+    """
+    model = getattr(params, "model", None)
+    assert model != "beer", "Canopy optics are not defined for the 'beer' model"
+    return _calc_canopy_optics(
+        model,
+        tuple(
+            (name, _as_hashable(name, getattr(params, name)))
+            for name in OPTICS_CONFIGURATION_NAMES
+        ),
+        float(solar_inclination),
+        float(leaf_area_index),
+        backends.get_backend_name(backend),
+    )
+
 
 class LumpedParams:
     def __init__(self, model: str, **kwargs):
@@ -26,6 +213,7 @@ class LumpedParams:
                 ]
             else:
                 self.leaf_angle_distribution_factor = config.SPHERICAL_ANGLES_FACTOR
+            self.leaf_angle_distribution = kwargs.get("leaf_angle_distribution")
 
             self.leaf_scattering_coefficient = (
                 sunlit_shaded_leaves.calc_leaf_scattering_coefficient(
@@ -39,39 +227,14 @@ class LumpedParams:
             self.diffuse_extinction_coefficient = None
             self.canopy_reflectance_to_direct_irradiance = None
 
-    def update(self, inputs: LumpedInputs):
-        self.direct_black_extinction_coefficient = (
-            sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
-                solar_inclination=inputs.solar_inclination,
-                leaf_angle_distribution_factor=self.leaf_angle_distribution_factor,
-                clumping_factor=self.clumping_factor,
-            )
-        )
-
-        self.direct_extinction_coefficient = (
-            sunlit_shaded_leaves.calc_direct_extinction_coefficient(
-                solar_inclination=inputs.solar_inclination,
-                leaf_scattering_coefficient=self.leaf_scattering_coefficient,
-                leaf_angle_distribution_factor=self.leaf_angle_distribution_factor,
-                clumping_factor=self.clumping_factor,
-            )
-        )
+    def update(self, inputs: LumpedInputs, backend: str = None):
+        """Sets the extinction and reflection coefficients of the 'de_pury' model for the given inputs.
 
-        self.diffuse_extinction_coefficient = (
-            sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
-                leaf_area_index=sum(inputs.leaf_layers.values()),
-                leaf_angle_distribution_factor=self.leaf_angle_distribution_factor,
-                clumping_factor=self.clumping_factor,
-                leaf_scattering_coefficient=self.leaf_scattering_coefficient,
-                sky_sectors_number=self.sky_sectors_number,
-                sky_type=self.sky_type,
-            )[0]
-        )
-
-        self.canopy_reflectance_to_direct_irradiance = sunlit_shaded_leaves.calc_canopy_reflectance_to_direct_irradiance(
-            direct_black_extinction_coefficient=self.direct_black_extinction_coefficient,
-            leaf_scattering_coefficient=self.leaf_scattering_coefficient,
-        )
+        Args:
+            inputs: see class`LumpedInputs`
+            backend: name of the compute backend (see :mod:`crop_irradiance.uniform_crops.backends`)
+        """
+        backends.get_backend(backend).update_params(self, inputs)
 
 
 class SunlitShadedParams:
@@ -84,8 +247,10 @@ class SunlitShadedParams:
         canopy_reflectance_to_diffuse_irradiance: float,
         leaf_angle_distribution_factor: float = config.SPHERICAL_ANGLES_FACTOR,
         clumping_factor: float = 1,
+        leaf_angle_distribution: str = None,
     ):
         self.leaf_angle_distribution_factor = leaf_angle_distribution_factor
+        self.leaf_angle_distribution = leaf_angle_distribution
         self.sky_sectors_number = sky_sectors_number
         self.sky_type = sky_type
         self.canopy_reflectance_to_diffuse_irradiance = (
@@ -104,36 +269,11 @@ class SunlitShadedParams:
             )
         )
 
-    def update(self, inputs: SunlitShadedInputs):
-        self.direct_black_extinction_coefficient = (
-            sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
-                solar_inclination=inputs.solar_inclination,
-                leaf_angle_distribution_factor=self.leaf_angle_distribution_factor,
-                clumping_factor=self.clumping_factor,
-            )
-        )
+    def update(self, inputs: SunlitShadedInputs, backend: str = None):
+        """Sets the extinction and reflection coefficients for the given inputs.
 
-        self.direct_extinction_coefficient = (
-            sunlit_shaded_leaves.calc_direct_extinction_coefficient(
-                solar_inclination=inputs.solar_inclination,
-                leaf_scattering_coefficient=self.leaf_scattering_coefficient,
-                leaf_angle_distribution_factor=self.leaf_angle_distribution_factor,
-                clumping_factor=self.clumping_factor,
-            )
-        )
-
-        self.diffuse_extinction_coefficient = (
-            sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
-                leaf_area_index=sum(inputs.leaf_layers.values()),
-                leaf_angle_distribution_factor=self.leaf_angle_distribution_factor,
-                clumping_factor=self.clumping_factor,
-                leaf_scattering_coefficient=self.leaf_scattering_coefficient,
-                sky_sectors_number=self.sky_sectors_number,
-                sky_type=self.sky_type,
-            )[0]
-        )
-
-        self.canopy_reflectance_to_direct_irradiance = sunlit_shaded_leaves.calc_canopy_reflectance_to_direct_irradiance(
-            direct_black_extinction_coefficient=self.direct_black_extinction_coefficient,
-            leaf_scattering_coefficient=self.leaf_scattering_coefficient,
-        )
+        Args:
+            inputs: see class`SunlitShadedInputs`
+            backend: name of the compute backend (see :mod:`crop_irradiance.uniform_crops.backends`)
+        """
+        backends.get_backend(backend).update_params(self, inputs)
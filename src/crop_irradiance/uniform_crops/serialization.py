@@ -0,0 +1,113 @@
+"""Compact binary serialization of the attributes of shoots and leaf layers.
+
+An object state is split into a skeleton, holding its structure and non-float values, and a flat array of its float
+values. Float values are replaced in the skeleton by the `FLOAT_PLACEHOLDER` literal, so that the skeleton can be
+written with :func:`repr` and read back with :func:`ast.literal_eval`. NumPy arrays and scalars are replaced by a tuple
+tagged with the `ARRAY_MARKER` literal, holding their type, data type, shape and the skeleton of their items.
+"""
+
+import struct
+import sys
+import zlib
+from array import array
+from ast import literal_eval
+from functools import lru_cache
+
+# complex values are not used by the model, so that the complex zero literal unambiguously marks float values
+FLOAT_PLACEHOLDER = 0j
+ARRAY_MARKER = 1j
+
+_HEADER = struct.Struct("<I")
+
+
+def flatten(value, values: array):
+    """Returns the skeleton of `value`, appending its float values to `values`.
+
+    Args:
+        value: a float, or any (nested) dictionary, list or tuple of floats, integers, booleans, strings, None and NumPy
+            arrays or scalars of such values
+        values: array of type 'd' to which float values are appended
+
+    Returns:
+        The skeleton of `value`
+    """
+    if isinstance(value, float):
+        values.append(value)
+        return FLOAT_PLACEHOLDER
+    if isinstance(value, dict):
+        skeleton = {}
+        for key, item in value.items():
+            if type(item) is float:
+                values.append(item)
+                skeleton[key] = FLOAT_PLACEHOLDER
+            else:
+                skeleton[key] = flatten(item, values)
+        return skeleton
+    if isinstance(value, (list, tuple)):
+        return type(value)(flatten(item, values) for item in value)
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if hasattr(value, "dtype") and hasattr(value, "tolist"):
+        return (
+            ARRAY_MARKER,
+            type(value).__name__,
+            value.dtype.str,
+            value.shape,
+            flatten(value.tolist(), values),
+        )
+    raise TypeError(f"Cannot serialize values of type {type(value).__name__}")
+
+
+def unflatten(skeleton, values):
+    """Rebuilds the value whose skeleton is `skeleton`, taking its float values from the iterator `values`."""
+    if type(skeleton) is dict:
+        value = {}
+        for key, item in skeleton.items():
+            if type(item) is complex:
+                value[key] = next(values)
+            else:
+                value[key] = unflatten(item, values)
+        return value
+    if isinstance(skeleton, complex):
+        return next(values)
+    if type(skeleton) is tuple and skeleton and skeleton[0] == ARRAY_MARKER:
+        import numpy
+
+        _, type_name, dtype, shape, items_skeleton = skeleton
+        value = numpy.array(unflatten(items_skeleton, values), dtype=dtype).reshape(
+            shape
+        )
+        return value if type_name == "ndarray" else value[()]
+    if isinstance(skeleton, (list, tuple)):
+        return type(skeleton)(unflatten(item, values) for item in skeleton)
+    return skeleton
+
+
+def to_bytes(skeleton, values: array) -> bytes:
+    """Packs a skeleton (compressed) and its float values (as little-endian doubles) into bytes."""
+    encoded_skeleton = zlib.compress(repr(skeleton).encode(), 1)
+    if sys.byteorder == "big":
+        values = array("d", values)
+        values.byteswap()
+    return _HEADER.pack(len(encoded_skeleton)) + encoded_skeleton + values.tobytes()
+
+
+def from_bytes(data: bytes) -> tuple:
+    """Unpacks bytes created by :func:`to_bytes`.
+
+    Returns:
+        The skeleton and the array of float values
+    """
+    (skeleton_size,) = _HEADER.unpack_from(data)
+    skeleton_end = _HEADER.size + skeleton_size
+    values = array("d")
+    values.frombytes(data[skeleton_end:])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return _decode_skeleton(data[_HEADER.size : skeleton_end]), values
+
+
+@lru_cache(maxsize=128)
+def _decode_skeleton(encoded_skeleton: bytes):
+    """Decodes a skeleton, the skeletons of objects having the same structure being decoded once."""
+    return literal_eval(zlib.decompress(encoded_skeleton).decode())
@@ -0,0 +1,339 @@
+"""Local HTTP/JSON service evaluating shoots, with micro-batching of concurrent requests.
+
+A single long-running process holds the imported library and its caches for all local callers. Requests received
+within a short batching window are grouped by leaves category, params and leaf layers indexes, and each group is
+evaluated at once by :mod:`crop_irradiance.uniform_crops.vectorized`. The service speaks HTTP/1.1 over TCP or over a
+Unix socket:
+
+    POST /evaluate  evaluates a request (or a list of requests) as described in :func:`parse_request`
+    GET /stats      returns throughput and latency statistics (see :meth:`ShootService.calc_statistics`)
+
+This module requires NumPy.
+"""
+
+import asyncio
+import json
+from argparse import ArgumentParser
+from collections import deque
+from time import perf_counter
+
+import numpy
+
+from crop_irradiance.uniform_crops import vectorized
+from crop_irradiance.uniform_crops.params import LumpedParams, SunlitShadedParams
+
+LEAVES_CATEGORIES = ("lumped", "sunlit-shaded")
+
+LUMPED_INPUTS_NAMES = {
+    "beer": ("incident_irradiance",),
+    "de_pury": (
+        "incident_direct_irradiance",
+        "incident_diffuse_irradiance",
+        "solar_inclination",
+    ),
+}
+
+SUNLIT_SHADED_INPUTS_NAMES = (
+    "incident_direct_irradiance",
+    "incident_diffuse_irradiance",
+    "solar_inclination",
+)
+
+CANOPY_BUDGET_NAMES = (
+    "transmitted_irradiance",
+    "reflected_irradiance",
+    "soil_absorbed_irradiance",
+)
+
+HTTP_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found"}
+
+
+def parse_request(request: dict) -> tuple:
+    """Validates a request and splits it into its batching key and its inputs values.
+
+    Args:
+        request: a dictionary having as keys
+            'leaves_category': one of ('lumped', 'sunlit-shaded')
+            'inputs': the keyword arguments of class`LumpedInputs` or `SunlitShadedInputs` (the 'model' of lumped
+                leaves being taken from params), leaf layers indexes being possibly given as strings
+            'params': the keyword arguments of class`LumpedParams` or `SunlitShadedParams`
+
+    Returns:
+        The key shared by the requests that can be evaluated in the same batch
+        [m2leaf m-2ground] leaf layers thicknesses ordered from the top to the bottom of the canopy
+        The inputs values, ordered as the names of :data:`LUMPED_INPUTS_NAMES` or :data:`SUNLIT_SHADED_INPUTS_NAMES`
+    """
+    leaves_category = request["leaves_category"]
+    assert (
+        leaves_category in LEAVES_CATEGORIES
+    ), f"Unknown leaves category: {leaves_category}"
+    params_fields = request["params"]
+    if leaves_category == "lumped":
+        inputs_names = LUMPED_INPUTS_NAMES[params_fields["model"]]
+    else:
+        inputs_names = SUNLIT_SHADED_INPUTS_NAMES
+
+    leaf_layers = {
+        int(index): float(thickness)
+        for index, thickness in request["inputs"]["leaf_layers"].items()
+    }
+    layer_indexes = tuple(sorted(leaf_layers, reverse=True))
+    key = (leaves_category, json.dumps(params_fields, sort_keys=True), layer_indexes)
+    return (
+        key,
+        [leaf_layers[index] for index in layer_indexes],
+        [float(request["inputs"][name]) for name in inputs_names],
+    )
+
+
+def evaluate_batch(key: tuple, thicknesses: list, inputs_values: list) -> list:
+    """Evaluates a batch of requests sharing the same key.
+
+    Args:
+        key: the batching key of the requests (see :func:`parse_request`)
+        thicknesses: [m2leaf m-2ground] leaf layers thicknesses of each request
+        inputs_values: inputs values of each request
+
+    Returns:
+        The response to each request, i.e. a dictionary having as keys 'layers', which maps each leaf layer index to
+            its absorbed irradiance (as the `absorbed_irradiance` attribute of leaf layers), and the names of
+            :data:`CANOPY_BUDGET_NAMES`
+    """
+    leaves_category, params_fields, layer_indexes = key
+    params_fields = json.loads(params_fields)
+    inputs_values = numpy.array(inputs_values, dtype=float).T
+    if leaves_category == "sunlit-shaded":
+        results = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+            numpy.array(thicknesses, dtype=float),
+            *inputs_values,
+            params=SunlitShadedParams(**params_fields),
+        )
+        categories = ("sunlit", "shaded")
+    else:
+        results = vectorized.calc_lumped_absorbed_irradiance(
+            numpy.array(thicknesses, dtype=float),
+            params=LumpedParams(**params_fields),
+            **dict(zip(LUMPED_INPUTS_NAMES[params_fields["model"]], inputs_values)),
+        )
+        categories = ("lumped",)
+
+    absorbed_irradiance = [results[category].tolist() for category in categories]
+    budget = [results[name].tolist() for name in CANOPY_BUDGET_NAMES]
+    responses = []
+    for position in range(len(thicknesses)):
+        response = {
+            "layers": {
+                str(index): {
+                    category: values[position][layer]
+                    for category, values in zip(categories, absorbed_irradiance)
+                }
+                for layer, index in enumerate(layer_indexes)
+            }
+        }
+        response.update(
+            (name, values[position])
+            for name, values in zip(CANOPY_BUDGET_NAMES, budget)
+        )
+        responses.append(response)
+    return responses
+
+
+class ShootService:
+    def __init__(
+        self,
+        batching_window: float = 0.002,
+        max_batch_size: int = 1024,
+        latencies_number: int = 10000,
+    ):
+        """Evaluates requests in batches gathered over a latency window.
+
+        Args:
+            batching_window: [s] maximum delay between the arrival of a request and the evaluation of its batch
+            max_batch_size: [-] number of pending requests beyond which they are evaluated without waiting
+            latencies_number: [-] number of most recent requests latencies held for statistics
+        """
+        assert batching_window >= 0, "The batching window must not be negative"
+        assert max_batch_size > 0, "Batches must hold at least one request"
+
+        self.batching_window = batching_window
+        self.max_batch_size = max_batch_size
+        self.requests_number = 0
+        self.batches_number = 0
+        self.started_at = perf_counter()
+
+        self._latencies = deque(maxlen=latencies_number)
+        self._pending = []
+        self._flush_handle = None
+
+    async def evaluate(self, request: dict) -> dict:
+        """Evaluates a request (see :func:`parse_request`) within the next batch and returns its response."""
+        arrival = perf_counter()
+        key, thicknesses, inputs_values = parse_request(request)
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((key, thicknesses, inputs_values, future))
+        if len(self._pending) >= self.max_batch_size:
+            self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batching_window, self.flush)
+        try:
+            return await future
+        finally:
+            self.requests_number += 1
+            self._latencies.append(perf_counter() - arrival)
+
+    def flush(self):
+        """Evaluates all pending requests, one batch per batching key."""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        pending, self._pending = self._pending, []
+
+        batches = {}
+        for key, thicknesses, inputs_values, future in pending:
+            batches.setdefault(key, []).append((thicknesses, inputs_values, future))
+        for key, batch in batches.items():
+            self.batches_number += 1
+            try:
+                responses = evaluate_batch(
+                    key,
+                    *zip(*((thicknesses, inputs) for thicknesses, inputs, _ in batch)),
+                )
+            except Exception:
+                # the faulty requests are isolated so that the others of the batch are still answered
+                responses = []
+                for thicknesses, inputs_values, _ in batch:
+                    try:
+                        responses.extend(
+                            evaluate_batch(key, [thicknesses], [inputs_values])
+                        )
+                    except Exception as error:
+                        responses.append(error)
+            for (_, _, future), response in zip(batch, responses):
+                if future.done():
+                    continue
+                if isinstance(response, Exception):
+                    future.set_exception(response)
+                else:
+                    future.set_result(response)
+
+    def calc_statistics(self) -> dict:
+        """Calculates the throughput and latency statistics of the service.
+
+        Returns:
+            A dictionary having as keys
+                'requests_number': [-] number of answered requests
+                'batches_number': [-] number of evaluated batches
+                'mean_batch_size': [-] mean number of requests per batch
+                'throughput': [s-1] mean number of answered requests per second since the service started
+                'latency_p50' and 'latency_p99': [s] median and 99th percentile of the latency of the most recent
+                    requests (None before the first request)
+        """
+        latencies = numpy.array(self._latencies)
+        return {
+            "requests_number": self.requests_number,
+            "batches_number": self.batches_number,
+            "mean_batch_size": self.requests_number / max(1, self.batches_number),
+            "throughput": self.requests_number / (perf_counter() - self.started_at),
+            "latency_p50": (
+                float(numpy.percentile(latencies, 50)) if len(latencies) else None
+            ),
+            "latency_p99": (
+                float(numpy.percentile(latencies, 99)) if len(latencies) else None
+            ),
+        }
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ):
+        """Answers the HTTP/1.1 requests of a connection, which is kept alive unless the client asks otherwise."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                status, payload = await self._dispatch(method, target, body)
+                keep_alive = (
+                    version == "HTTP/1.1"
+                    and headers.get("connection", "").lower() != "close"
+                )
+                content = json.dumps(payload).encode()
+                writer.write(
+                    (
+                        f"HTTP/1.1 {status} {HTTP_REASONS[status]}\r\n"
+                        "Content-Type: application/json\r\n"
+                        f"Content-Length: {len(content)}\r\n"
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    ).encode("latin-1")
+                    + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method: str, target: str, body: bytes) -> tuple:
+        """Returns the HTTP status and the JSON payload of the response to a request."""
+        if (method, target) == ("GET", "/stats"):
+            return 200, self.calc_statistics()
+        if (method, target) != ("POST", "/evaluate"):
+            return 404, {"error": f"No such resource: {method} {target}"}
+        try:
+            request = json.loads(body)
+            if isinstance(request, list):
+                return 200, list(
+                    await asyncio.gather(*(self.evaluate(item) for item in request))
+                )
+            return 200, await self.evaluate(request)
+        except Exception as error:
+            return 400, {"error": f"{type(error).__name__}: {error}"}
+
+
+async def start_server(
+    service: ShootService, host: str = "127.0.0.1", port: int = 8765, path: str = None
+) -> asyncio.AbstractServer:
+    """Starts serving `service` over TCP at (`host`, `port`), or over the Unix socket at `path` if it is given."""
+    if path is not None:
+        return await asyncio.start_unix_server(service.handle_connection, path)
+    return await asyncio.start_server(service.handle_connection, host, port)
+
+
+def main(args: list = None):
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", help="path of a Unix socket, instead of TCP")
+    parser.add_argument(
+        "--batching-window", type=float, default=0.002, help="[s] (default: 0.002)"
+    )
+    parser.add_argument("--max-batch-size", type=int, default=1024)
+    options = parser.parse_args(args)
+
+    async def serve_forever():
+        server = await start_server(
+            ShootService(options.batching_window, options.max_batch_size),
+            options.host,
+            options.port,
+            options.path,
+        )
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,31 @@
-from crop_irradiance.uniform_crops.formalisms import lumped_leaves, sunlit_shaded_leaves
+from array import array
+from math import isclose
+from operator import attrgetter
+
+from crop_irradiance.uniform_crops import backends, serialization
+from crop_irradiance.uniform_crops.formalisms import (
+    canopy_budget,
+    lumped_leaves,
+    quadrature,
+    sunlit_shaded_leaves,
+)
 from crop_irradiance.uniform_crops.inputs import LumpedInputs, SunlitShadedInputs
-from crop_irradiance.uniform_crops.params import LumpedParams, SunlitShadedParams
+from crop_irradiance.uniform_crops.params import (
+    OPTICS_COEFFICIENTS_NAMES,
+    CanopyOptics,
+    LumpedParams,
+    SunlitShadedParams,
+    calc_canopy_optics,
+    have_same_optics_configuration,
+)
 
 
 class LeafLayer:
+    # names of the attributes that are set by `calc_absorbed_irradiance()`
+    absorbed_irradiance_attributes = ("absorbed_irradiance",)
+    # names of the float attributes that are exported by `Shoot.to_structured_array()`
+    exported_attributes = ("upper_cumulative_leaf_area_index", "thickness")
+
     def __init__(
         self, index: int, upper_cumulative_leaf_area_index: float, thickness: float
     ):
@@ -12,6 +34,13 @@ class LeafLayer:
         self.thickness = thickness
         self.absorbed_irradiance = {}
 
+    def __getstate__(self) -> dict:
+        """Returns the attributes of the layer, as restored by `__setstate__()` (e.g. when serializing shoots)."""
+        return dict(vars(self))
+
+    def __setstate__(self, state: dict):
+        self.__dict__.update(state)
+
     def calc_absorbed_irradiance(
         self,
         inputs: LumpedInputs or SunlitShadedInputs,
@@ -47,7 +76,50 @@ class LumpedLeafLayer(LeafLayer):
             )
 
 
+def _lazy_attribute(name: str) -> property:
+    """Returns the property of an attribute of :class:`SunlitShadedLeafLayer` that is calculated on first access."""
+
+    def get_value(layer):
+        return layer._get_lazy_value(name)
+
+    def set_value(layer, value):
+        layer._explicit_values[name] = value
+
+    return property(get_value, set_value)
+
+
 class SunlitShadedLeafLayer(LeafLayer):
+    absorbed_irradiance_attributes = (
+        "absorbed_irradiance",
+        "abs_direct_by_sunlit",
+        "abs_diffuse_by_sunlit",
+        "abs_scattered_by_sunlit",
+        "abs_diffuse_by_shaded",
+        "abs_scattered_by_shaded",
+    )
+    exported_attributes = LeafLayer.exported_attributes + (
+        "sunlit_fraction",
+        "shaded_fraction",
+    )
+    # names of the attributes that are calculated on first access, by group of attributes calculated together
+    lazy_attributes = {
+        "fractions": ("sunlit_fraction", "shaded_fraction"),
+        "totals": ("absorbed_irradiance",),
+        "components": absorbed_irradiance_attributes[1:],
+    }
+    _lazy_groups = {
+        name: group for group, names in lazy_attributes.items() for name in names
+    }
+
+    sunlit_fraction = _lazy_attribute("sunlit_fraction")
+    shaded_fraction = _lazy_attribute("shaded_fraction")
+    absorbed_irradiance = _lazy_attribute("absorbed_irradiance")
+    abs_direct_by_sunlit = _lazy_attribute("abs_direct_by_sunlit")
+    abs_diffuse_by_sunlit = _lazy_attribute("abs_diffuse_by_sunlit")
+    abs_scattered_by_sunlit = _lazy_attribute("abs_scattered_by_sunlit")
+    abs_diffuse_by_shaded = _lazy_attribute("abs_diffuse_by_shaded")
+    abs_scattered_by_shaded = _lazy_attribute("abs_scattered_by_shaded")
+
     def __init__(
         self,
         index: int,
@@ -55,83 +127,180 @@ class SunlitShadedLeafLayer(LeafLayer):
         thickness: float,
         params: SunlitShadedParams,
     ):
+        """Creates a leaf layer whose sunlit fraction and absorbed irradiance are calculated on first access.
+
+        Args:
+            index: index of the layer in the `leaf_layers` attribute of inputs
+            upper_cumulative_leaf_area_index: [m2leaf m-2ground] cumulative downwards leaf area index at the top of the
+                layer
+            thickness: [m2leaf m-2ground] leaf area index of the layer
+            params: see class`SunlitShadedParams` (or class`CanopyOptics`), from which coefficients are read
+
+        Notes:
+            The sunlit and shaded fractions, the absorbed irradiance by sunlit and shaded leaves and its components are
+                calculated when they are first read, in three independent groups (see :attr:`lazy_attributes`), so
+                that reading the absorbed irradiance by sunlit and shaded leaves does not calculate its components.
+                The coefficients of `params` and the incident irradiance of inputs are copied when the layer is
+                created and evaluated, so that values read later are those of this evaluation, even if `params` are
+                updated for another timestep in the meantime. Calculated values are memoized until the layer is
+                evaluated again or its geometry changes, whereas values that are assigned are kept until
+                `calc_absorbed_irradiance()` is called.
+        """
+        self._coefficients = self._copy_coefficients(params)
+        self._incident_irradiance = None
+        self._explicit_values = {}
+        self._memoized_values = {}
         super().__init__(index, upper_cumulative_leaf_area_index, thickness)
 
-        self.sunlit_fraction = sunlit_shaded_leaves.calc_sunlit_fraction_per_leaf_layer(
-            upper_cumulative_leaf_area_index=self.upper_cumulative_leaf_area_index,
-            leaf_layer_thickness=self.thickness,
-            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
-        )
+    # names of the coefficients from which the lazy attributes are calculated, in the order of the lazy keys
+    _coefficients_names = (
+        "leaf_scattering_coefficient",
+        "canopy_reflectance_to_direct_irradiance",
+        "canopy_reflectance_to_diffuse_irradiance",
+        "direct_extinction_coefficient",
+        "direct_black_extinction_coefficient",
+        "diffuse_extinction_coefficient",
+    )
 
-        self.shaded_fraction = 1.0 - self.sunlit_fraction
+    @classmethod
+    def _copy_coefficients(cls, params: SunlitShadedParams) -> tuple or None:
+        """Returns the values of the coefficients of `params` from which the lazy attributes are calculated."""
+        if params is None:
+            return None
+        return tuple(getattr(params, name) for name in cls._coefficients_names)
 
-        self.abs_direct_by_sunlit = None
-        self.abs_diffuse_by_sunlit = None
-        self.abs_scattered_by_sunlit = None
-        self.abs_diffuse_by_shaded = None
-        self.abs_scattered_by_shaded = None
+    def __getstate__(self) -> dict:
+        state = {name: value for name, value in vars(self).items() if name[0] != "_"}
+        state.update((name, getattr(self, name)) for name in self._lazy_groups)
+        return state
 
-    def calc_absorbed_irradiance(
-        self, inputs: SunlitShadedInputs, params: SunlitShadedParams
-    ):
-        self.absorbed_irradiance = sunlit_shaded_leaves.absorbed_irradiance_by_sunlit_and_shaded_leaves_per_leaf_layer(
-            incident_direct_irradiance=inputs.incident_direct_irradiance,
-            incident_diffuse_irradiance=inputs.incident_diffuse_irradiance,
-            upper_cumulative_leaf_area_index=self.upper_cumulative_leaf_area_index,
-            leaf_layer_thickness=self.thickness,
-            leaf_scattering_coefficient=params.leaf_scattering_coefficient,
-            canopy_reflectance_to_direct_irradiance=params.canopy_reflectance_to_direct_irradiance,
-            canopy_reflectance_to_diffuse_irradiance=params.canopy_reflectance_to_diffuse_irradiance,
-            direct_extinction_coefficient=params.direct_extinction_coefficient,
-            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
-            diffuse_extinction_coefficient=params.diffuse_extinction_coefficient,
-        )
+    def __setstate__(self, state: dict):
+        self._coefficients = None
+        self._incident_irradiance = None
+        self._explicit_values = {}
+        self._memoized_values = {}
+        for name, value in state.items():
+            setattr(self, name, value)
 
-        self.abs_direct_by_sunlit = sunlit_shaded_leaves.calc_absorbed_direct_irradiance_by_sunlit_leaf_layer(
-            incident_direct_irradiance=inputs.incident_direct_irradiance,
-            upper_cumulative_leaf_area_index=self.upper_cumulative_leaf_area_index,
-            leaf_layer_thickness=self.thickness,
-            leaf_scattering_coefficient=params.leaf_scattering_coefficient,
-            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
+    def _calc_lazy_key(self, group: str) -> tuple or None:
+        """Returns the values from which the attributes of a group are calculated, or None if they cannot be yet."""
+        coefficients = self._coefficients
+        if coefficients is None:
+            return None
+        if group == "fractions":
+            return (
+                self.upper_cumulative_leaf_area_index,
+                self.thickness,
+                coefficients[4],
+            )
+        if self._incident_irradiance is None:
+            return None
+        return (
+            *self._incident_irradiance,
+            self.upper_cumulative_leaf_area_index,
+            self.thickness,
+            *coefficients,
         )
 
-        self.abs_diffuse_by_sunlit = sunlit_shaded_leaves.calc_absorbed_diffuse_irradiance_by_sunlit_leaf_layer(
-            incident_diffuse_irradiance=inputs.incident_diffuse_irradiance,
-            upper_cumulative_leaf_area_index=self.upper_cumulative_leaf_area_index,
-            leaf_layer_thickness=self.thickness,
-            canopy_reflectance_to_diffuse_irradiance=params.canopy_reflectance_to_diffuse_irradiance,
-            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
-            diffuse_extinction_coefficient=params.diffuse_extinction_coefficient,
-        )
+    def _get_lazy_value(self, name: str):
+        """Returns the value of a lazy attribute, calculating the attributes of its group if needed."""
+        if name in self._explicit_values:
+            return self._explicit_values[name]
+        group = self._lazy_groups[name]
+        key = self._calc_lazy_key(group)
+        if key is None:
+            return None
+        memoized = self._memoized_values.get(group)
+        if memoized is None or memoized[0] != key:
+            memoized = key, self._calc_lazy_values(group, key)
+            self._memoized_values[group] = memoized
+        return memoized[1][name]
 
-        self.abs_scattered_by_sunlit = sunlit_shaded_leaves.calc_absorbed_scattered_irradiance_by_sunlit_leaf_layer(
-            incident_direct_irradiance=inputs.incident_direct_irradiance,
-            upper_cumulative_leaf_area_index=self.upper_cumulative_leaf_area_index,
-            leaf_layer_thickness=self.thickness,
-            direct_extinction_coefficient=params.direct_extinction_coefficient,
-            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
-            canopy_reflectance_to_direct_irradiance=params.canopy_reflectance_to_direct_irradiance,
-            leaf_scattering_coefficient=params.leaf_scattering_coefficient,
-        )
+    @staticmethod
+    def _calc_lazy_values(group: str, key: tuple) -> dict:
+        """Calculates the attributes of a group from the values returned by `_calc_lazy_key()`."""
+        if group == "fractions":
+            sunlit_fraction = sunlit_shaded_leaves.calc_sunlit_fraction_per_leaf_layer(
+                *key
+            )
+            return {
+                "sunlit_fraction": sunlit_fraction,
+                "shaded_fraction": 1.0 - sunlit_fraction,
+            }
 
-        self.abs_diffuse_by_shaded = sunlit_shaded_leaves.calc_absorbed_diffuse_irradiance_by_shaded_leaf_layer(
-            incident_diffuse_irradiance=inputs.incident_diffuse_irradiance,
-            upper_cumulative_leaf_area_index=self.upper_cumulative_leaf_area_index,
-            leaf_layer_thickness=self.thickness,
-            canopy_reflectance_to_diffuse_irradiance=params.canopy_reflectance_to_diffuse_irradiance,
-            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
-            diffuse_extinction_coefficient=params.diffuse_extinction_coefficient,
-        )
+        (
+            incident_direct_irradiance,
+            incident_diffuse_irradiance,
+            upper_cumulative_leaf_area_index,
+            leaf_layer_thickness,
+            leaf_scattering_coefficient,
+            canopy_reflectance_to_direct_irradiance,
+            canopy_reflectance_to_diffuse_irradiance,
+            direct_extinction_coefficient,
+            direct_black_extinction_coefficient,
+            diffuse_extinction_coefficient,
+        ) = key
+        if group == "totals":
+            return {
+                "absorbed_irradiance": sunlit_shaded_leaves.absorbed_irradiance_by_sunlit_and_shaded_leaves_per_leaf_layer(
+                    *key
+                )
+            }
+
+        return {
+            "abs_direct_by_sunlit": sunlit_shaded_leaves.calc_absorbed_direct_irradiance_by_sunlit_leaf_layer(
+                incident_direct_irradiance=incident_direct_irradiance,
+                upper_cumulative_leaf_area_index=upper_cumulative_leaf_area_index,
+                leaf_layer_thickness=leaf_layer_thickness,
+                leaf_scattering_coefficient=leaf_scattering_coefficient,
+                direct_black_extinction_coefficient=direct_black_extinction_coefficient,
+            ),
+            "abs_diffuse_by_sunlit": sunlit_shaded_leaves.calc_absorbed_diffuse_irradiance_by_sunlit_leaf_layer(
+                incident_diffuse_irradiance=incident_diffuse_irradiance,
+                upper_cumulative_leaf_area_index=upper_cumulative_leaf_area_index,
+                leaf_layer_thickness=leaf_layer_thickness,
+                canopy_reflectance_to_diffuse_irradiance=canopy_reflectance_to_diffuse_irradiance,
+                direct_black_extinction_coefficient=direct_black_extinction_coefficient,
+                diffuse_extinction_coefficient=diffuse_extinction_coefficient,
+            ),
+            "abs_scattered_by_sunlit": sunlit_shaded_leaves.calc_absorbed_scattered_irradiance_by_sunlit_leaf_layer(
+                incident_direct_irradiance=incident_direct_irradiance,
+                upper_cumulative_leaf_area_index=upper_cumulative_leaf_area_index,
+                leaf_layer_thickness=leaf_layer_thickness,
+                direct_extinction_coefficient=direct_extinction_coefficient,
+                direct_black_extinction_coefficient=direct_black_extinction_coefficient,
+                canopy_reflectance_to_direct_irradiance=canopy_reflectance_to_direct_irradiance,
+                leaf_scattering_coefficient=leaf_scattering_coefficient,
+            ),
+            "abs_diffuse_by_shaded": sunlit_shaded_leaves.calc_absorbed_diffuse_irradiance_by_shaded_leaf_layer(
+                incident_diffuse_irradiance=incident_diffuse_irradiance,
+                upper_cumulative_leaf_area_index=upper_cumulative_leaf_area_index,
+                leaf_layer_thickness=leaf_layer_thickness,
+                canopy_reflectance_to_diffuse_irradiance=canopy_reflectance_to_diffuse_irradiance,
+                direct_black_extinction_coefficient=direct_black_extinction_coefficient,
+                diffuse_extinction_coefficient=diffuse_extinction_coefficient,
+            ),
+            "abs_scattered_by_shaded": sunlit_shaded_leaves.calc_absorbed_scattered_irradiance_by_shaded_leaf_layer(
+                incident_direct_irradiance=incident_direct_irradiance,
+                upper_cumulative_leaf_area_index=upper_cumulative_leaf_area_index,
+                leaf_layer_thickness=leaf_layer_thickness,
+                direct_extinction_coefficient=direct_extinction_coefficient,
+                direct_black_extinction_coefficient=direct_black_extinction_coefficient,
+                canopy_reflectance_to_direct_irradiance=canopy_reflectance_to_direct_irradiance,
+                leaf_scattering_coefficient=leaf_scattering_coefficient,
+            ),
+        }
 
-        self.abs_scattered_by_shaded = sunlit_shaded_leaves.calc_absorbed_scattered_irradiance_by_shaded_leaf_layer(
-            incident_direct_irradiance=inputs.incident_direct_irradiance,
-            upper_cumulative_leaf_area_index=self.upper_cumulative_leaf_area_index,
-            leaf_layer_thickness=self.thickness,
-            direct_extinction_coefficient=params.direct_extinction_coefficient,
-            direct_black_extinction_coefficient=params.direct_black_extinction_coefficient,
-            canopy_reflectance_to_direct_irradiance=params.canopy_reflectance_to_direct_irradiance,
-            leaf_scattering_coefficient=params.leaf_scattering_coefficient,
+    def calc_absorbed_irradiance(
+        self, inputs: SunlitShadedInputs, params: SunlitShadedParams
+    ):
+        self._incident_irradiance = (
+            inputs.incident_direct_irradiance,
+            inputs.incident_diffuse_irradiance,
         )
+        self._coefficients = self._copy_coefficients(params)
+        for name in self.absorbed_irradiance_attributes:
+            self._explicit_values.pop(name, None)
 
 
 class Shoot(dict):
@@ -140,6 +309,7 @@ class Shoot(dict):
         leaves_category: str,
         inputs: LumpedInputs or SunlitShadedInputs,
         params: LumpedParams or SunlitShadedParams,
+        optics: CanopyOptics = None,
     ):
         """Creates a class:`Shoot` object having either 'lumped' leaves or 'sunlit-shaded' leaves.
 
@@ -147,6 +317,9 @@ class Shoot(dict):
             leaves_category: one of ('lumped', 'sunlit-shaded')
             inputs: see class`LumpedInputs` and `SunlitShadedInputs`
             params: see class`LumpedParams` and `SunlitShadedParams`
+            optics: optional canopy optics calculated for `params` and the solar inclination and leaf area index of
+                `inputs` (see :func:`params.calc_canopy_optics`), from which the extinction and reflection coefficients
+                are read instead of `params`, which then need not be updated and are left untouched
 
         Notes:
             The created shoot can implicitly be 'big-leaf' or a 'layered'. If the attribute `leaf_layers` of the
@@ -155,16 +328,201 @@ class Shoot(dict):
             Leaf layers indexes in `leaf_layers` must be ordered so that the youngest leaf layer has the highest index
                 value, and inversely, the oldest leaf layer has the least value. Not respecting this order will
                 definitely lead to erroneous calculations.
+            Shoots sharing the same optics may be created and evaluated concurrently, optics being immutable.
         """
 
         super().__init__()
 
+        if optics is not None:
+            assert optics.model == getattr(
+                params, "model", None
+            ), "Optics must be calculated for the model of params"
+            assert (
+                abs(optics.solar_inclination - inputs.solar_inclination)
+                <= optics.solar_inclination_tolerance
+            ), "Optics must be calculated for the solar inclination of inputs"
+            assert isclose(
+                optics.leaf_area_index, sum(inputs.leaf_layers.values())
+            ), "Optics must be calculated for the leaf area index of inputs"
+
+        self.leaves_category = leaves_category
         self.inputs = inputs
         self.params = params
+        self.optics = optics
         self._leaf_layer_indexes = list(reversed(sorted(inputs.leaf_layers.keys())))
 
+        self.transmitted_irradiance = None
+        self.reflected_irradiance = None
+        self.soil_absorbed_irradiance = None
+
         self.set_leaf_layers(leaves_category)
 
+    # classes of the objects held by shoots, as recorded by `to_bytes()`
+    _serializable_classes = {
+        cls.__name__: cls
+        for cls in (
+            LumpedInputs,
+            SunlitShadedInputs,
+            LumpedParams,
+            SunlitShadedParams,
+            LumpedLeafLayer,
+            SunlitShadedLeafLayer,
+        )
+    }
+
+    def __reduce__(self):
+        return self.__class__.from_bytes, (self.to_bytes(),)
+
+    @property
+    def canopy_optics(self) -> CanopyOptics or LumpedParams or SunlitShadedParams:
+        """The object from which extinction and reflection coefficients are read: `optics` if given, else `params`."""
+        return self.params if self.optics is None else self.optics
+
+    def _calc_layers_geometry(self, leaf_layer_indexes: list) -> dict:
+        """Returns the thickness and upper cumulative leaf area index of layers, as calculated by `set_leaf_layers()`."""
+        geometry = {}
+        upper_cumulative_leaf_area_index = 0.0
+        for index in leaf_layer_indexes:
+            layer_thickness = self.inputs.leaf_layers[index]
+            geometry[index] = {
+                "upper_cumulative_leaf_area_index": upper_cumulative_leaf_area_index,
+                "thickness": layer_thickness,
+            }
+            upper_cumulative_leaf_area_index += layer_thickness
+        return geometry
+
+    @staticmethod
+    def _calc_derived_layer_state(layer_state: dict, layer_geometry: dict) -> dict:
+        """Returns the values of the attributes of a layer that can be derived from its geometry and other attributes."""
+        derived_state = dict(layer_geometry)
+        if "sunlit_fraction" in layer_state:
+            derived_state["shaded_fraction"] = 1.0 - layer_state["sunlit_fraction"]
+            if layer_state["abs_direct_by_sunlit"] is not None:
+                derived_state["absorbed_irradiance"] = {
+                    "sunlit": layer_state["abs_direct_by_sunlit"]
+                    + layer_state["abs_diffuse_by_sunlit"]
+                    + layer_state["abs_scattered_by_sunlit"],
+                    "shaded": layer_state["abs_diffuse_by_shaded"]
+                    + layer_state["abs_scattered_by_shaded"],
+                }
+        return derived_state
+
+    def to_bytes(self) -> bytes:
+        """Serializes the shoot, its inputs, params and leaf layers into a compact binary payload.
+
+        Returns:
+            The payload, made of a short compressed description of the attributes followed by the flat array of the
+                float values of all attributes
+
+        Notes:
+            Layers attributes that equal the values the shoot derives from its inputs and from other attributes
+                (thickness, upper cumulative leaf area index, shaded fraction and absorbed irradiance by sunlit and
+                shaded leaves) are not written, and the description of layers attributes is
+                written once when all layers share the same attributes.
+            Shoots are pickled using this payload (see :meth:`from_bytes`).
+        """
+        values = array("d")
+        shoot_state = dict(vars(self))
+        inputs, params = shoot_state.pop("inputs"), shoot_state.pop("params")
+        if shoot_state["optics"] is None:
+            del shoot_state["optics"]
+        else:
+            shoot_state["optics"] = shoot_state["optics"].as_dict()
+        leaf_layer_indexes = shoot_state["_leaf_layer_indexes"]
+        if leaf_layer_indexes == list(reversed(sorted(inputs.leaf_layers.keys()))):
+            del shoot_state["_leaf_layer_indexes"]
+        skeleton = [
+            type(inputs).__name__,
+            serialization.flatten(vars(inputs), values),
+            type(params).__name__,
+            serialization.flatten(vars(params), values),
+            serialization.flatten(shoot_state, values),
+        ]
+
+        layers_geometry = self._calc_layers_geometry(leaf_layer_indexes)
+        layers_skeletons = []
+        for index, layer in self.items():
+            layer_state = layer.__getstate__()
+            del layer_state["index"]
+            derived_state = self._calc_derived_layer_state(
+                layer_state, layers_geometry[index]
+            )
+            derived_names = tuple(
+                name
+                for name, value in derived_state.items()
+                if type(layer_state[name]) is type(value) and layer_state[name] == value
+            )
+            for name in derived_names:
+                del layer_state[name]
+            layers_skeletons.append(
+                (derived_names, serialization.flatten(layer_state, values))
+            )
+        if layers_skeletons and all(
+            layer_skeleton == layers_skeletons[0] for layer_skeleton in layers_skeletons
+        ):
+            layers_skeletons = layers_skeletons[0]
+        layers_classes = {type(layer).__name__ for layer in self.values()}
+        skeleton += [layers_classes.pop() if layers_classes else None, layers_skeletons]
+
+        return serialization.to_bytes(skeleton, values)
+
+    @classmethod
+    def from_bytes(cls, data: bytes):
+        """Creates a shoot from a payload created by :meth:`to_bytes`, restoring all attributes as they were.
+
+        Args:
+            data: the payload
+
+        Returns:
+            The shoot
+        """
+        skeleton, values = serialization.from_bytes(data)
+        values = iter(values)
+        (
+            inputs_class,
+            inputs_skeleton,
+            params_class,
+            params_skeleton,
+            shoot_skeleton,
+            layers_class,
+            layers_skeletons,
+        ) = skeleton
+
+        def _create(class_name: str, state: dict):
+            instance = object.__new__(cls._serializable_classes[class_name])
+            instance.__dict__.update(state)
+            return instance
+
+        shoot = cls.__new__(cls)
+        inputs = _create(inputs_class, serialization.unflatten(inputs_skeleton, values))
+        shoot.__dict__.update(
+            inputs=inputs,
+            params=_create(
+                params_class, serialization.unflatten(params_skeleton, values)
+            ),
+            _leaf_layer_indexes=list(reversed(sorted(inputs.leaf_layers.keys()))),
+        )
+        shoot.__dict__.update(serialization.unflatten(shoot_skeleton, values))
+        optics = shoot.__dict__.get("optics")
+        shoot.optics = None if optics is None else CanopyOptics(**optics)
+
+        layers_geometry = shoot._calc_layers_geometry(shoot._leaf_layer_indexes)
+        for position, index in enumerate(shoot._leaf_layer_indexes):
+            derived_names, layer_skeleton = (
+                layers_skeletons
+                if isinstance(layers_skeletons, tuple)
+                else layers_skeletons[position]
+            )
+            layer_state = serialization.unflatten(layer_skeleton, values)
+            derived_state = cls._calc_derived_layer_state(
+                layer_state, layers_geometry[index]
+            )
+            layer_state.update({name: derived_state[name] for name in derived_names})
+            layer = object.__new__(cls._serializable_classes[layers_class])
+            layer.__setstate__({"index": index, **layer_state})
+            shoot[index] = layer
+        return shoot
+
     def set_leaf_layers(self, leaves_category: str):
         """Sets leaf layers of the shoot.
 
@@ -184,12 +542,447 @@ class Shoot(dict):
                     index,
                     upper_cumulative_leaf_area_index,
                     layer_thickness,
-                    self.params,
+                    self.canopy_optics,
                 )
 
             upper_cumulative_leaf_area_index += layer_thickness
 
-    def calc_absorbed_irradiance(self):
-        """Calculates the absorbed irradiance by shoot's layers."""
-        for index in self._leaf_layer_indexes:
-            self[index].calc_absorbed_irradiance(self.inputs, self.params)
+    def calc_absorbed_irradiance(
+        self,
+        cache=None,
+        check_energy_balance: bool = False,
+        backend: str = None,
+        outputs: tuple or str = None,
+        layer_indexes: list = None,
+    ):
+        """Calculates the absorbed irradiance by shoot's layers, and the transmitted and reflected irradiance.
+
+        Args:
+            cache: optional :class:`ResultCache` object, from which the results are retrieved if the same inputs and
+                params have already been evaluated, and in which they are stored otherwise
+            check_energy_balance: if True, checks that the incident irradiance equals the sum of the absorbed,
+                reflected and transmitted irradiance (see :func:`canopy_budget.check_energy_balance`)
+            backend: name of the compute backend of leaf layers (see :mod:`crop_irradiance.uniform_crops.backends`)
+            outputs: names of the outputs to calculate (see :data:`backends.OUTPUTS_NAMES`), all but 'total' by
+                default
+            layer_indexes: indexes (as in the `leaf_layers` attribute of inputs) of the only leaf layers to evaluate,
+                or None to evaluate all leaf layers
+
+        Notes:
+            The 'total' and 'sunlit_shaded' outputs both set the `absorbed_irradiance` attribute of leaf layers, the
+                'components' output sets their other absorbed irradiance attributes, and the 'canopy_budget' output
+                sets the transmitted, reflected and soil-absorbed irradiance of the shoot (which are also calculated
+                when `check_energy_balance` is True). Attributes of other outputs are left to None, or calculated on
+                first access by sunlit-shaded leaf layers of the 'python' backend, and are not stored in `cache`.
+            When `layer_indexes` is given, the cost of the evaluation is proportional to the number of evaluated leaf
+                layers, whose cumulative leaf area index above them is that of the whole shoot, and other leaf layers
+                are left untouched. The canopy budget, which only depends on the leaf area index of the shoot, is still
+                calculated, but the energy balance cannot be checked.
+        """
+        outputs = backends.check_outputs(outputs)
+        if check_energy_balance and "total" not in outputs:
+            outputs += ("total",)
+        attributes_names = self._get_outputs_attributes(outputs)
+        if layer_indexes is not None:
+            assert (
+                not check_energy_balance
+            ), "The energy balance requires all leaf layers to be evaluated"
+            for index in layer_indexes:
+                assert index in self, f"Unknown leaf layer index: {index}"
+            layer_indexes = sorted(set(layer_indexes), reverse=True)
+        evaluated_indexes = (
+            self._leaf_layer_indexes if layer_indexes is None else layer_indexes
+        )
+        if cache is not None:
+            key = cache.calc_key(
+                self.leaves_category, self.inputs, self.params, self.optics
+            )
+            layers_results = cache.get(key)
+            if layers_results is not None and all(
+                name in layers_results.get(index, ())
+                for index in evaluated_indexes
+                for name in attributes_names
+            ):
+                for index in evaluated_indexes:
+                    for name in attributes_names:
+                        value = layers_results[index][name]
+                        setattr(
+                            self[index],
+                            name,
+                            dict(value) if isinstance(value, dict) else value,
+                        )
+                self._calc_outputs_energy_budget(outputs, check_energy_balance)
+                return
+
+        backends.get_backend(backend).calc_layers_absorbed_irradiance(
+            self, outputs, layer_indexes
+        )
+        self._calc_outputs_energy_budget(outputs, check_energy_balance)
+
+        if cache is not None:
+            cache.put(
+                key,
+                {
+                    index: {
+                        name: (
+                            dict(getattr(self[index], name))
+                            if isinstance(getattr(self[index], name), dict)
+                            else getattr(self[index], name)
+                        )
+                        for name in attributes_names
+                    }
+                    for index in evaluated_indexes
+                },
+            )
+
+    def _get_outputs_attributes(self, outputs: tuple) -> tuple:
+        """Returns the names of the absorbed irradiance attributes of leaf layers that are set for `outputs`."""
+        if self.leaves_category == "lumped":
+            attributes_names = LumpedLeafLayer.absorbed_irradiance_attributes
+        else:
+            attributes_names = SunlitShadedLeafLayer.absorbed_irradiance_attributes
+        names = ()
+        if {"total", "sunlit_shaded"}.intersection(outputs) or (
+            "components" in outputs and self.leaves_category == "lumped"
+        ):
+            names += attributes_names[:1]
+        if "components" in outputs:
+            names += attributes_names[1:]
+        return names
+
+    def _calc_outputs_energy_budget(self, outputs: tuple, check_energy_balance: bool):
+        """Calculates the energy budget of the shoot if asked for by `outputs` or needed by the energy balance check."""
+        if "canopy_budget" in outputs or check_energy_balance:
+            self.calc_energy_budget(check_energy_balance)
+
+    def calc_energy_budget(self, check_energy_balance: bool = False):
+        """Calculates the irradiance transmitted down to the soil surface and that reflected by the canopy.
+
+        Args:
+            check_energy_balance: if True, checks that the incident irradiance equals the sum of the absorbed irradiance
+                by all leaf layers and of the reflected and transmitted irradiance
+
+        Notes:
+            The soil is assumed not to reflect irradiance back to the canopy, so that the `soil_absorbed_irradiance`
+                attribute equals the `transmitted_irradiance` one.
+            Only the total leaf area index of the shoot is used, the exponentials of the bottom of the canopy being
+                evaluated once whatever the number of leaf layers.
+        """
+        leaf_area_index = sum(self.inputs.leaf_layers.values())
+        optics = self.canopy_optics
+        if getattr(self.params, "model", None) == "beer":
+            incident_irradiance = self.inputs.incident_irradiance
+            self.transmitted_irradiance = (
+                canopy_budget.calc_beer_transmitted_irradiance(
+                    incident_irradiance=incident_irradiance,
+                    extinction_coefficient=self.params.extinction_coefficient,
+                    leaf_area_index=leaf_area_index,
+                )
+            )
+            self.reflected_irradiance = 0.0
+        else:
+            incident_irradiance = (
+                self.inputs.incident_direct_irradiance
+                + self.inputs.incident_diffuse_irradiance
+            )
+            self.transmitted_irradiance = canopy_budget.calc_transmitted_irradiance(
+                incident_direct_irradiance=self.inputs.incident_direct_irradiance,
+                incident_diffuse_irradiance=self.inputs.incident_diffuse_irradiance,
+                leaf_area_index=leaf_area_index,
+                direct_extinction_coefficient=optics.direct_extinction_coefficient,
+                diffuse_extinction_coefficient=optics.diffuse_extinction_coefficient,
+                canopy_reflectance_to_direct_irradiance=optics.canopy_reflectance_to_direct_irradiance,
+                canopy_reflectance_to_diffuse_irradiance=optics.canopy_reflectance_to_diffuse_irradiance,
+            )
+            self.reflected_irradiance = canopy_budget.calc_reflected_irradiance(
+                incident_direct_irradiance=self.inputs.incident_direct_irradiance,
+                incident_diffuse_irradiance=self.inputs.incident_diffuse_irradiance,
+                canopy_reflectance_to_direct_irradiance=optics.canopy_reflectance_to_direct_irradiance,
+                canopy_reflectance_to_diffuse_irradiance=optics.canopy_reflectance_to_diffuse_irradiance,
+            )
+        self.soil_absorbed_irradiance = self.transmitted_irradiance
+
+        if check_energy_balance:
+            canopy_budget.check_energy_balance(
+                incident_irradiance=incident_irradiance,
+                absorbed_irradiance=sum(
+                    sum(layer.absorbed_irradiance.values()) for layer in self.values()
+                ),
+                reflected_irradiance=self.reflected_irradiance,
+                transmitted_irradiance=self.transmitted_irradiance,
+            )
+
+    def to_structured_array(self):
+        """Exports the per-layer quantities of the shoot as a NumPy structured array.
+
+        Returns:
+            A structured array having one record per leaf layer, ordered from the top to the bottom of the canopy, and
+                the following fields:
+                    'index': the index of the layer in `inputs.leaf_layers`
+                    the exported attributes of the layers class (e.g. 'thickness', 'sunlit_fraction')
+                    the absorbed irradiance components set by `calc_absorbed_irradiance()`, if already called (e.g.
+                        'abs_direct_by_sunlit')
+                    the keys of the `absorbed_irradiance` attribute of layers, if already calculated (e.g. 'sunlit',
+                        'shaded' or 'lumped')
+
+        Notes:
+            Fields are those of all the evaluated layers, the values of layers that are not evaluated (see the
+                `layer_indexes` argument of :meth:`calc_absorbed_irradiance`) being NaN.
+            Records are built in a single pass over the layers, whatever the number of fields. This method requires
+                NumPy.
+        """
+        import numpy
+
+        layers = list(self.values())
+        if not layers:
+            return numpy.zeros(0, dtype=[("index", numpy.int64)])
+
+        first_layer = layers[0]
+        names = first_layer.exported_attributes + tuple(
+            name
+            for name in first_layer.absorbed_irradiance_attributes
+            if name != "absorbed_irradiance"
+            and any(getattr(layer, name) is not None for layer in layers)
+        )
+        layers_absorbed_irradiance = [
+            layer.absorbed_irradiance or {} for layer in layers
+        ]
+        categories = tuple(
+            dict.fromkeys(
+                category
+                for absorbed_irradiance in layers_absorbed_irradiance
+                for category in absorbed_irradiance
+            )
+        )
+        get_attributes = attrgetter(*names)
+        nan = float("nan")
+
+        return numpy.array(
+            [
+                (layer.index,)
+                + tuple(
+                    nan if value is None else value for value in get_attributes(layer)
+                )
+                + tuple(
+                    absorbed_irradiance.get(category, nan) for category in categories
+                )
+                for layer, absorbed_irradiance in zip(
+                    layers, layers_absorbed_irradiance
+                )
+            ],
+            dtype=[("index", numpy.int64)]
+            + [(name, numpy.float64) for name in names + categories],
+        )
+
+    def to_arrays(self) -> dict:
+        """Exports the per-layer quantities of the shoot as a dictionary of NumPy arrays.
+
+        Returns:
+            A dictionary whose keys are the fields of :meth:`to_structured_array` and values are arrays ordered from the
+                top to the bottom of the canopy
+
+        Notes:
+            The arrays are views of the fields of a single structured array, so that no copy is made per quantity.
+        """
+        records = self.to_structured_array()
+        return {name: records[name] for name in records.dtype.names}
+
+    def calc_absorbed_irradiance_jacobian(self):
+        """Calculates the analytic derivatives of the absorbed irradiance by shoot's layers.
+
+        The derivatives are set to the `absorbed_irradiance_jacobian` attribute of each layer, as a dictionary whose
+            keys are the leaf categories ('lumped', or 'sunlit' and 'shaded') and values are dictionaries of the
+            derivatives w.r.t. each parameter. Derivatives w.r.t. 'leaf_layer_thickness' are given as dictionaries
+            whose keys are the indexes of the thickening layers.
+
+        Notes:
+            See :func:`vectorized.calc_sunlit_shaded_jacobian` and :func:`vectorized.calc_lumped_jacobian` for the
+                list of parameters. This method requires NumPy.
+        """
+        from crop_irradiance.uniform_crops import vectorized
+
+        if isinstance(self.params, LumpedParams):
+            jacobian = vectorized.calc_lumped_jacobian(
+                leaf_layers=self.inputs.leaf_layers,
+                params=self.params,
+                incident_irradiance=getattr(self.inputs, "incident_irradiance", None),
+                incident_direct_irradiance=getattr(
+                    self.inputs, "incident_direct_irradiance", None
+                ),
+                incident_diffuse_irradiance=getattr(
+                    self.inputs, "incident_diffuse_irradiance", None
+                ),
+                solar_inclination=getattr(self.inputs, "solar_inclination", None),
+            )
+        else:
+            jacobian = vectorized.calc_sunlit_shaded_jacobian(
+                leaf_layers=self.inputs.leaf_layers,
+                incident_direct_irradiance=self.inputs.incident_direct_irradiance,
+                incident_diffuse_irradiance=self.inputs.incident_diffuse_irradiance,
+                solar_inclination=self.inputs.solar_inclination,
+                params=self.params,
+            )
+
+        for position, index in enumerate(self._leaf_layer_indexes):
+            self[index].absorbed_irradiance_jacobian = {
+                category: {
+                    parameter: (
+                        dict(
+                            zip(
+                                self._leaf_layer_indexes,
+                                derivatives[position].tolist(),
+                            )
+                        )
+                        if parameter == "leaf_layer_thickness"
+                        else float(derivatives[position])
+                    )
+                    for parameter, derivatives in category_jacobian.items()
+                }
+                for category, category_jacobian in jacobian.items()
+                if category in ("lumped", "sunlit", "shaded")
+            }
+
+    def calc_absorbed_irradiance_at_gauss_points(self, points_number: int = 3) -> dict:
+        """Calculates the absorbed irradiance by sunlit and shaded leaves at Gauss-Legendre points of canopy depth.
+
+        Args:
+            points_number: [-] number of quadrature points along the cumulative leaf area index of the shoot
+
+        Returns:
+            A dictionary whose values are lists ordered from the top to the bottom of the canopy, having as keys:
+                'cumulative_leaf_area_index': [m2leaf m-2ground] depth of each quadrature point
+                'weight': [m2leaf m-2ground] weight of each quadrature point
+                'sunlit_fraction': [-] fraction of sunlit leaves at each quadrature point
+                'sunlit': [W m-2leaf] absorbed irradiance per unit sunlit leaf area at each quadrature point
+                'shaded': [W m-2leaf] absorbed irradiance per unit shaded leaf area at each quadrature point
+
+        Notes:
+            This calculation requires the direct and diffuse extinction coefficients of `params` to be set, i.e. it
+                applies to :class:`SunlitShadedParams` and to :class:`LumpedParams` of the 'de_pury' model once
+                updated.
+            The canopy integral of a (possibly non-linear) function :math:`f` of the absorbed irradiance by sunlit
+                leaves is approximated as :math:`\\sum_i w_i f_{sl,i} f(I_{sl,i})`, where :math:`w_i` and
+                :math:`f_{sl,i}` are respectively the weight and sunlit fraction of the i-th point. A handful of
+                points usually suffices to replace a finely layered canopy.
+        """
+        optics = self.canopy_optics
+        depths, weights = quadrature.calc_canopy_gauss_points(
+            leaf_area_index=sum(self.inputs.leaf_layers.values()),
+            points_number=points_number,
+        )
+
+        coefficients = dict(
+            incident_direct_irradiance=self.inputs.incident_direct_irradiance,
+            incident_diffuse_irradiance=self.inputs.incident_diffuse_irradiance,
+            leaf_scattering_coefficient=optics.leaf_scattering_coefficient,
+            canopy_reflectance_to_direct_irradiance=optics.canopy_reflectance_to_direct_irradiance,
+            canopy_reflectance_to_diffuse_irradiance=optics.canopy_reflectance_to_diffuse_irradiance,
+            direct_extinction_coefficient=optics.direct_extinction_coefficient,
+            direct_black_extinction_coefficient=optics.direct_black_extinction_coefficient,
+            diffuse_extinction_coefficient=optics.diffuse_extinction_coefficient,
+        )
+
+        return {
+            "cumulative_leaf_area_index": depths,
+            "weight": weights,
+            "sunlit_fraction": [
+                sunlit_shaded_leaves.calc_sunlit_fraction(
+                    depth, optics.direct_black_extinction_coefficient
+                )
+                for depth in depths
+            ],
+            "sunlit": [
+                sunlit_shaded_leaves.calc_absorbed_irradiance_by_sunlit_leaves_at_given_depth(
+                    cumulative_leaf_area_index=depth, **coefficients
+                )
+                for depth in depths
+            ],
+            "shaded": [
+                sunlit_shaded_leaves.calc_absorbed_irradiance_by_shaded_leaves_at_given_depth(
+                    cumulative_leaf_area_index=depth, **coefficients
+                )
+                for depth in depths
+            ],
+        }
+
+
+def calc_joint_shoots(
+    leaf_layers: dict,
+    incident_direct_irradiance: float,
+    incident_diffuse_irradiance: float,
+    solar_inclination: float,
+    lumped_params: LumpedParams,
+    sunlit_shaded_params: SunlitShadedParams,
+    cache=None,
+    check_energy_balance: bool = False,
+    backend: str = None,
+) -> dict:
+    """Creates and evaluates a lumped shoot of the 'de_pury' model and a sunlit-shaded shoot of the same canopy.
+
+    Args:
+        leaf_layers: [m2leaf m-2ground] leaf layers thicknesses, as expected by the `leaf_layers` attribute of inputs
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        solar_inclination: [rad] angle of solar inclination
+        lumped_params: see class`LumpedParams` of the 'de_pury' model, whose attributes are only read
+        sunlit_shaded_params: see class`SunlitShadedParams`, whose attributes are only read
+        cache: optional :class:`ResultCache` object (see :meth:`Shoot.calc_absorbed_irradiance`)
+        check_energy_balance: if True, checks the energy balance of both shoots
+        backend: name of the compute backend (see :mod:`crop_irradiance.uniform_crops.backends`)
+
+    Returns:
+        A dictionary having as keys 'lumped' and 'sunlit-shaded' and as values the evaluated shoots
+
+    Notes:
+        When both params share the attributes that canopy coefficients are calculated from (see
+            :data:`params.OPTICS_CONFIGURATION_NAMES`), the extinction and reflection coefficients are calculated once
+            for both shoots, whose canopy optics only differ by their model. See
+            :func:`vectorized.calc_joint_absorbed_irradiance` to also share the exponentials of leaf layers.
+    """
+    assert (
+        lumped_params.model == "de_pury"
+    ), "Lumped params must be of the 'de_pury' model"
+    leaf_area_index = sum(leaf_layers.values())
+    sunlit_shaded_optics = calc_canopy_optics(
+        sunlit_shaded_params, solar_inclination, leaf_area_index, backend
+    )
+    if have_same_optics_configuration(lumped_params, sunlit_shaded_params):
+        lumped_optics = CanopyOptics(
+            lumped_params.model,
+            sunlit_shaded_optics.solar_inclination,
+            sunlit_shaded_optics.leaf_area_index,
+            **{
+                name: getattr(sunlit_shaded_optics, name)
+                for name in OPTICS_COEFFICIENTS_NAMES
+            },
+        )
+    else:
+        lumped_optics = calc_canopy_optics(
+            lumped_params, solar_inclination, leaf_area_index, backend
+        )
+
+    forcing = dict(
+        leaf_layers=leaf_layers,
+        incident_direct_irradiance=incident_direct_irradiance,
+        incident_diffuse_irradiance=incident_diffuse_irradiance,
+        solar_inclination=solar_inclination,
+    )
+    shoots = {
+        "lumped": Shoot(
+            "lumped",
+            LumpedInputs(model=lumped_params.model, **forcing),
+            lumped_params,
+            lumped_optics,
+        ),
+        "sunlit-shaded": Shoot(
+            "sunlit-shaded",
+            SunlitShadedInputs(**forcing),
+            sunlit_shaded_params,
+            sunlit_shaded_optics,
+        ),
+    }
+    for shoot in shoots.values():
+        shoot.calc_absorbed_irradiance(
+            cache=cache, check_energy_balance=check_energy_balance, backend=backend
+        )
+    return shoots
@@ -0,0 +1,1512 @@
+"""Vectorized evaluation of irradiance absorption by uniform crops canopies.
+
+The functions of this module evaluate whole leaf layer profiles (along the last axis of arrays) for any number of
+timesteps or canopies (along the leading axes) at once. Leaf layers are ordered from the top to the bottom of the
+canopy, i.e. following the same order as :class:`Shoot` layers, and the results are identical to those obtained by
+:mod:`crop_irradiance.uniform_crops.shoot`.
+
+Forward functions accept a `dtype` argument: canopy coefficients are always calculated in double precision, while the
+per-layer evaluation and the results use `dtype`, so that single precision (`numpy.float32`) halves the memory
+footprint of large profiles at the cost of an absolute error of the order of 1e-6 times the incident irradiance.
+
+This module requires NumPy.
+"""
+
+from types import SimpleNamespace
+
+import numpy
+
+from crop_irradiance.uniform_crops import backends, derivatives
+from crop_irradiance.uniform_crops.formalisms import (
+    config,
+    leaf_angle_distributions,
+    sunlit_shaded_leaves,
+)
+from crop_irradiance.uniform_crops.params import (
+    LumpedParams,
+    SunlitShadedParams,
+    have_same_optics_configuration,
+)
+
+SUNLIT_SHADED_COMPONENTS = (
+    "abs_direct_by_sunlit",
+    "abs_diffuse_by_sunlit",
+    "abs_scattered_by_sunlit",
+    "abs_diffuse_by_shaded",
+    "abs_scattered_by_shaded",
+)
+
+COMPUTE_DTYPES = (numpy.float64, numpy.float32)
+
+LAYERS_PARAMS_NAMES = (
+    "leaf_reflectance",
+    "leaf_transmittance",
+    "leaf_scattering_coefficient",
+    "clumping_factor",
+    "leaf_angle_distribution_factor",
+    "extinction_coefficient",
+)
+
+
+def _check_dtype(dtype):
+    """Returns `dtype` as a numpy floating point type, checking that it is one of :data:`COMPUTE_DTYPES`."""
+    dtype = numpy.dtype(dtype).type
+    assert dtype in COMPUTE_DTYPES, f"Unsupported compute dtype: {dtype}"
+    return dtype
+
+
+def calc_leaf_layer_thicknesses(leaf_layers) -> numpy.ndarray:
+    """Returns leaf layers thicknesses as an array ordered from the top to the bottom of the canopy.
+
+    Args:
+        leaf_layers: either a dictionary of leaf layers thicknesses (as for the `leaf_layers` attribute of inputs), or
+            an array of thicknesses [m2leaf m-2ground] whose last axis is ordered from the top to the bottom of the
+            canopy
+
+    Returns:
+        [m2leaf m-2ground] leaf layers thicknesses
+    """
+    if isinstance(leaf_layers, dict):
+        return numpy.array(
+            [leaf_layers[index] for index in sorted(leaf_layers, reverse=True)],
+            dtype=float,
+        )
+    return numpy.asarray(leaf_layers, dtype=float)
+
+
+def calc_cumulative_leaf_area_index(leaf_layer_thicknesses) -> numpy.ndarray:
+    """Calculates the cumulative downwards leaf area index at the boundaries of leaf layers.
+
+    Args:
+        leaf_layer_thicknesses: [m2leaf m-2ground] leaf layers thicknesses ordered from the top to the bottom of the
+            canopy
+
+    Returns:
+        [m2leaf m-2ground] cumulative leaf area index at the top of each layer followed by that at the bottom of the
+            canopy (the last axis has one more element than the number of leaf layers)
+    """
+    leaf_layer_thicknesses = numpy.asarray(leaf_layer_thicknesses)
+    cumulative_leaf_area_index = numpy.zeros(
+        leaf_layer_thicknesses.shape[:-1] + (leaf_layer_thicknesses.shape[-1] + 1,)
+    )
+    numpy.cumsum(
+        leaf_layer_thicknesses, axis=-1, out=cumulative_leaf_area_index[..., 1:]
+    )
+    return cumulative_leaf_area_index
+
+
+def calc_projection_function(
+    solar_inclination, leaf_angle_distribution: str, leaf_angle_distribution_factor=None
+):
+    """Vectorized version of :func:`leaf_angle_distributions.calc_projection_function`.
+
+    Args:
+        solar_inclination: [rad] angle of solar inclination (scalar or array)
+        leaf_angle_distribution: one of `leaf_angle_distributions.LEAF_ANGLE_DISTRIBUTIONS`
+        leaf_angle_distribution_factor: [-] factor describing leaf angle distribution, only used by 'ellipsoidal'
+            distributions (scalar or array broadcasting against `solar_inclination`)
+
+    Returns:
+        [m2ground m-2leaf] the mean projection of a unit leaf area in the direction of the sun
+
+    Notes:
+        One projection table is used per distinct value of `leaf_angle_distribution_factor`, tables being shared with
+            :mod:`leaf_angle_distributions`.
+    """
+    if leaf_angle_distribution == "ellipsoidal":
+        factors, table_indexes = numpy.unique(
+            numpy.asarray(leaf_angle_distribution_factor, dtype=float),
+            return_inverse=True,
+        )
+        tables = numpy.array(
+            [
+                leaf_angle_distributions.calc_projection_table(
+                    leaf_angle_distribution, float(factor)
+                )
+                for factor in factors
+            ]
+        )
+        table_indexes = table_indexes.reshape(
+            numpy.shape(leaf_angle_distribution_factor)
+        )
+    else:
+        tables = numpy.array(
+            [leaf_angle_distributions.calc_projection_table(leaf_angle_distribution)]
+        )
+        table_indexes = 0
+    solar_inclination, table_indexes = numpy.broadcast_arrays(
+        solar_inclination, table_indexes
+    )
+    solar_inclination = numpy.maximum(
+        0.0, numpy.minimum(solar_inclination, numpy.pi - solar_inclination)
+    )
+    position = solar_inclination / (numpy.pi / 2) * (tables.shape[-1] - 1)
+    index = numpy.minimum(position.astype(int), tables.shape[-1] - 2)
+    weight = position - index
+    return (1 - weight) * tables[table_indexes, index] + weight * tables[
+        table_indexes, index + 1
+    ]
+
+
+def calc_direct_black_extinction_coefficient(
+    solar_inclination,
+    leaf_angle_distribution_factor,
+    clumping_factor,
+    leaf_angle_distribution: str = None,
+):
+    """Vectorized version of :func:`sunlit_shaded_leaves.calc_direct_black_extinction_coefficient`."""
+    solar_inclination = numpy.maximum(config.PRECISION, solar_inclination)
+    if leaf_angle_distribution is not None:
+        projection = calc_projection_function(
+            solar_inclination, leaf_angle_distribution, leaf_angle_distribution_factor
+        )
+        return (
+            clumping_factor
+            * projection
+            / numpy.maximum(config.PRECISION, numpy.sin(solar_inclination))
+        )
+    projection_ratio = (leaf_angle_distribution_factor / 9.65) ** -0.6061 - 3.0
+    numerator = (projection_ratio**2 + numpy.tan(solar_inclination) ** -2) ** 0.5
+    denominator = projection_ratio + 1.774 * (projection_ratio + 1.182) ** -0.733
+    return clumping_factor * numerator / numpy.maximum(config.PRECISION, denominator)
+
+
+def calc_sky_sectors_direct_black_extinction_coefficient(
+    sky_sectors_number: int,
+    leaf_angle_distribution_factor,
+    clumping_factor,
+    leaf_angle_distribution: str = None,
+):
+    """Calculates the extinction coefficients of direct irradiance for black leaves coming from each sky sector.
+
+    Args:
+        sky_sectors_number: [-] number of sky sectors to be used
+        leaf_angle_distribution_factor: [-] factor describing leaf angle distribution (scalar or array)
+        clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves (scalar
+            or array)
+        leaf_angle_distribution: one of `leaf_angle_distributions.LEAF_ANGLE_DISTRIBUTIONS`, or None (default) to use
+            the approximation of Campbell (1990) for ellipsoidal distributions
+
+    Returns:
+        [m2ground m-2leaf] the extinction coefficients of direct irradiance for black leaves, for the center of each
+            sky sector (along a trailing axis)
+    """
+    return calc_direct_black_extinction_coefficient(
+        numpy.array(sunlit_shaded_leaves.calc_sky_sectors_angle(sky_sectors_number)),
+        numpy.asarray(leaf_angle_distribution_factor)[..., None],
+        numpy.asarray(clumping_factor)[..., None],
+        leaf_angle_distribution,
+    )
+
+
+def calc_diffuse_extinction_coefficient(
+    leaf_area_index,
+    leaf_angle_distribution_factor: float,
+    clumping_factor: float,
+    leaf_scattering_coefficient: float,
+    sky_sectors_number: int = 3,
+    sky_type: str = "soc",
+    leaf_angle_distribution: str = None,
+):
+    """Vectorized version of :func:`sunlit_shaded_leaves.calc_diffuse_extinction_coefficient` for non-black leaves.
+
+    Args:
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy (scalar or array)
+        leaf_angle_distribution_factor: [-] factor describing leaf angle distribution (scalar or array)
+        clumping_factor: [-] clumping factor to describe the spatial dependency of the positions of the leaves (scalar
+            or array)
+        leaf_scattering_coefficient: [-] leaf scattering coefficient (scalar or array)
+        sky_sectors_number: [-] number of sky sectors to be used
+        sky_type: one of 'soc' or 'uoc' (Sky OverCast and Uniform OverCast, respectively)
+        leaf_angle_distribution: one of `leaf_angle_distributions.LEAF_ANGLE_DISTRIBUTIONS`, or None (default) to use
+            the approximation of Campbell (1990) for ellipsoidal distributions
+
+    Returns:
+        [m2ground m-2leaf] the extinction coefficient of diffuse irradiance through a canopy of non-black leaves
+    """
+    leaf_area_index = numpy.maximum(config.PRECISION, leaf_area_index)[..., None]
+    sky_weights = numpy.array(
+        sunlit_shaded_leaves.calc_sky_sectors_weight(sky_sectors_number, sky_type)
+    )
+    sectors_extinction_coefficient = (
+        calc_sky_sectors_direct_black_extinction_coefficient(
+            sky_sectors_number,
+            leaf_angle_distribution_factor,
+            clumping_factor,
+            leaf_angle_distribution,
+        )
+        * numpy.sqrt(1 - numpy.asarray(leaf_scattering_coefficient)[..., None])
+    )
+    # transmitted fraction minus 1 (weights summing up to 1), to avoid cancellation errors in sparse canopies
+    transmission = (
+        sky_weights * numpy.expm1(-sectors_extinction_coefficient * leaf_area_index)
+    ).sum(axis=-1)
+    return -1.0 / leaf_area_index[..., 0] * numpy.log1p(transmission)
+
+
+def calc_sunlit_shaded_coefficients(
+    solar_inclination, leaf_area_index, params: LumpedParams or SunlitShadedParams
+) -> dict:
+    """Calculates the extinction and reflection coefficients of the canopy.
+
+    Args:
+        solar_inclination: [rad] angle of solar inclination (scalar or array)
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy (scalar or array)
+        params: see class`SunlitShadedParams` and `LumpedParams` of the 'de_pury' model
+
+    Returns:
+        A dictionary having as keys the names of the coefficients as defined in `params`
+
+    Notes:
+        The leaf optical and structural attributes of `params` may be set to arrays that broadcast against
+            `solar_inclination` and `leaf_area_index`, e.g. to evaluate several parameter sets at once.
+    """
+    direct_black_extinction_coefficient = calc_direct_black_extinction_coefficient(
+        solar_inclination=numpy.asarray(solar_inclination, dtype=float),
+        leaf_angle_distribution_factor=params.leaf_angle_distribution_factor,
+        clumping_factor=params.clumping_factor,
+        leaf_angle_distribution=params.leaf_angle_distribution,
+    )
+    transmission_factor = numpy.sqrt(1 - params.leaf_scattering_coefficient)
+    reflectance_of_horizontal_leaves = (1.0 - transmission_factor) / (
+        1.0 + transmission_factor
+    )
+    return {
+        "leaf_scattering_coefficient": params.leaf_scattering_coefficient,
+        "canopy_reflectance_to_diffuse_irradiance": params.canopy_reflectance_to_diffuse_irradiance,
+        "direct_black_extinction_coefficient": direct_black_extinction_coefficient,
+        "direct_extinction_coefficient": direct_black_extinction_coefficient
+        * transmission_factor,
+        "diffuse_extinction_coefficient": calc_diffuse_extinction_coefficient(
+            leaf_area_index=numpy.asarray(leaf_area_index, dtype=float),
+            leaf_angle_distribution_factor=params.leaf_angle_distribution_factor,
+            clumping_factor=params.clumping_factor,
+            leaf_scattering_coefficient=params.leaf_scattering_coefficient,
+            sky_sectors_number=params.sky_sectors_number,
+            sky_type=params.sky_type,
+            leaf_angle_distribution=params.leaf_angle_distribution,
+        ),
+        "canopy_reflectance_to_direct_irradiance": 1.0
+        - numpy.exp(
+            -(
+                2.0
+                * reflectance_of_horizontal_leaves
+                * direct_black_extinction_coefficient
+            )
+            / (1.0 + direct_black_extinction_coefficient)
+        ),
+    }
+
+
+def _check_layers_params(layers_params: dict, leaf_layer_thicknesses) -> dict:
+    """Checks the names and shapes of per-layer params, and returns them as arrays, leaf reflectance and transmittance
+    being replaced by the leaf scattering coefficient."""
+    layers_params = {
+        name: numpy.asarray(value, dtype=float) for name, value in layers_params.items()
+    }
+    assert set(layers_params).issubset(
+        LAYERS_PARAMS_NAMES
+    ), f"Per-layer params must be among {LAYERS_PARAMS_NAMES}"
+    for name, value in layers_params.items():
+        assert (
+            value.shape[-1:] == leaf_layer_thicknesses.shape[-1:]
+        ), f"The last axis of '{name}' must be that of the leaf layers"
+    if {"leaf_reflectance", "leaf_transmittance"}.intersection(layers_params):
+        assert {"leaf_reflectance", "leaf_transmittance"}.issubset(
+            layers_params
+        ) and "leaf_scattering_coefficient" not in layers_params, "Leaf reflectance and transmittance must be given together, instead of the leaf scattering coefficient"
+        layers_params["leaf_scattering_coefficient"] = (
+            sunlit_shaded_leaves.calc_leaf_scattering_coefficient(
+                leaf_reflectance=layers_params.pop("leaf_reflectance"),
+                leaf_transmittance=layers_params.pop("leaf_transmittance"),
+            )
+        )
+    return layers_params
+
+
+def calc_layers_coefficients(
+    solar_inclination,
+    leaf_area_index,
+    params: LumpedParams or SunlitShadedParams,
+    layers_params: dict,
+) -> dict:
+    """Calculates the extinction and reflection coefficients of each leaf layer.
+
+    Args:
+        solar_inclination: [rad] angle of solar inclination (scalar or array)
+        leaf_area_index: [m2leaf m-2ground] leaf area index of the whole canopy (scalar or array)
+        params: see class`SunlitShadedParams` and `LumpedParams` of the 'de_pury' model
+        layers_params: arrays of per-layer values (last axis being that of the leaf layers) of some of the
+            'leaf_scattering_coefficient', 'clumping_factor' and 'leaf_angle_distribution_factor' params, overriding
+            those of `params` (see :func:`_check_layers_params`)
+
+    Returns:
+        A dictionary having as keys the names of the coefficients as defined in `params`, and as values arrays having
+            a trailing axis, either that of the leaf layers or of size 1 for the coefficients of the whole canopy
+
+    Notes:
+        The diffuse extinction coefficient of each leaf layer is that of a canopy having the leaf area index of the
+            whole canopy and the leaf params of the layer.
+        The canopy reflectances are those of the whole canopy, the reflectance to direct irradiance being calculated
+            from the params of the top leaf layer, so that the energy balance of the canopy is closed.
+    """
+    layers_params_namespace = SimpleNamespace(**vars(params))
+    for name in (
+        "leaf_scattering_coefficient",
+        "clumping_factor",
+        "leaf_angle_distribution_factor",
+        "canopy_reflectance_to_diffuse_irradiance",
+    ):
+        setattr(
+            layers_params_namespace,
+            name,
+            layers_params.get(name, numpy.asarray(getattr(params, name))[..., None]),
+        )
+    coefficients = calc_sunlit_shaded_coefficients(
+        solar_inclination=numpy.asarray(solar_inclination, dtype=float)[..., None],
+        leaf_area_index=numpy.asarray(leaf_area_index, dtype=float)[..., None],
+        params=layers_params_namespace,
+    )
+    coefficients["canopy_reflectance_to_direct_irradiance"] = coefficients[
+        "canopy_reflectance_to_direct_irradiance"
+    ][..., :1]
+    return coefficients
+
+
+# Each absorbed irradiance component is a sum of terms :math:`I \cdot s \cdot \prod f (e^{-K L_u} - e^{-K L_l})`,
+#   where :math:`I` is an incident irradiance, :math:`s` a sign (or scale) constant, :math:`f` are factors depending
+#   on the canopy coefficients and :math:`K` is the sum of a set of extinction coefficients.
+SUNLIT_SHADED_TERMS = (
+    (
+        "abs_direct_by_sunlit",
+        "incident_direct_irradiance",
+        1.0,
+        ("leaf_absorptance",),
+        ("direct_black_extinction_coefficient",),
+    ),
+    (
+        "abs_diffuse_by_sunlit",
+        "incident_diffuse_irradiance",
+        1.0,
+        ("canopy_absorptance_to_diffuse_irradiance", "diffuse_extinction_ratio"),
+        ("diffuse_extinction_coefficient", "direct_black_extinction_coefficient"),
+    ),
+    (
+        "abs_scattered_by_sunlit",
+        "incident_direct_irradiance",
+        1.0,
+        ("canopy_absorptance_to_direct_irradiance", "direct_extinction_ratio"),
+        ("direct_extinction_coefficient", "direct_black_extinction_coefficient"),
+    ),
+    (
+        "abs_scattered_by_sunlit",
+        "incident_direct_irradiance",
+        -0.5,
+        ("leaf_absorptance",),
+        ("direct_black_extinction_coefficient", "direct_black_extinction_coefficient"),
+    ),
+    (
+        "abs_diffuse_by_shaded",
+        "incident_diffuse_irradiance",
+        1.0,
+        ("canopy_absorptance_to_diffuse_irradiance",),
+        ("diffuse_extinction_coefficient",),
+    ),
+    (
+        "abs_diffuse_by_shaded",
+        "incident_diffuse_irradiance",
+        -1.0,
+        ("canopy_absorptance_to_diffuse_irradiance", "diffuse_extinction_ratio"),
+        ("diffuse_extinction_coefficient", "direct_black_extinction_coefficient"),
+    ),
+    (
+        "abs_scattered_by_shaded",
+        "incident_direct_irradiance",
+        1.0,
+        ("canopy_absorptance_to_direct_irradiance",),
+        ("direct_extinction_coefficient",),
+    ),
+    (
+        "abs_scattered_by_shaded",
+        "incident_direct_irradiance",
+        -1.0,
+        ("canopy_absorptance_to_direct_irradiance", "direct_extinction_ratio"),
+        ("direct_extinction_coefficient", "direct_black_extinction_coefficient"),
+    ),
+    (
+        "abs_scattered_by_shaded",
+        "incident_direct_irradiance",
+        -1.0,
+        ("leaf_absorptance",),
+        ("direct_black_extinction_coefficient",),
+    ),
+    (
+        "abs_scattered_by_shaded",
+        "incident_direct_irradiance",
+        0.5,
+        ("leaf_absorptance",),
+        ("direct_black_extinction_coefficient", "direct_black_extinction_coefficient"),
+    ),
+)
+
+DE_PURY_TERMS = (
+    (
+        "lumped",
+        "incident_direct_irradiance",
+        1.0,
+        ("canopy_absorptance_to_direct_irradiance",),
+        ("direct_extinction_coefficient",),
+    ),
+    (
+        "lumped",
+        "incident_diffuse_irradiance",
+        1.0,
+        ("canopy_absorptance_to_diffuse_irradiance",),
+        ("diffuse_extinction_coefficient",),
+    ),
+)
+
+BEER_TERMS = (("lumped", "incident_irradiance", 1.0, (), ("extinction_coefficient",)),)
+
+
+def _calc_factors(coefficients: dict, coefficients_derivatives: dict = None) -> tuple:
+    """Calculates the factors of absorbed irradiance terms and, optionally, their derivatives.
+
+    Args:
+        coefficients: canopy coefficients (see :func:`calc_sunlit_shaded_coefficients`)
+        coefficients_derivatives: derivatives of the canopy coefficients w.r.t. each parameter
+
+    Returns:
+        The values of the factors, and their derivatives w.r.t. each parameter (None if `coefficients_derivatives`
+            is None)
+    """
+    factors = {}
+    if "leaf_scattering_coefficient" in coefficients:
+        k_b = coefficients["direct_black_extinction_coefficient"]
+        k_p = coefficients["direct_extinction_coefficient"]
+        k_d = coefficients["diffuse_extinction_coefficient"]
+        factors.update(
+            {
+                "leaf_absorptance": 1 - coefficients["leaf_scattering_coefficient"],
+                "canopy_absorptance_to_direct_irradiance": 1
+                - coefficients["canopy_reflectance_to_direct_irradiance"],
+                "canopy_absorptance_to_diffuse_irradiance": 1
+                - coefficients["canopy_reflectance_to_diffuse_irradiance"],
+                "diffuse_extinction_ratio": k_d / (k_d + k_b),
+                "direct_extinction_ratio": k_p / (k_p + k_b),
+            }
+        )
+
+    if coefficients_derivatives is None or not factors:
+        return factors, None
+
+    factors_derivatives = {}
+    for name, d in coefficients_derivatives.items():
+        factors_derivatives[name] = {
+            "leaf_absorptance": -d["leaf_scattering_coefficient"],
+            "canopy_absorptance_to_direct_irradiance": -d[
+                "canopy_reflectance_to_direct_irradiance"
+            ],
+            "canopy_absorptance_to_diffuse_irradiance": -d[
+                "canopy_reflectance_to_diffuse_irradiance"
+            ],
+            "diffuse_extinction_ratio": (
+                k_b * d["diffuse_extinction_coefficient"]
+                - k_d * d["direct_black_extinction_coefficient"]
+            )
+            / (k_d + k_b) ** 2,
+            "direct_extinction_ratio": (
+                k_b * d["direct_extinction_coefficient"]
+                - k_p * d["direct_black_extinction_coefficient"]
+            )
+            / (k_p + k_b) ** 2,
+        }
+    return factors, factors_derivatives
+
+
+def _calc_optical_depth(extinction_coefficient, cumulative_leaf_area_index):
+    """Calculates the optical depth at the boundaries of leaf layers of an extinction coefficient.
+
+    The extinction coefficient is either that of the whole canopy (trailing axis of size 1), the optical depth being
+        :math:`K L`, or that of each leaf layer, the optical depth being the cumulative sum of :math:`K_i \\Delta L_i`.
+    """
+    layers_number = cumulative_leaf_area_index.shape[-1] - 1
+    if numpy.shape(extinction_coefficient)[-1:] != (layers_number,):
+        return extinction_coefficient * cumulative_leaf_area_index
+    layers_optical_depth = extinction_coefficient * numpy.diff(
+        cumulative_leaf_area_index, axis=-1
+    )
+    optical_depth = numpy.zeros(
+        layers_optical_depth.shape[:-1] + (layers_number + 1,),
+        layers_optical_depth.dtype,
+    )
+    numpy.cumsum(layers_optical_depth, axis=-1, out=optical_depth[..., 1:])
+    return optical_depth
+
+
+def _calc_attenuation(
+    terms: tuple, coefficients: dict, cumulative_leaf_area_index
+) -> dict:
+    """Calculates :math:`e^{-\\tau}` at the boundaries of leaf layers for the sets of extinction coefficients of terms,
+    :math:`\\tau` being the optical depth (see :func:`_calc_optical_depth`).
+
+    Only one exponential is evaluated per distinct extinction coefficient, that of combined coefficients being
+        obtained as products.
+    """
+    attenuation = {}
+    for *_, extinction_coefficients in terms:
+        for name in extinction_coefficients:
+            if (name,) not in attenuation:
+                attenuation[(name,)] = numpy.exp(
+                    -_calc_optical_depth(coefficients[name], cumulative_leaf_area_index)
+                )
+        if extinction_coefficients not in attenuation:
+            values = attenuation[extinction_coefficients[:1]]
+            for name in extinction_coefficients[1:]:
+                values = values * attenuation[(name,)]
+            attenuation[extinction_coefficients] = values
+    return attenuation
+
+
+def _calc_canopy_budget(
+    irradiance: dict, coefficients: dict, attenuation: dict, cumulative_leaf_area_index
+) -> dict:
+    """Calculates the transmitted and reflected irradiance from the attenuation at the bottom of the canopy."""
+
+    def calc_bottom_attenuation(name):
+        if (name,) in attenuation:
+            return attenuation[(name,)][..., -1]
+        return numpy.exp(
+            -_calc_optical_depth(coefficients[name], cumulative_leaf_area_index)[
+                ..., -1
+            ]
+        )
+
+    if "extinction_coefficient" in coefficients:
+        transmitted_irradiance = irradiance["incident_irradiance"][
+            ..., 0
+        ] * calc_bottom_attenuation("extinction_coefficient")
+        reflected_irradiance = numpy.zeros(
+            numpy.shape(transmitted_irradiance), transmitted_irradiance.dtype
+        )
+    else:
+        incident_direct_irradiance = irradiance["incident_direct_irradiance"][..., 0]
+        incident_diffuse_irradiance = irradiance["incident_diffuse_irradiance"][..., 0]
+        canopy_reflectance_to_direct_irradiance = coefficients[
+            "canopy_reflectance_to_direct_irradiance"
+        ][..., 0]
+        canopy_reflectance_to_diffuse_irradiance = coefficients[
+            "canopy_reflectance_to_diffuse_irradiance"
+        ][..., 0]
+        transmitted_irradiance = incident_direct_irradiance * (
+            1 - canopy_reflectance_to_direct_irradiance
+        ) * calc_bottom_attenuation(
+            "direct_extinction_coefficient"
+        ) + incident_diffuse_irradiance * (
+            1 - canopy_reflectance_to_diffuse_irradiance
+        ) * calc_bottom_attenuation(
+            "diffuse_extinction_coefficient"
+        )
+        reflected_irradiance = (
+            canopy_reflectance_to_direct_irradiance * incident_direct_irradiance
+            + canopy_reflectance_to_diffuse_irradiance * incident_diffuse_irradiance
+        )
+    return {
+        "transmitted_irradiance": transmitted_irradiance,
+        "reflected_irradiance": reflected_irradiance,
+        "soil_absorbed_irradiance": transmitted_irradiance,
+    }
+
+
+def _check_energy_balance(
+    incident_irradiance,
+    absorbed_irradiance,
+    reflected_irradiance,
+    transmitted_irradiance,
+):
+    """Vectorized version of :func:`canopy_budget.check_energy_balance`, the tolerance being widened in single
+    precision."""
+    imbalance = incident_irradiance - (
+        absorbed_irradiance + reflected_irradiance + transmitted_irradiance
+    )
+    tolerance = max(
+        config.ENERGY_BALANCE_TOLERANCE, 100 * numpy.finfo(imbalance.dtype).eps
+    )
+    assert numpy.all(
+        numpy.abs(imbalance)
+        <= tolerance * numpy.maximum(1.0, numpy.abs(incident_irradiance))
+    ), f"Energy balance is not closed: maximum imbalance of {numpy.abs(imbalance).max()}"
+
+
+def _evaluate_terms(
+    terms: tuple,
+    irradiance: dict,
+    coefficients: dict,
+    cumulative_leaf_area_index,
+    check_energy_balance: bool = False,
+    targets: dict = None,
+    canopy_budget: bool = True,
+    out: dict = None,
+) -> dict:
+    """Sums up the terms of each absorbed irradiance component over the leaf layers.
+
+    Terms are summed up into the results named by `targets` after their component (terms of components missing from
+        `targets` being skipped), or into their component if `targets` is None. The transmitted, reflected and
+        soil-absorbed irradiance are added to the results if `canopy_budget` is True, using the attenuation that is
+        evaluated for the absorbed irradiance. Results are summed up in place into the arrays of the same names of
+        `out`, if any.
+    """
+    if targets is not None:
+        terms = [term for term in terms if term[0] in targets]
+    assert (
+        terms or not check_energy_balance
+    ), "The energy balance cannot be checked without the absorbed irradiance"
+    factors, _ = _calc_factors(coefficients)
+    attenuation = _calc_attenuation(terms, coefficients, cumulative_leaf_area_index)
+
+    results = {}
+    for (
+        component,
+        irradiance_name,
+        scale,
+        factors_names,
+        extinction_coefficients,
+    ) in terms:
+        values = attenuation[extinction_coefficients]
+        term = (
+            scale * irradiance[irradiance_name] * (values[..., :-1] - values[..., 1:])
+        )
+        for name in factors_names:
+            term = term * factors[name]
+        if targets is not None:
+            component = targets[component]
+        if component not in results:
+            _store(results, component, term, out)
+        elif out is not None and component in out:
+            numpy.add(results[component], term, out=results[component])
+        else:
+            results[component] = results[component] + term
+
+    if not (canopy_budget or check_energy_balance):
+        return results
+    budget = _calc_canopy_budget(
+        irradiance, coefficients, attenuation, cumulative_leaf_area_index
+    )
+    if check_energy_balance:
+        _check_energy_balance(
+            incident_irradiance=sum(value[..., 0] for value in irradiance.values()),
+            absorbed_irradiance=sum(results.values()).sum(axis=-1),
+            reflected_irradiance=budget["reflected_irradiance"],
+            transmitted_irradiance=budget["transmitted_irradiance"],
+        )
+    if canopy_budget:
+        for name, value in budget.items():
+            _store(results, name, value, out)
+    return results
+
+
+def _evaluate_terms_jacobian(
+    terms: tuple,
+    irradiance: dict,
+    coefficients: dict,
+    coefficients_derivatives: dict,
+    cumulative_leaf_area_index,
+) -> dict:
+    """Calculates the derivatives of each absorbed irradiance component.
+
+    Returns:
+        A dictionary having the components names as keys and, as values, dictionaries of the derivatives w.r.t. each
+            parameter of `coefficients_derivatives` and w.r.t. the cumulative leaf area index at the top
+            ('upper_cumulative_leaf_area_index') and bottom ('lower_cumulative_leaf_area_index') of each layer
+    """
+    factors, factors_derivatives = _calc_factors(coefficients, coefficients_derivatives)
+
+    results = {}
+    for (
+        component,
+        irradiance_name,
+        scale,
+        factors_names,
+        extinction_coefficients,
+    ) in terms:
+        extinction_coefficient = sum(
+            coefficients[name] for name in extinction_coefficients
+        )
+        scaling_factor = derivatives.calc_scaling_factor_derivatives(
+            extinction_coefficient, cumulative_leaf_area_index
+        )
+
+        weight = scale * irradiance[irradiance_name]
+        for name in factors_names:
+            weight = weight * factors[name]
+
+        jacobian = {
+            "upper_cumulative_leaf_area_index": weight
+            * scaling_factor["upper_cumulative_leaf_area_index"],
+            "lower_cumulative_leaf_area_index": weight
+            * scaling_factor["lower_cumulative_leaf_area_index"],
+        }
+        for parameter, d in coefficients_derivatives.items():
+            weight_derivative = 0.0
+            for name in factors_names:
+                product = scale * irradiance[irradiance_name]
+                for other_name in factors_names:
+                    product = product * (
+                        factors_derivatives[parameter][name]
+                        if other_name == name
+                        else factors[other_name]
+                    )
+                weight_derivative = weight_derivative + product
+            extinction_coefficient_derivative = sum(
+                d[name] for name in extinction_coefficients
+            )
+            jacobian[parameter] = (
+                weight_derivative * scaling_factor["value"]
+                + weight
+                * scaling_factor["extinction_coefficient"]
+                * extinction_coefficient_derivative
+            )
+
+        if component in results:
+            for key, value in jacobian.items():
+                results[component][key] = results[component][key] + value
+        else:
+            results[component] = jacobian
+    return results
+
+
+def _calc_engine_coefficients(
+    solar_inclination,
+    leaf_layer_thicknesses,
+    cumulative_leaf_area_index,
+    params,
+    layers_params: dict,
+    dtype,
+) -> dict:
+    """Calculates the coefficients of the canopy, or of each leaf layer if there are `layers_params`, with a trailing
+    axis that broadcasts against the leaf layers axis."""
+    if not layers_params:
+        return _expand(
+            calc_sunlit_shaded_coefficients(
+                solar_inclination=solar_inclination,
+                leaf_area_index=cumulative_leaf_area_index[..., -1],
+                params=params,
+            ),
+            dtype=dtype,
+        )
+    layers_params = _check_layers_params(layers_params, leaf_layer_thicknesses)
+    assert (
+        "extinction_coefficient" not in layers_params
+    ), "The extinction coefficient is a param of the 'beer' model only"
+    return {
+        name: numpy.asarray(value, dtype=dtype)
+        for name, value in calc_layers_coefficients(
+            solar_inclination,
+            cumulative_leaf_area_index[..., -1],
+            params,
+            layers_params,
+        ).items()
+    }
+
+
+def _expand(values: dict, dtype=None) -> dict:
+    """Adds a trailing axis to values so that they broadcast against the leaf layers axis, casting them to `dtype`."""
+    return {
+        key: numpy.asarray(value, dtype=dtype)[..., None]
+        for key, value in values.items()
+    }
+
+
+def _store(results: dict, name: str, value, out: dict = None):
+    """Sets `value` as the result `name`, writing it into the array of the same name of `out` if there is one."""
+    if out is not None and name in out:
+        numpy.copyto(out[name], value, casting="same_kind")
+        value = out[name]
+    results[name] = value
+
+
+def calc_sunlit_shaded_absorbed_irradiance(
+    leaf_layers,
+    incident_direct_irradiance,
+    incident_diffuse_irradiance,
+    solar_inclination,
+    params: SunlitShadedParams,
+    dtype=numpy.float64,
+    check_energy_balance: bool = False,
+    outputs: tuple or str = None,
+    out: dict = None,
+    layers_params: dict = None,
+) -> dict:
+    """Calculates the absorbed irradiance by sunlit and shaded leaves of all leaf layers per unit ground area.
+
+    Args:
+        leaf_layers: leaf layers thicknesses (see :func:`calc_leaf_layer_thicknesses`)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        solar_inclination: [rad] angle of solar inclination
+        params: see class`SunlitShadedParams` (there is no need to call its `update()` method beforehand)
+        dtype: floating point type of the per-layer computations and results (see :data:`COMPUTE_DTYPES`)
+        check_energy_balance: if True, checks that the incident irradiance equals the sum of the absorbed irradiance by
+            all leaf layers and of the reflected and transmitted irradiance
+        outputs: names of the outputs to calculate (see :data:`backends.OUTPUTS_NAMES`), all but 'total' by default
+        out: optional dictionary of preallocated arrays, into which the results of the same names are written in place
+            (e.g. to evaluate one timestep after another without allocating the results)
+        layers_params: optional dictionary of per-layer 'leaf_reflectance' and 'leaf_transmittance' (together), or
+            'leaf_scattering_coefficient', 'clumping_factor' and 'leaf_angle_distribution_factor' arrays, whose last
+            axis is that of the leaf layers, overriding the canopy-wide values of `params`
+
+    Returns:
+        A dictionary of arrays whose last axis is that of the leaf layers, having as keys 'sunlit', 'shaded',
+            'sunlit_fraction', 'shaded_fraction' and the names of the absorbed irradiance components as defined in
+            :class:`SunlitShadedLeafLayer`, together with arrays of the whole canopy (without the leaf layers axis)
+            having as keys 'transmitted_irradiance', 'reflected_irradiance' and 'soil_absorbed_irradiance' (see
+            :meth:`Shoot.calc_energy_budget`), or only the arrays of `outputs` (see
+            :func:`backends.get_batch_results_names`), 'total' being the sum of the absorbed irradiance by sunlit and
+            shaded leaves
+
+    Notes:
+        Irradiance and solar inclination values may be scalars or arrays, which are broadcast against the leading axes
+            of the leaf layers thicknesses.
+        Only the terms of the asked outputs are evaluated: the terms of the absorbed irradiance components are directly
+            summed up into the absorbed irradiance by sunlit and shaded leaves, or into its total, when components are
+            not asked for.
+        With `layers_params`, the extinction through the canopy is that of the cumulative optical depth of the leaf
+            layers above (see :func:`_calc_optical_depth`), and the coefficients of each layer are those of
+            :func:`calc_layers_coefficients`.
+    """
+    return _calc_sunlit_shaded_absorbed_irradiance(
+        leaf_layers,
+        incident_direct_irradiance,
+        incident_diffuse_irradiance,
+        solar_inclination,
+        params,
+        dtype,
+        check_energy_balance,
+        outputs,
+        out,
+        layers_params=layers_params,
+    )
+
+
+def _calc_sunlit_shaded_absorbed_irradiance(
+    leaf_layers,
+    incident_direct_irradiance,
+    incident_diffuse_irradiance,
+    solar_inclination,
+    params,
+    dtype,
+    check_energy_balance: bool,
+    outputs: tuple,
+    out: dict,
+    lumped_terms: tuple = (),
+    layers_params: dict = None,
+) -> dict:
+    """Implements :func:`calc_sunlit_shaded_absorbed_irradiance`, the `lumped_terms` being evaluated together with
+    those of sunlit and shaded leaves (sharing coefficients and attenuation) into the 'lumped' result, in which case
+    the energy balance is left to the caller to check."""
+    leaf_layer_thicknesses = calc_leaf_layer_thicknesses(leaf_layers)
+    cumulative_leaf_area_index = calc_cumulative_leaf_area_index(leaf_layer_thicknesses)
+    coefficients = _calc_engine_coefficients(
+        solar_inclination,
+        leaf_layer_thicknesses,
+        cumulative_leaf_area_index,
+        params,
+        layers_params,
+        _check_dtype(dtype),
+    )
+    irradiance = _expand(
+        {
+            "incident_direct_irradiance": incident_direct_irradiance,
+            "incident_diffuse_irradiance": incident_diffuse_irradiance,
+        },
+        dtype=dtype,
+    )
+    leaf_layer_thicknesses = leaf_layer_thicknesses.astype(dtype, copy=False)
+    cumulative_leaf_area_index = cumulative_leaf_area_index.astype(dtype, copy=False)
+
+    outputs = backends.check_outputs(outputs)
+    if "components" in outputs:
+        targets = {component: component for component in SUNLIT_SHADED_COMPONENTS}
+    elif "sunlit_shaded" in outputs:
+        targets = {
+            component: component.rsplit("_", 1)[-1]
+            for component in SUNLIT_SHADED_COMPONENTS
+        }
+    elif "total" in outputs or check_energy_balance:
+        targets = {component: "total" for component in SUNLIT_SHADED_COMPONENTS}
+    else:
+        targets = {}
+    if lumped_terms:
+        targets["lumped"] = "lumped"
+    results = _evaluate_terms(
+        SUNLIT_SHADED_TERMS + lumped_terms,
+        irradiance,
+        coefficients,
+        cumulative_leaf_area_index,
+        check_energy_balance and not lumped_terms,
+        targets=targets,
+        canopy_budget="canopy_budget" in outputs,
+        out=out,
+    )
+
+    if "sunlit_fraction" in outputs:
+        direct_black_extinction_coefficient = coefficients[
+            "direct_black_extinction_coefficient"
+        ]
+        # sunlit fraction written with expm1 to avoid cancellation errors in thin leaf layers, the escape ratio
+        #   tending to 1 in layers without leaves
+        layer_optical_depth = (
+            direct_black_extinction_coefficient * leaf_layer_thicknesses
+        )
+        escaped_fraction = -numpy.expm1(-layer_optical_depth)
+        _store(
+            results,
+            "sunlit_fraction",
+            numpy.exp(
+                -_calc_optical_depth(
+                    direct_black_extinction_coefficient, cumulative_leaf_area_index
+                )[..., :-1]
+            )
+            * numpy.divide(
+                escaped_fraction,
+                layer_optical_depth,
+                out=numpy.ones_like(escaped_fraction),
+                where=layer_optical_depth > 0,
+            ),
+            out,
+        )
+        _store(results, "shaded_fraction", 1.0 - results["sunlit_fraction"], out)
+    if "components" in outputs and {"sunlit_shaded", "total"}.intersection(outputs):
+        _store(
+            results,
+            "sunlit",
+            results["abs_direct_by_sunlit"]
+            + results["abs_diffuse_by_sunlit"]
+            + results["abs_scattered_by_sunlit"],
+            out,
+        )
+        _store(
+            results,
+            "shaded",
+            results["abs_diffuse_by_shaded"] + results["abs_scattered_by_shaded"],
+            out,
+        )
+    if "total" in outputs and "total" not in results:
+        _store(results, "total", results["sunlit"] + results["shaded"], out)
+    if "sunlit_shaded" not in outputs:
+        results.pop("sunlit", None)
+        results.pop("shaded", None)
+    if "total" not in outputs:
+        results.pop("total", None)
+    return results
+
+
+def calc_lumped_absorbed_irradiance(
+    leaf_layers,
+    params: LumpedParams,
+    incident_irradiance=None,
+    incident_direct_irradiance=None,
+    incident_diffuse_irradiance=None,
+    solar_inclination=None,
+    dtype=numpy.float64,
+    check_energy_balance: bool = False,
+    outputs: tuple or str = None,
+    out: dict = None,
+    layers_params: dict = None,
+) -> dict:
+    """Calculates the absorbed irradiance by lumped leaves of all leaf layers per unit ground area.
+
+    Args:
+        leaf_layers: leaf layers thicknesses (see :func:`calc_leaf_layer_thicknesses`)
+        params: see class`LumpedParams` (there is no need to call its `update()` method beforehand)
+        incident_irradiance: [W m-2ground] incident irradiance at the top of the canopy ('beer' model only)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+            ('de_pury' model only)
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy ('de_pury'
+            model only)
+        solar_inclination: [rad] angle of solar inclination ('de_pury' model only)
+        dtype: floating point type of the per-layer computations and results (see :data:`COMPUTE_DTYPES`)
+        check_energy_balance: if True, checks that the incident irradiance equals the sum of the absorbed irradiance by
+            all leaf layers and of the reflected and transmitted irradiance
+        outputs: names of the outputs to calculate (see :func:`backends.get_batch_results_names`), all but 'total'
+            by default
+        out: optional dictionary of preallocated arrays, into which the results of the same names are written in place
+        layers_params: optional dictionary of per-layer params overriding those of `params`, i.e. 'extinction_coefficient'
+            for the 'beer' model, and those of :func:`calc_sunlit_shaded_absorbed_irradiance` for the 'de_pury' model
+
+    Returns:
+        A dictionary having as key 'lumped' an array whose last axis is that of the leaf layers, together with arrays
+            of the whole canopy (without the leaf layers axis) having as keys 'transmitted_irradiance',
+            'reflected_irradiance' and 'soil_absorbed_irradiance' (see :meth:`Shoot.calc_energy_budget`), or only the
+            arrays of `outputs`
+    """
+    dtype = _check_dtype(dtype)
+    layers_names, canopy_names = backends.get_batch_results_names("lumped", outputs)
+    targets = {"lumped": "lumped"} if layers_names or check_energy_balance else {}
+    leaf_layer_thicknesses = calc_leaf_layer_thicknesses(leaf_layers)
+    cumulative_leaf_area_index = calc_cumulative_leaf_area_index(leaf_layer_thicknesses)
+    if params.model == "beer":
+        if layers_params:
+            layers_params = _check_layers_params(layers_params, leaf_layer_thicknesses)
+            assert set(layers_params) == {
+                "extinction_coefficient"
+            }, "Only the extinction coefficient is a per-layer param of the 'beer' model"
+            extinction_coefficient = layers_params["extinction_coefficient"].astype(
+                dtype, copy=False
+            )
+        else:
+            extinction_coefficient = _expand(
+                {"extinction_coefficient": params.extinction_coefficient}, dtype=dtype
+            )["extinction_coefficient"]
+        results = _evaluate_terms(
+            BEER_TERMS,
+            _expand({"incident_irradiance": incident_irradiance}, dtype=dtype),
+            {"extinction_coefficient": extinction_coefficient},
+            cumulative_leaf_area_index.astype(dtype, copy=False),
+            check_energy_balance,
+            targets=targets,
+            canopy_budget=bool(canopy_names),
+            out=out,
+        )
+        return {name: results[name] for name in layers_names + canopy_names}
+
+    coefficients = _calc_engine_coefficients(
+        solar_inclination,
+        leaf_layer_thicknesses,
+        cumulative_leaf_area_index,
+        params,
+        layers_params,
+        dtype,
+    )
+    results = _evaluate_terms(
+        DE_PURY_TERMS,
+        _expand(
+            {
+                "incident_direct_irradiance": incident_direct_irradiance,
+                "incident_diffuse_irradiance": incident_diffuse_irradiance,
+            },
+            dtype=dtype,
+        ),
+        coefficients,
+        cumulative_leaf_area_index.astype(dtype, copy=False),
+        check_energy_balance,
+        targets=targets,
+        canopy_budget=bool(canopy_names),
+        out=out,
+    )
+    return {name: results[name] for name in layers_names + canopy_names}
+
+
+def calc_joint_absorbed_irradiance(
+    leaf_layers,
+    incident_direct_irradiance,
+    incident_diffuse_irradiance,
+    solar_inclination,
+    lumped_params: LumpedParams,
+    sunlit_shaded_params: SunlitShadedParams,
+    dtype=numpy.float64,
+    check_energy_balance: bool = False,
+) -> dict:
+    """Calculates together the absorbed irradiance by lumped leaves of the 'de_pury' model and by sunlit and shaded
+    leaves of all leaf layers per unit ground area.
+
+    Args:
+        leaf_layers: leaf layers thicknesses (see :func:`calc_leaf_layer_thicknesses`)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        solar_inclination: [rad] angle of solar inclination
+        lumped_params: see class`LumpedParams` of the 'de_pury' model
+        sunlit_shaded_params: see class`SunlitShadedParams`
+        dtype: floating point type of the per-layer computations and results (see :data:`COMPUTE_DTYPES`)
+        check_energy_balance: if True, checks the energy balance of both evaluations
+
+    Returns:
+        A dictionary having as keys 'lumped' and 'sunlit-shaded' and as values the results of
+            :func:`calc_lumped_absorbed_irradiance` and :func:`calc_sunlit_shaded_absorbed_irradiance`
+
+    Notes:
+        When both params share the attributes that canopy coefficients are calculated from (see
+            :data:`params.OPTICS_CONFIGURATION_NAMES`), coefficients, exponentials and the canopy budget are calculated
+            once for both evaluations, at about the cost of the sunlit-shaded one. Otherwise, both evaluations are
+            carried out separately.
+    """
+    assert (
+        lumped_params.model == "de_pury"
+    ), "Lumped params must be of the 'de_pury' model"
+    if not have_same_optics_configuration(lumped_params, sunlit_shaded_params):
+        return {
+            "lumped": calc_lumped_absorbed_irradiance(
+                leaf_layers,
+                lumped_params,
+                incident_direct_irradiance=incident_direct_irradiance,
+                incident_diffuse_irradiance=incident_diffuse_irradiance,
+                solar_inclination=solar_inclination,
+                dtype=dtype,
+                check_energy_balance=check_energy_balance,
+            ),
+            "sunlit-shaded": calc_sunlit_shaded_absorbed_irradiance(
+                leaf_layers,
+                incident_direct_irradiance,
+                incident_diffuse_irradiance,
+                solar_inclination,
+                sunlit_shaded_params,
+                dtype=dtype,
+                check_energy_balance=check_energy_balance,
+            ),
+        }
+
+    sunlit_shaded_results = _calc_sunlit_shaded_absorbed_irradiance(
+        leaf_layers,
+        incident_direct_irradiance,
+        incident_diffuse_irradiance,
+        solar_inclination,
+        sunlit_shaded_params,
+        dtype,
+        check_energy_balance,
+        outputs=None,
+        out=None,
+        lumped_terms=DE_PURY_TERMS,
+    )
+    lumped_results = {"lumped": sunlit_shaded_results.pop("lumped")}
+    lumped_results.update(
+        (name, sunlit_shaded_results[name]) for name in backends.BATCH_RESULTS_NAMES
+    )
+    if check_energy_balance:
+        incident_irradiance = numpy.asarray(incident_direct_irradiance) + numpy.asarray(
+            incident_diffuse_irradiance
+        )
+        for absorbed_irradiance in (
+            lumped_results["lumped"],
+            sunlit_shaded_results["sunlit"] + sunlit_shaded_results["shaded"],
+        ):
+            _check_energy_balance(
+                incident_irradiance=incident_irradiance,
+                absorbed_irradiance=absorbed_irradiance.sum(axis=-1),
+                reflected_irradiance=lumped_results["reflected_irradiance"],
+                transmitted_irradiance=lumped_results["transmitted_irradiance"],
+            )
+    return {"lumped": lumped_results, "sunlit-shaded": sunlit_shaded_results}
+
+
+def calc_transmitted_irradiance(
+    leaf_layers,
+    params: LumpedParams or SunlitShadedParams,
+    incident_irradiance=None,
+    incident_direct_irradiance=None,
+    incident_diffuse_irradiance=None,
+    solar_inclination=None,
+    dtype=numpy.float64,
+):
+    """Calculates the irradiance transmitted through the canopy down to the soil surface per unit ground area.
+
+    Args:
+        leaf_layers: leaf layers thicknesses (see :func:`calc_leaf_layer_thicknesses`)
+        params: see class`LumpedParams` and `SunlitShadedParams`
+        incident_irradiance: [W m-2ground] incident irradiance at the top of the canopy ('beer' model only)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        solar_inclination: [rad] angle of solar inclination
+        dtype: floating point type of the results (see :data:`COMPUTE_DTYPES`)
+
+    Returns:
+        [W m-2ground] the transmitted irradiance at the bottom of the canopy
+    """
+    dtype = _check_dtype(dtype)
+    leaf_area_index = calc_leaf_layer_thicknesses(leaf_layers).sum(axis=-1)
+    if getattr(params, "model", None) == "beer":
+        transmitted_irradiance = incident_irradiance * numpy.exp(
+            -params.extinction_coefficient * leaf_area_index
+        )
+        return numpy.asarray(transmitted_irradiance, dtype=dtype)
+
+    coefficients = calc_sunlit_shaded_coefficients(
+        solar_inclination, leaf_area_index, params
+    )
+    transmitted_irradiance = incident_direct_irradiance * (
+        1 - coefficients["canopy_reflectance_to_direct_irradiance"]
+    ) * numpy.exp(
+        -coefficients["direct_extinction_coefficient"] * leaf_area_index
+    ) + incident_diffuse_irradiance * (
+        1 - coefficients["canopy_reflectance_to_diffuse_irradiance"]
+    ) * numpy.exp(
+        -coefficients["diffuse_extinction_coefficient"] * leaf_area_index
+    )
+    return numpy.asarray(transmitted_irradiance, dtype=dtype)
+
+
+def calc_canopy_absorbed_irradiance(
+    leaf_layers,
+    params: LumpedParams or SunlitShadedParams,
+    incident_irradiance=None,
+    incident_direct_irradiance=None,
+    incident_diffuse_irradiance=None,
+    solar_inclination=None,
+    dtype=numpy.float64,
+):
+    """Calculates the irradiance absorbed by the whole canopy per unit ground area.
+
+    Args:
+        leaf_layers: leaf layers thicknesses (see :func:`calc_leaf_layer_thicknesses`)
+        params: see class`LumpedParams` and `SunlitShadedParams`
+        incident_irradiance: [W m-2ground] incident irradiance at the top of the canopy ('beer' model only)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        solar_inclination: [rad] angle of solar inclination
+        dtype: floating point type of the results (see :data:`COMPUTE_DTYPES`)
+
+    Returns:
+        [W m-2ground] the absorbed irradiance by the whole canopy, which equals the sum over leaf layers of the
+            absorbed irradiance by lumped leaves, or by sunlit and shaded leaves
+    """
+    dtype = _check_dtype(dtype)
+    leaf_area_index = calc_leaf_layer_thicknesses(leaf_layers).sum(axis=-1)
+    if getattr(params, "model", None) == "beer":
+        absorbed_irradiance = incident_irradiance * (
+            1 - numpy.exp(-params.extinction_coefficient * leaf_area_index)
+        )
+        return numpy.asarray(absorbed_irradiance, dtype=dtype)
+
+    coefficients = calc_sunlit_shaded_coefficients(
+        solar_inclination, leaf_area_index, params
+    )
+    absorbed_irradiance = incident_direct_irradiance * (
+        1 - coefficients["canopy_reflectance_to_direct_irradiance"]
+    ) * (
+        1 - numpy.exp(-coefficients["direct_extinction_coefficient"] * leaf_area_index)
+    ) + incident_diffuse_irradiance * (
+        1 - coefficients["canopy_reflectance_to_diffuse_irradiance"]
+    ) * (
+        1 - numpy.exp(-coefficients["diffuse_extinction_coefficient"] * leaf_area_index)
+    )
+    return numpy.asarray(absorbed_irradiance, dtype=dtype)
+
+
+def _calc_coefficients_derivatives(leaf_area_index, params, coefficients: dict) -> dict:
+    """Calculates the derivatives of canopy coefficients w.r.t. leaf scattering, clumping and leaf area index."""
+    direct_black_extinction_coefficient = coefficients[
+        "direct_black_extinction_coefficient"
+    ]
+    arguments = dict(
+        direct_black_extinction_coefficient=direct_black_extinction_coefficient,
+        clumping_factor=params.clumping_factor,
+        leaf_scattering_coefficient=params.leaf_scattering_coefficient,
+    )
+    direct_black = derivatives.calc_direct_black_extinction_coefficient_derivatives(
+        direct_black_extinction_coefficient, params.clumping_factor
+    )
+    direct = derivatives.calc_direct_extinction_coefficient_derivatives(**arguments)
+    reflectance = derivatives.calc_canopy_reflectance_to_direct_irradiance_derivatives(
+        **arguments
+    )
+    diffuse = derivatives.calc_diffuse_extinction_coefficient_derivatives(
+        leaf_area_index=numpy.maximum(config.PRECISION, leaf_area_index)[..., None],
+        sky_sectors_direct_black_extinction_coefficient=calc_sky_sectors_direct_black_extinction_coefficient(
+            params.sky_sectors_number,
+            params.leaf_angle_distribution_factor,
+            params.clumping_factor,
+            params.leaf_angle_distribution,
+        ),
+        sky_sectors_weight=numpy.array(
+            sunlit_shaded_leaves.calc_sky_sectors_weight(
+                params.sky_sectors_number, params.sky_type
+            )
+        ),
+        clumping_factor=params.clumping_factor,
+        leaf_scattering_coefficient=params.leaf_scattering_coefficient,
+    )
+
+    coefficients_derivatives = {}
+    for parameter in ("leaf_scattering_coefficient", "clumping_factor"):
+        coefficients_derivatives[parameter] = _expand(
+            {
+                "leaf_scattering_coefficient": float(
+                    parameter == "leaf_scattering_coefficient"
+                ),
+                "canopy_reflectance_to_diffuse_irradiance": 0.0,
+                "direct_black_extinction_coefficient": direct_black[parameter],
+                "direct_extinction_coefficient": direct[parameter],
+                "canopy_reflectance_to_direct_irradiance": reflectance[parameter],
+                "diffuse_extinction_coefficient": diffuse[parameter],
+            }
+        )
+    coefficients_derivatives["leaf_area_index"] = _expand(
+        {
+            "leaf_scattering_coefficient": 0.0,
+            "canopy_reflectance_to_diffuse_irradiance": 0.0,
+            "direct_black_extinction_coefficient": 0.0,
+            "direct_extinction_coefficient": 0.0,
+            "canopy_reflectance_to_direct_irradiance": 0.0,
+            "diffuse_extinction_coefficient": diffuse["leaf_area_index"],
+        }
+    )
+    return coefficients_derivatives
+
+
+def _calc_leaf_layer_thickness_jacobian(jacobian: dict, layers_number: int):
+    """Assembles the derivatives w.r.t. the thickness of each leaf layer.
+
+    The thickness of a layer affects the cumulative leaf area index at its bottom and at both boundaries of all layers
+        underneath, as well as the leaf area index of the whole canopy.
+
+    Returns:
+        An array whose two last axes are (affected layer, thickening layer)
+    """
+    layers_above = numpy.tril(numpy.ones((layers_number, layers_number)), -1)
+    layers_above_and_self = numpy.tril(numpy.ones((layers_number, layers_number)))
+    thickness_jacobian = (
+        jacobian["upper_cumulative_leaf_area_index"][..., None] * layers_above
+        + jacobian["lower_cumulative_leaf_area_index"][..., None]
+        * layers_above_and_self
+    )
+    if "leaf_area_index" in jacobian:
+        thickness_jacobian = thickness_jacobian + jacobian["leaf_area_index"][..., None]
+    return thickness_jacobian
+
+
+def _format_jacobian(
+    jacobian: dict, layers_number: int, with_leaf_layer_thickness: bool = True
+) -> dict:
+    """Renames the derivatives w.r.t. leaf scattering into those w.r.t. leaf reflectance and transmittance, and
+    calculates those w.r.t. leaf layers thicknesses if `with_leaf_layer_thickness` is True.
+    """
+    formatted_jacobian = {}
+    if with_leaf_layer_thickness:
+        formatted_jacobian["leaf_layer_thickness"] = (
+            _calc_leaf_layer_thickness_jacobian(jacobian, layers_number)
+        )
+    if "leaf_scattering_coefficient" in jacobian:
+        formatted_jacobian["leaf_reflectance"] = jacobian["leaf_scattering_coefficient"]
+        formatted_jacobian["leaf_transmittance"] = jacobian[
+            "leaf_scattering_coefficient"
+        ]
+    for parameter in ("clumping_factor", "extinction_coefficient"):
+        if parameter in jacobian:
+            formatted_jacobian[parameter] = jacobian[parameter]
+    return formatted_jacobian
+
+
+def calc_sunlit_shaded_jacobian(
+    leaf_layers,
+    incident_direct_irradiance,
+    incident_diffuse_irradiance,
+    solar_inclination,
+    params: SunlitShadedParams,
+) -> dict:
+    """Calculates the analytic derivatives of the absorbed irradiance by sunlit and shaded leaves of all leaf layers.
+
+    Args:
+        leaf_layers: leaf layers thicknesses (see :func:`calc_leaf_layer_thicknesses`)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy
+        solar_inclination: [rad] angle of solar inclination
+        params: see class`SunlitShadedParams`
+
+    Returns:
+        A dictionary having the leaf categories ('sunlit', 'shaded') and absorbed irradiance components as keys, and
+            as values dictionaries of the derivatives w.r.t. 'leaf_reflectance', 'leaf_transmittance' and
+            'clumping_factor' (arrays whose last axis is that of the leaf layers) and w.r.t. 'leaf_layer_thickness'
+            (arrays whose two last axes are that of the derived and of the thickening leaf layers)
+    """
+    leaf_layer_thicknesses = calc_leaf_layer_thicknesses(leaf_layers)
+    cumulative_leaf_area_index = calc_cumulative_leaf_area_index(leaf_layer_thicknesses)
+    leaf_area_index = cumulative_leaf_area_index[..., -1]
+    coefficients = calc_sunlit_shaded_coefficients(
+        solar_inclination, leaf_area_index, params
+    )
+    jacobian = _evaluate_terms_jacobian(
+        SUNLIT_SHADED_TERMS,
+        _expand(
+            {
+                "incident_direct_irradiance": incident_direct_irradiance,
+                "incident_diffuse_irradiance": incident_diffuse_irradiance,
+            }
+        ),
+        _expand(coefficients),
+        _calc_coefficients_derivatives(leaf_area_index, params, coefficients),
+        cumulative_leaf_area_index,
+    )
+
+    jacobian["sunlit"] = {
+        key: jacobian["abs_direct_by_sunlit"][key]
+        + jacobian["abs_diffuse_by_sunlit"][key]
+        + jacobian["abs_scattered_by_sunlit"][key]
+        for key in jacobian["abs_direct_by_sunlit"]
+    }
+    jacobian["shaded"] = {
+        key: jacobian["abs_diffuse_by_shaded"][key]
+        + jacobian["abs_scattered_by_shaded"][key]
+        for key in jacobian["abs_diffuse_by_shaded"]
+    }
+
+    layers_number = leaf_layer_thicknesses.shape[-1]
+    return {
+        category: _format_jacobian(values, layers_number)
+        for category, values in jacobian.items()
+    }
+
+
+def calc_lumped_jacobian(
+    leaf_layers,
+    params: LumpedParams,
+    incident_irradiance=None,
+    incident_direct_irradiance=None,
+    incident_diffuse_irradiance=None,
+    solar_inclination=None,
+    with_leaf_layer_thickness: bool = True,
+) -> dict:
+    """Calculates the analytic derivatives of the absorbed irradiance by lumped leaves of all leaf layers.
+
+    Args:
+        leaf_layers: leaf layers thicknesses (see :func:`calc_leaf_layer_thicknesses`)
+        params: see class`LumpedParams`, or class`SunlitShadedParams` whose lumped leaves absorb the irradiance of
+            sunlit and shaded leaves together (as in the 'de_pury' model)
+        incident_irradiance: [W m-2ground] incident irradiance at the top of the canopy ('beer' model only)
+        incident_direct_irradiance: [W m-2ground] incident direct (beam) irradiance at the top of the canopy
+            ('de_pury' model only)
+        incident_diffuse_irradiance: [W m-2ground] incident diffuse irradiance at the top of the canopy ('de_pury'
+            model only)
+        solar_inclination: [rad] angle of solar inclination ('de_pury' model only)
+        with_leaf_layer_thickness: if False, the derivatives w.r.t. leaf layers thicknesses, whose size is the square
+            of the number of leaf layers, are not calculated
+
+    Returns:
+        A dictionary having 'lumped' as key, and as value a dictionary of the derivatives w.r.t.
+            'extinction_coefficient' ('beer' model) or 'leaf_reflectance', 'leaf_transmittance' and 'clumping_factor'
+            ('de_pury' model), and w.r.t. 'leaf_layer_thickness' (see :func:`calc_sunlit_shaded_jacobian`) if
+            `with_leaf_layer_thickness` is True
+    """
+    leaf_layer_thicknesses = calc_leaf_layer_thicknesses(leaf_layers)
+    cumulative_leaf_area_index = calc_cumulative_leaf_area_index(leaf_layer_thicknesses)
+    layers_number = leaf_layer_thicknesses.shape[-1]
+
+    if getattr(params, "model", None) == "beer":
+        jacobian = _evaluate_terms_jacobian(
+            BEER_TERMS,
+            _expand({"incident_irradiance": incident_irradiance}),
+            _expand({"extinction_coefficient": params.extinction_coefficient}),
+            {"extinction_coefficient": {"extinction_coefficient": 1.0}},
+            cumulative_leaf_area_index,
+        )
+    else:
+        leaf_area_index = cumulative_leaf_area_index[..., -1]
+        coefficients = calc_sunlit_shaded_coefficients(
+            solar_inclination, leaf_area_index, params
+        )
+        jacobian = _evaluate_terms_jacobian(
+            DE_PURY_TERMS,
+            _expand(
+                {
+                    "incident_direct_irradiance": incident_direct_irradiance,
+                    "incident_diffuse_irradiance": incident_diffuse_irradiance,
+                }
+            ),
+            _expand(coefficients),
+            _calc_coefficients_derivatives(leaf_area_index, params, coefficients),
+            cumulative_leaf_area_index,
+        )
+
+    return {
+        "lumped": _format_jacobian(
+            jacobian["lumped"], layers_number, with_leaf_layer_thickness
+        )
+    }
@@ -0,0 +1,293 @@
+from math import pi
+
+import pytest
+from numpy import array, testing
+
+from crop_irradiance.uniform_crops import backends, inputs, params, shoot
+from crop_irradiance.uniform_crops.formalisms import kernels
+
+LEAF_LAYERS = {4: 0.09, 5: 1.11, 6: 1.92, 7: 3.22}
+INCIDENT_DIRECT_IRRADIANCE = array([360.0, 200.0, 0.0])
+INCIDENT_DIFFUSE_IRRADIANCE = array([80.0, 120.0, 40.0])
+SOLAR_INCLINATION = array([pi / 3, 0.4, 1.2])
+
+CASES = {
+    "sunlit-shaded": (
+        lambda: params.SunlitShadedParams(
+            leaf_reflectance=0.08,
+            leaf_transmittance=0.07,
+            sky_sectors_number=3,
+            sky_type="soc",
+            canopy_reflectance_to_diffuse_irradiance=0.057,
+            clumping_factor=0.8,
+        ),
+        lambda **forcing: inputs.SunlitShadedInputs(leaf_layers=LEAF_LAYERS, **forcing),
+    ),
+    "de_pury": (
+        lambda: params.LumpedParams(
+            model="de_pury",
+            leaf_reflectance=0.08,
+            leaf_transmittance=0.07,
+            leaf_angle_distribution_factor=0.9,
+            sky_sectors_number=3,
+            sky_type="soc",
+            canopy_reflectance_to_diffuse_irradiance=0.057,
+        ),
+        lambda **forcing: inputs.LumpedInputs(
+            model="de_pury", leaf_layers=LEAF_LAYERS, **forcing
+        ),
+    ),
+    "beer": (
+        lambda: params.LumpedParams(model="beer", extinction_coefficient=0.5),
+        lambda **forcing: inputs.LumpedInputs(
+            model="beer", leaf_layers=LEAF_LAYERS, **forcing
+        ),
+    ),
+}
+
+
+def get_forcing(case):
+    if case == "beer":
+        return {"incident_irradiance": INCIDENT_DIRECT_IRRADIANCE}
+    return {
+        "incident_direct_irradiance": INCIDENT_DIRECT_IRRADIANCE,
+        "incident_diffuse_irradiance": INCIDENT_DIFFUSE_IRRADIANCE,
+        "solar_inclination": SOLAR_INCLINATION,
+    }
+
+
+def get_leaves_category(case):
+    return "sunlit-shaded" if case == "sunlit-shaded" else "lumped"
+
+
+def calc_shoot(case, timestep, backend):
+    get_params, get_inputs = CASES[case]
+    shoot_inputs = get_inputs(
+        **{name: value[timestep] for name, value in get_forcing(case).items()}
+    )
+    shoot_params = get_params()
+    if case != "beer":
+        shoot_params.update(shoot_inputs, backend=backend)
+    canopy = shoot.Shoot(get_leaves_category(case), shoot_inputs, shoot_params)
+    canopy.calc_absorbed_irradiance(check_energy_balance=True, backend=backend)
+    return canopy
+
+
+@pytest.mark.parametrize("backend", backends.get_backend_names())
+@pytest.mark.parametrize("case", tuple(CASES))
+def test_backends_update_params_as_the_reference_backend(backend, case):
+    if case == "beer":
+        return
+    get_params, get_inputs = CASES[case]
+    forcing = {name: value[0] for name, value in get_forcing(case).items()}
+    reference_params, backend_params = get_params(), get_params()
+    reference_params.update(get_inputs(**forcing), backend="python")
+    backend_params.update(get_inputs(**forcing), backend=backend)
+
+    for name in (
+        "direct_black_extinction_coefficient",
+        "direct_extinction_coefficient",
+        "diffuse_extinction_coefficient",
+        "canopy_reflectance_to_direct_irradiance",
+    ):
+        testing.assert_allclose(
+            getattr(backend_params, name), getattr(reference_params, name), rtol=1.0e-9
+        )
+
+
+@pytest.mark.parametrize("backend", backends.get_backend_names())
+@pytest.mark.parametrize("case", tuple(CASES))
+def test_backends_calc_shoots_as_the_reference_backend(backend, case):
+    for timestep in range(len(SOLAR_INCLINATION)):
+        reference = calc_shoot(case, timestep, "python")
+        canopy = calc_shoot(case, timestep, backend)
+
+        for name in ("transmitted_irradiance", "reflected_irradiance"):
+            testing.assert_allclose(
+                getattr(canopy, name), getattr(reference, name), rtol=1.0e-9
+            )
+        for index, reference_layer in reference.items():
+            for name in reference_layer.absorbed_irradiance_attributes[1:]:
+                testing.assert_allclose(
+                    getattr(canopy[index], name),
+                    getattr(reference_layer, name),
+                    rtol=1.0e-9,
+                    atol=1.0e-9,
+                )
+            assert canopy[index].absorbed_irradiance.keys() == (
+                reference_layer.absorbed_irradiance.keys()
+            )
+            for category, value in reference_layer.absorbed_irradiance.items():
+                testing.assert_allclose(
+                    canopy[index].absorbed_irradiance[category],
+                    value,
+                    rtol=1.0e-9,
+                    atol=1.0e-9,
+                )
+
+
+@pytest.mark.parametrize("backend", backends.get_backend_names())
+@pytest.mark.parametrize("case", tuple(CASES))
+def test_backends_calc_batches_as_the_reference_backend(backend, case):
+    get_params, _ = CASES[case]
+    reference = backends.calc_batch_absorbed_irradiance(
+        get_leaves_category(case),
+        LEAF_LAYERS,
+        get_params(),
+        backend="python",
+        **get_forcing(case),
+    )
+    results = backends.calc_batch_absorbed_irradiance(
+        get_leaves_category(case),
+        LEAF_LAYERS,
+        get_params(),
+        backend=backend,
+        **get_forcing(case),
+    )
+
+    for name, values in reference.items():
+        assert results[name].shape == values.shape
+        testing.assert_allclose(results[name], values, rtol=1.0e-9, atol=1.0e-9)
+
+
+@pytest.mark.parametrize("backend", backends.get_backend_names())
+@pytest.mark.parametrize("case", tuple(CASES))
+@pytest.mark.parametrize(
+    "outputs", (("total",), ("sunlit_shaded", "total"), ("canopy_budget",), ())
+)
+def test_backends_calc_only_the_batch_outputs_asked_for(backend, case, outputs):
+    get_params, _ = CASES[case]
+    reference = backends.calc_batch_absorbed_irradiance(
+        get_leaves_category(case),
+        LEAF_LAYERS,
+        get_params(),
+        backend="python",
+        **get_forcing(case),
+    )
+    results = backends.calc_batch_absorbed_irradiance(
+        get_leaves_category(case),
+        LEAF_LAYERS,
+        get_params(),
+        backend=backend,
+        outputs=outputs,
+        **get_forcing(case),
+    )
+
+    layers_names, canopy_names = backends.get_batch_results_names(
+        get_leaves_category(case), outputs
+    )
+    assert set(results) == set(layers_names + canopy_names)
+    if "total" in results:
+        testing.assert_allclose(
+            results["total"],
+            reference["sunlit"] + reference["shaded"],
+            rtol=1.0e-9,
+            atol=1.0e-9,
+        )
+    for name in set(results).intersection(reference):
+        testing.assert_allclose(
+            results[name], reference[name], rtol=1.0e-9, atol=1.0e-9
+        )
+
+
+@pytest.mark.parametrize("backend", backends.get_backend_names())
+def test_shoots_set_only_the_attributes_of_the_outputs_asked_for(backend):
+    get_params, get_inputs = CASES["sunlit-shaded"]
+    sim_inputs = get_inputs(
+        incident_direct_irradiance=300.0,
+        incident_diffuse_irradiance=90.0,
+        solar_inclination=pi / 3,
+    )
+    sim_params = get_params()
+    sim_params.update(sim_inputs)
+    reference = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    reference.calc_absorbed_irradiance()
+
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance(backend=backend, outputs="sunlit_shaded")
+
+    assert canopy.transmitted_irradiance is None
+    for index, layer in reference.items():
+        testing.assert_allclose(
+            list(canopy[index].absorbed_irradiance.values()),
+            list(layer.absorbed_irradiance.values()),
+            rtol=1.0e-9,
+        )
+        if backend != "python":
+            assert canopy[index].abs_direct_by_sunlit is None
+
+
+def test_jit_backend_evaluates_only_the_kernels_of_the_outputs_asked_for(
+    monkeypatch,
+):
+    get_kernel = kernels.get_kernel
+    kernels_names = []
+
+    def record_kernel(name, jit=True):
+        kernels_names.append(name)
+        return get_kernel(name, jit)
+
+    monkeypatch.setattr(kernels, "get_kernel", record_kernel)
+    get_params, _ = CASES["sunlit-shaded"]
+    for outputs, expected_kernels_names in (
+        (("canopy_budget", "sunlit_fraction"), []),
+        (("total",), ["sunlit_shaded_totals"]),
+        (("sunlit_shaded",), ["sunlit_shaded_totals"]),
+        (None, ["sunlit_shaded"]),
+    ):
+        kernels_names.clear()
+        backends.calc_batch_absorbed_irradiance(
+            "sunlit-shaded",
+            LEAF_LAYERS,
+            get_params(),
+            backend="jit",
+            outputs=outputs,
+            **get_forcing("sunlit-shaded"),
+        )
+        assert set(kernels_names) == set(expected_kernels_names)
+
+
+def test_backends_are_selected_per_call_globally_or_by_environment_variable(
+    monkeypatch,
+):
+    monkeypatch.delenv(backends.BACKEND_ENVIRONMENT_VARIABLE, raising=False)
+    assert backends.get_backend_name() == "python"
+    assert backends.get_backend_name(default="numpy") == "numpy"
+
+    monkeypatch.setenv(backends.BACKEND_ENVIRONMENT_VARIABLE, "jit")
+    assert backends.get_backend_name(default="numpy") == "jit"
+    with backends.use_backend("numpy"):
+        assert backends.get_backend_name() == "numpy"
+        assert backends.get_backend_name("python") == "python"
+    assert backends.get_backend_name() == "jit"
+
+    monkeypatch.setenv(backends.BACKEND_ENVIRONMENT_VARIABLE, "fortran")
+    with pytest.raises(AssertionError):
+        backends.get_backend_name()
+
+
+@pytest.mark.parametrize("backend", backends.get_backend_names())
+@pytest.mark.parametrize("case", tuple(CASES))
+def test_backends_calc_subsets_of_leaf_layers_as_whole_shoots(backend, case):
+    get_params, get_inputs = CASES[case]
+    reference = calc_shoot(case, 0, "python")
+    shoot_inputs = get_inputs(
+        **{name: value[0] for name, value in get_forcing(case).items()}
+    )
+    canopy = shoot.Shoot(get_leaves_category(case), shoot_inputs, reference.params)
+    canopy.calc_absorbed_irradiance(backend=backend, layer_indexes=[7, 5])
+
+    testing.assert_allclose(
+        canopy.transmitted_irradiance, reference.transmitted_irradiance
+    )
+    for index in (7, 5):
+        assert canopy[index].absorbed_irradiance.keys() == (
+            reference[index].absorbed_irradiance.keys()
+        )
+        testing.assert_allclose(
+            list(canopy[index].absorbed_irradiance.values()),
+            list(reference[index].absorbed_irradiance.values()),
+            rtol=1.0e-9,
+        )
+    for index in (4, 6):
+        assert not canopy[index].absorbed_irradiance
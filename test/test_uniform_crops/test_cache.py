@@ -0,0 +1,96 @@
+from math import pi
+
+from crop_irradiance.uniform_crops import cache, inputs, params, shoot
+
+
+def get_shoot(incident_direct_irradiance=360.0, solar_inclination=pi / 3, **kwargs):
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers={4: 0.09, 5: 1.11, 6: 1.92, 7: 3.22},
+        incident_direct_irradiance=incident_direct_irradiance,
+        incident_diffuse_irradiance=80.0 if incident_direct_irradiance else 0.0,
+        solar_inclination=solar_inclination,
+    )
+    sim_params = params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+        **kwargs,
+    )
+    sim_params.update(sim_inputs)
+    return shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+
+
+def test_calc_cache_key_is_independent_of_leaf_layers_order_and_number_types():
+    shoot_1 = get_shoot(clumping_factor=1)
+    shoot_2 = get_shoot(clumping_factor=1.0)
+    shoot_2.inputs.leaf_layers = dict(
+        reversed(list(shoot_2.inputs.leaf_layers.items()))
+    )
+
+    assert cache.calc_cache_key(
+        "sunlit-shaded", shoot_1.inputs, shoot_1.params
+    ) == cache.calc_cache_key("sunlit-shaded", shoot_2.inputs, shoot_2.params)
+    assert cache.calc_cache_key(
+        "sunlit-shaded", shoot_1.inputs, shoot_1.params
+    ) != cache.calc_cache_key(
+        "sunlit-shaded", shoot_1.inputs, get_shoot(clumping_factor=0.9).params
+    )
+
+
+def test_shoot_results_retrieved_from_cache_equal_computed_ones():
+    result_cache = cache.ResultCache()
+    computed_shoot = get_shoot()
+    computed_shoot.calc_absorbed_irradiance(cache=result_cache)
+    cached_shoot = get_shoot()
+    cached_shoot.calc_absorbed_irradiance(cache=result_cache)
+
+    assert result_cache.hits == 1 and result_cache.misses == 1
+    for index, layer in computed_shoot.items():
+        for name in layer.absorbed_irradiance_attributes:
+            assert getattr(cached_shoot[index], name) == getattr(layer, name)
+    assert (
+        cached_shoot[4].absorbed_irradiance is not computed_shoot[4].absorbed_irradiance
+    )
+
+
+def test_night_timesteps_share_cached_results_whatever_solar_inclination():
+    result_cache = cache.ResultCache()
+    for solar_inclination in (-0.2, -0.1, 0.0):
+        night_shoot = get_shoot(
+            incident_direct_irradiance=0.0, solar_inclination=solar_inclination
+        )
+        night_shoot.calc_absorbed_irradiance(cache=result_cache)
+        assert all(
+            layer.absorbed_irradiance == {"sunlit": 0.0, "shaded": 0.0}
+            for layer in night_shoot.values()
+        )
+
+    assert result_cache.stats()["hits"] == 2
+    assert len(result_cache) == 1
+
+
+def test_result_cache_evicts_least_recently_used_entries():
+    result_cache = cache.ResultCache(max_entries=2)
+    result_cache.put("a", 1)
+    result_cache.put("b", 2)
+    result_cache.get("a")
+    result_cache.put("c", 3)
+
+    assert "a" in result_cache and "c" in result_cache and "b" not in result_cache
+    assert result_cache.evictions == 1
+    assert result_cache.hit_rate == 1.0
+
+
+def test_result_cache_is_persisted_on_disk(tmp_path):
+    path = str(tmp_path / "cache.pkl")
+    result_cache = cache.ResultCache(path=path)
+    get_shoot().calc_absorbed_irradiance(cache=result_cache)
+    result_cache.save()
+
+    reloaded_cache = cache.ResultCache(path=path)
+    get_shoot().calc_absorbed_irradiance(cache=reloaded_cache)
+
+    assert len(reloaded_cache) == 1
+    assert reloaded_cache.hits == 1
@@ -0,0 +1,165 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from math import pi
+
+import numpy
+import pytest
+from numpy import testing
+
+import crop_irradiance
+from crop_irradiance.uniform_crops import cli, console, inputs, params, shoot
+
+LEAF_LAYERS = {i: 3.0 / 5 for i in range(5)}
+
+SUNLIT_SHADED_PARAMS = dict(
+    leaf_reflectance=0.08,
+    leaf_transmittance=0.07,
+    sky_sectors_number=3,
+    sky_type="soc",
+    canopy_reflectance_to_diffuse_irradiance=0.057,
+)
+
+FORCING = [(20.0 * i, 5.0 * i, pi / 2 * (i + 1) / 24) for i in range(23)]
+
+
+def write_files(directory):
+    forcing_path = directory / "forcing.csv"
+    with open(forcing_path, "w", newline="") as forcing_file:
+        writer = csv.writer(forcing_file)
+        writer.writerow(
+            (
+                "date",
+                "incident_direct_irradiance",
+                "incident_diffuse_irradiance",
+                "solar_inclination",
+            )
+        )
+        writer.writerows(("2020-06-21",) + timestep for timestep in FORCING)
+    layers_path = directory / "layers.json"
+    layers_path.write_text(json.dumps(LEAF_LAYERS))
+    params_path = directory / "params.json"
+    params_path.write_text(json.dumps(SUNLIT_SHADED_PARAMS))
+    return str(forcing_path), str(layers_path), str(params_path)
+
+
+def calc_expected_outputs() -> list:
+    expected_outputs = []
+    for timestep, (direct, diffuse, solar_inclination) in enumerate(FORCING):
+        sim_inputs = inputs.SunlitShadedInputs(
+            leaf_layers=LEAF_LAYERS,
+            incident_direct_irradiance=direct,
+            incident_diffuse_irradiance=diffuse,
+            solar_inclination=solar_inclination,
+        )
+        sim_params = params.SunlitShadedParams(**SUNLIT_SHADED_PARAMS)
+        sim_params.update(sim_inputs)
+        canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+        canopy.calc_absorbed_irradiance()
+        expected_outputs += [
+            (
+                timestep,
+                index,
+                layer.absorbed_irradiance["sunlit"],
+                layer.absorbed_irradiance["shaded"],
+            )
+            for index, layer in canopy.items()
+        ]
+    return expected_outputs
+
+
+def test_main_writes_csv_and_npy_outputs_by_chunks(tmp_path, capsys):
+    forcing_path, layers_path, params_path = write_files(tmp_path)
+    expected_outputs = numpy.array(calc_expected_outputs())
+
+    cli.main(
+        [forcing_path, layers_path, params_path, str(tmp_path / "out.csv")]
+        + ["--chunk-size", "4"]
+    )
+    with open(tmp_path / "out.csv", newline="") as output_file:
+        rows = list(csv.reader(output_file))
+    assert rows[0] == ["timestep", "layer", "sunlit", "shaded"]
+    testing.assert_allclose(
+        numpy.array(rows[1:], dtype=float), expected_outputs, rtol=1.0e-12
+    )
+    assert "23 timesteps" in capsys.readouterr().err
+
+    cli.main(
+        [forcing_path, layers_path, params_path, str(tmp_path / "out.npy")]
+        + ["--chunk-size", "4", "--processes", "2"]
+    )
+    outputs = numpy.load(tmp_path / "out.npy", mmap_mode="r")
+    assert outputs.shape == (len(FORCING) * len(LEAF_LAYERS),)
+    for position, name in enumerate(outputs.dtype.names):
+        testing.assert_allclose(
+            outputs[name], expected_outputs[:, position], rtol=1.0e-12
+        )
+
+
+def test_main_resumes_killed_runs_from_their_checkpoint(tmp_path):
+    forcing_path, layers_path, params_path = write_files(tmp_path)
+    with open(forcing_path, "a", newline="") as forcing_file:
+        csv.writer(forcing_file).writerows(
+            ("2020-06-22",) + timestep for timestep in FORCING * 2000
+        )
+    for output_format in ("csv", "npy"):
+        output_path = str(tmp_path / f"resumed.{output_format}")
+        checkpoint_path = str(tmp_path / f"{output_format}.checkpoint")
+        arguments = [forcing_path, layers_path, params_path, output_path] + [
+            "--chunk-size",
+            "50",
+            "--checkpoint",
+            checkpoint_path,
+            "--checkpoint-interval",
+            "0",
+        ]
+
+        process = subprocess.Popen(
+            [sys.executable, "-m", "crop_irradiance.uniform_crops.cli"] + arguments,
+            env=dict(
+                os.environ,
+                PYTHONPATH=os.pathsep.join(
+                    [os.path.dirname(os.path.dirname(crop_irradiance.__file__))]
+                    + os.environ.get("PYTHONPATH", "").split(os.pathsep)
+                ),
+            ),
+            stderr=subprocess.DEVNULL,
+        )
+        while not os.path.exists(checkpoint_path):
+            assert process.poll() is None, "The run ended before its first checkpoint"
+            time.sleep(0.001)
+        process.kill()
+        process.wait()
+        with open(checkpoint_path) as checkpoint_file:
+            assert 0 < json.load(checkpoint_file)["timesteps_number"] < 2001 * 23
+
+        cli.main(arguments)
+        assert not os.path.exists(checkpoint_path)
+
+        expected_path = str(tmp_path / f"expected.{output_format}")
+        cli.main(
+            [forcing_path, layers_path, params_path, expected_path]
+            + ["--chunk-size", "50"]
+        )
+        with open(output_path, "rb") as output_file, open(
+            expected_path, "rb"
+        ) as expected_file:
+            assert output_file.read() == expected_file.read()
+
+
+def test_console_script_reports_a_missing_numpy_installation(
+    tmp_path, monkeypatch, capsys
+):
+    forcing_path, layers_path, params_path = write_files(tmp_path)
+    arguments = [forcing_path, layers_path, params_path, str(tmp_path / "out.csv")]
+    console.main(arguments)
+    assert "23 timesteps" in capsys.readouterr().err
+
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    monkeypatch.delitem(sys.modules, "crop_irradiance.uniform_crops.cli")
+    monkeypatch.delattr(crop_irradiance.uniform_crops, "cli")
+    with pytest.raises(SystemExit, match=r"crop-irradiance\[vectorized\]"):
+        console.main(arguments)
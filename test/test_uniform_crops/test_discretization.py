@@ -0,0 +1,92 @@
+from math import pi
+
+from numpy import linspace
+
+from crop_irradiance.uniform_crops import discretization, inputs, params, shoot
+
+LEAF_AREA_INDEX = 5.0
+SOLAR_INCLINATIONS = linspace(0.2, pi / 2, 6)
+
+
+def get_params():
+    return params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+    )
+
+
+def calc_leaf_area_irradiance(leaf_layers, solar_inclination):
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers=leaf_layers,
+        incident_direct_irradiance=800.0,
+        incident_diffuse_irradiance=200.0,
+        solar_inclination=solar_inclination,
+    )
+    sim_params = get_params()
+    sim_params.update(sim_inputs)
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance()
+
+    upper_cumulative_leaf_area_index = []
+    sunlit, shaded = [], []
+    for layer in canopy.values():
+        upper_cumulative_leaf_area_index.append(layer.upper_cumulative_leaf_area_index)
+        sunlit.append(
+            layer.absorbed_irradiance["sunlit"]
+            / (layer.sunlit_fraction * layer.thickness)
+        )
+        shaded.append(
+            layer.absorbed_irradiance["shaded"]
+            / (layer.shaded_fraction * layer.thickness)
+        )
+    return upper_cumulative_leaf_area_index, sunlit, shaded
+
+
+def test_calc_adaptive_leaf_layers_returns_leaf_layers_within_tolerance():
+    tolerance = 0.02
+    leaf_layers, error = discretization.calc_adaptive_leaf_layers(
+        leaf_area_index=LEAF_AREA_INDEX,
+        params=get_params(),
+        solar_inclination=SOLAR_INCLINATIONS,
+        tolerance=tolerance,
+        reference_layers_number=500,
+    )
+
+    assert error <= tolerance
+    assert 1 < len(leaf_layers) < 50
+    assert sorted(leaf_layers) == list(range(len(leaf_layers)))
+    assert abs(sum(leaf_layers.values()) - LEAF_AREA_INDEX) < 1.0e-9
+
+    reference_layers = {i: LEAF_AREA_INDEX / 500 for i in range(500)}
+    for solar_inclination in SOLAR_INCLINATIONS:
+        depths, sunlit, shaded = calc_leaf_area_irradiance(
+            leaf_layers, solar_inclination
+        )
+        ref_depths, ref_sunlit, ref_shaded = calc_leaf_area_irradiance(
+            reference_layers, solar_inclination
+        )
+        for ref_depth, ref_sunlit_value, ref_shaded_value in zip(
+            ref_depths, ref_sunlit, ref_shaded
+        ):
+            position = max(
+                i for i, depth in enumerate(depths) if depth <= ref_depth + 1.0e-9
+            )
+            assert abs(sunlit[position] - ref_sunlit_value) <= 1000 * tolerance + 1.0e-9
+            assert abs(shaded[position] - ref_shaded_value) <= 1000 * tolerance + 1.0e-9
+
+
+def test_calc_adaptive_leaf_layers_uses_fewer_layers_for_looser_tolerances():
+    layers_numbers = [
+        len(
+            discretization.calc_adaptive_leaf_layers(
+                LEAF_AREA_INDEX, get_params(), SOLAR_INCLINATIONS, tolerance=tolerance
+            )[0]
+        )
+        for tolerance in (0.005, 0.02, 0.1)
+    ]
+
+    assert layers_numbers == sorted(layers_numbers, reverse=True)
+    assert layers_numbers[0] > layers_numbers[-1]
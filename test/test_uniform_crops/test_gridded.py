@@ -0,0 +1,78 @@
+from math import pi
+
+import numpy
+from numpy import testing
+
+from crop_irradiance.uniform_crops import gridded, params, vectorized
+
+SUNLIT_SHADED_PARAMS = dict(
+    leaf_reflectance=0.08,
+    leaf_transmittance=0.07,
+    sky_sectors_number=3,
+    sky_type="soc",
+    canopy_reflectance_to_diffuse_irradiance=0.057,
+)
+
+
+def test_run_grid_writes_the_same_values_as_the_vectorized_kernel(tmp_path):
+    rng = numpy.random.default_rng(0)
+    leaf_area_index = rng.uniform(0.5, 6.0, (11, 7))
+    leaf_area_index[0, :3] = 0.0
+    incident_direct_irradiance = rng.uniform(0, 800, (4, 11, 7))
+    solar_inclination = numpy.linspace(0.1, pi / 2, 4)[:, None, None]
+    sim_params = params.SunlitShadedParams(**SUNLIT_SHADED_PARAMS)
+
+    expected_values = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        numpy.broadcast_to(leaf_area_index[..., None] / 3, (11, 7, 3)),
+        incident_direct_irradiance,
+        100.0,
+        solar_inclination,
+        sim_params,
+    )
+    for processes in (1, 2):
+        results = gridded.run_grid(
+            leaf_area_index,
+            str(tmp_path / f"grid_{processes}"),
+            "sunlit-shaded",
+            sim_params,
+            layers_number=3,
+            memory_budget=4 * 7 * 3 * 8 * gridded.WORKING_ARRAYS_NUMBER * 2,
+            processes=processes,
+            incident_direct_irradiance=incident_direct_irradiance,
+            incident_diffuse_irradiance=100.0,
+            solar_inclination=solar_inclination,
+        )
+
+        assert results["tiles_number"] == 6
+        assert results["tiles_per_second"] > 0
+        for category in ("sunlit", "shaded"):
+            assert results["outputs"][category].shape == (4, 11, 7, 3)
+            assert numpy.isfinite(results["outputs"][category]).all()
+            testing.assert_allclose(
+                results["outputs"][category], expected_values[category], rtol=1.0e-12
+            )
+
+
+def test_run_grid_evaluates_lumped_leaf_layers_profiles(tmp_path):
+    leaf_layer_thicknesses = numpy.random.default_rng(1).uniform(0, 1, (5, 4, 6))
+    sim_params = params.LumpedParams(model="beer", extinction_coefficient=0.5)
+
+    results = gridded.run_grid(
+        leaf_layer_thicknesses,
+        str(tmp_path),
+        "lumped",
+        sim_params,
+        dtype=numpy.float32,
+        incident_irradiance=numpy.full((5, 1), 400.0),
+    )
+
+    assert results["tiles_number"] == 1
+    assert results["outputs"]["lumped"].dtype == numpy.float32
+    testing.assert_allclose(
+        results["outputs"]["lumped"],
+        vectorized.calc_lumped_absorbed_irradiance(
+            leaf_layer_thicknesses, sim_params, incident_irradiance=400.0
+        )["lumped"],
+        rtol=1.0e-5,
+        atol=1.0e-6 * 400,
+    )
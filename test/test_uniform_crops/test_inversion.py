@@ -0,0 +1,152 @@
+from copy import copy
+
+import pytest
+from numpy import array, linspace, nan, pi, random, sin, stack, testing
+
+from crop_irradiance.uniform_crops import inversion, params, vectorized
+
+SOLAR_INCLINATION = linspace(0.1, pi / 2, 24)
+INCIDENT_DIRECT_IRRADIANCE = 800 * sin(SOLAR_INCLINATION)
+INCIDENT_DIFFUSE_IRRADIANCE = 120 - 40 * sin(SOLAR_INCLINATION)
+
+
+def test_fit_canopy_optics_retrieves_sunlit_shaded_parameters_of_many_plots():
+    plots_number = 20
+    rng = random.default_rng(0)
+    leaf_layers = stack([rng.uniform(0.2, 1.5, plots_number)] * 4, axis=-1)
+    clumping_factor = rng.uniform(0.5, 1.0, plots_number)
+    leaf_angle_distribution_factor = rng.uniform(0.4, 1.3, plots_number)
+
+    sim_params = params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+    )
+    true_params = copy(sim_params)
+    true_params.clumping_factor = clumping_factor[:, None]
+    true_params.leaf_angle_distribution_factor = leaf_angle_distribution_factor[:, None]
+    forcing = dict(
+        incident_direct_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        incident_diffuse_irradiance=INCIDENT_DIFFUSE_IRRADIANCE,
+        solar_inclination=SOLAR_INCLINATION,
+    )
+    observed_irradiance = vectorized.calc_transmitted_irradiance(
+        leaf_layers[:, None, :], true_params, **forcing
+    )
+
+    result = inversion.fit_canopy_optics(
+        observed_irradiance,
+        leaf_layers,
+        sim_params,
+        parameters=("clumping_factor", "leaf_angle_distribution_factor"),
+        **forcing,
+    )
+
+    assert result.converged.all()
+    assert result.runtime > 0
+    testing.assert_allclose(
+        result.parameters["clumping_factor"], clumping_factor, rtol=1.0e-6
+    )
+    testing.assert_allclose(
+        result.parameters["leaf_angle_distribution_factor"],
+        leaf_angle_distribution_factor,
+        rtol=1.0e-6,
+    )
+
+
+def test_fit_canopy_optics_retrieves_beer_extinction_coefficient_with_missing_observations():
+    leaf_layers = {1: 1.0, 2: 1.5}
+    incident_irradiance = INCIDENT_DIRECT_IRRADIANCE + INCIDENT_DIFFUSE_IRRADIANCE
+    extinction_coefficient = linspace(0.3, 0.9, 5)
+
+    true_params = params.LumpedParams(
+        model="beer", extinction_coefficient=extinction_coefficient[:, None]
+    )
+    observed_irradiance = vectorized.calc_canopy_absorbed_irradiance(
+        [1.5, 1.0], true_params, incident_irradiance=incident_irradiance
+    )
+    observed_irradiance[:, ::3] = nan
+
+    sim_params = params.LumpedParams(model="beer", extinction_coefficient=0.5)
+    result = inversion.fit_canopy_optics(
+        observed_irradiance,
+        leaf_layers,
+        sim_params,
+        observation="absorbed",
+        incident_irradiance=incident_irradiance,
+    )
+
+    assert result.converged.all()
+    assert all(result.observations_number == 16)
+    testing.assert_allclose(
+        result.parameters["extinction_coefficient"], extinction_coefficient, rtol=1.0e-6
+    )
+    testing.assert_allclose(result.root_mean_square_error, 0, atol=1.0e-6)
+    with pytest.raises(AssertionError, match="extinction_coefficient"):
+        inversion.fit_canopy_optics(
+            observed_irradiance,
+            leaf_layers,
+            sim_params,
+            parameters=("clumping_factor",),
+            observation="absorbed",
+            incident_irradiance=incident_irradiance,
+        )
+
+
+def test_analytic_derivatives_match_finite_differences_of_the_forward_model():
+    leaf_layers = array([[0.4, 0.8, 1.2], [1.0, 0.5, 0.2]])[:, None, :]
+    sunlit_shaded_forcing = dict(
+        incident_direct_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        incident_diffuse_irradiance=INCIDENT_DIFFUSE_IRRADIANCE,
+        solar_inclination=SOLAR_INCLINATION,
+    )
+    cases = (
+        (
+            params.SunlitShadedParams(
+                leaf_reflectance=0.08,
+                leaf_transmittance=0.07,
+                sky_sectors_number=3,
+                sky_type="soc",
+                canopy_reflectance_to_diffuse_irradiance=0.057,
+            ),
+            "clumping_factor",
+            array([[0.6], [0.9]]),
+            sunlit_shaded_forcing,
+        ),
+        (
+            params.LumpedParams(
+                model="de_pury",
+                leaf_reflectance=0.08,
+                leaf_transmittance=0.07,
+                sky_sectors_number=3,
+                sky_type="soc",
+                canopy_reflectance_to_diffuse_irradiance=0.057,
+            ),
+            "clumping_factor",
+            array([[0.6], [0.9]]),
+            sunlit_shaded_forcing,
+        ),
+        (
+            params.LumpedParams(model="beer", extinction_coefficient=0.5),
+            "extinction_coefficient",
+            array([[0.3], [0.7]]),
+            dict(incident_irradiance=INCIDENT_DIRECT_IRRADIANCE),
+        ),
+    )
+    step = 1.0e-6
+    for sim_params, name, value, forcing in cases:
+        for observation in ("transmitted", "absorbed"):
+            actual = inversion._evaluate_derivatives(
+                observation, leaf_layers, sim_params, {name: value}, forcing, (name,)
+            )
+            expected = (
+                inversion._evaluate(
+                    observation, leaf_layers, sim_params, {name: value + step}, forcing
+                )
+                - inversion._evaluate(
+                    observation, leaf_layers, sim_params, {name: value - step}, forcing
+                )
+            ) / (2 * step)
+            testing.assert_allclose(actual[name], expected, rtol=1.0e-6, atol=1.0e-6)
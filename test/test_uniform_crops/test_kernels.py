@@ -0,0 +1,168 @@
+from numpy import random, testing
+
+from crop_irradiance.uniform_crops.formalisms import (
+    kernels,
+    lumped_leaves,
+    sunlit_shaded_leaves,
+)
+
+RNG = random.default_rng(0)
+CASES = [
+    dict(
+        incident_direct_irradiance=RNG.uniform(0, 500),
+        incident_diffuse_irradiance=RNG.uniform(0, 200),
+        upper_cumulative_leaf_area_index=RNG.uniform(0, 4),
+        leaf_layer_thickness=RNG.uniform(0.05, 2),
+        leaf_scattering_coefficient=RNG.uniform(0.1, 0.3),
+        canopy_reflectance_to_direct_irradiance=RNG.uniform(0.02, 0.1),
+        canopy_reflectance_to_diffuse_irradiance=RNG.uniform(0.02, 0.1),
+        direct_extinction_coefficient=RNG.uniform(0.3, 2),
+        direct_black_extinction_coefficient=RNG.uniform(0.3, 2),
+        diffuse_extinction_coefficient=RNG.uniform(0.3, 1),
+    )
+    for _ in range(50)
+]
+
+
+def test_lumped_kernels_match_lumped_leaves_formalisms():
+    for jit in (False, True):
+        beer_kernel = kernels.get_kernel("beer", jit)
+        de_pury_kernel = kernels.get_kernel("de_pury", jit)
+        for case in CASES:
+            layer = (
+                case["upper_cumulative_leaf_area_index"],
+                case["leaf_layer_thickness"],
+            )
+            testing.assert_allclose(
+                beer_kernel(
+                    case["incident_direct_irradiance"],
+                    case["direct_extinction_coefficient"],
+                    *layer,
+                ),
+                lumped_leaves.calc_beer_absorption(
+                    case["incident_direct_irradiance"],
+                    case["direct_extinction_coefficient"],
+                    *layer,
+                ),
+                rtol=1.0e-12,
+            )
+            testing.assert_allclose(
+                de_pury_kernel(
+                    case["incident_direct_irradiance"],
+                    case["incident_diffuse_irradiance"],
+                    *layer,
+                    case["direct_extinction_coefficient"],
+                    case["diffuse_extinction_coefficient"],
+                    case["canopy_reflectance_to_direct_irradiance"],
+                    case["canopy_reflectance_to_diffuse_irradiance"],
+                ),
+                lumped_leaves.calc_de_pury_absorption(
+                    case["incident_direct_irradiance"],
+                    case["incident_diffuse_irradiance"],
+                    *layer,
+                    case["direct_extinction_coefficient"],
+                    case["diffuse_extinction_coefficient"],
+                    case["canopy_reflectance_to_direct_irradiance"],
+                    case["canopy_reflectance_to_diffuse_irradiance"],
+                ),
+                rtol=1.0e-12,
+            )
+
+
+def test_sunlit_shaded_kernel_matches_sunlit_shaded_leaves_formalisms():
+    def pick(case, *names):
+        return {name: case[name] for name in names}
+
+    layer_names = ("upper_cumulative_leaf_area_index", "leaf_layer_thickness")
+    for jit in (False, True):
+        kernel = kernels.get_kernel("sunlit_shaded", jit)
+        for case in CASES:
+            expected = (
+                sunlit_shaded_leaves.calc_sunlit_fraction_per_leaf_layer(
+                    **pick(case, *layer_names, "direct_black_extinction_coefficient")
+                ),
+                sunlit_shaded_leaves.calc_absorbed_direct_irradiance_by_sunlit_leaf_layer(
+                    **pick(
+                        case,
+                        "incident_direct_irradiance",
+                        *layer_names,
+                        "leaf_scattering_coefficient",
+                        "direct_black_extinction_coefficient",
+                    )
+                ),
+                sunlit_shaded_leaves.calc_absorbed_diffuse_irradiance_by_sunlit_leaf_layer(
+                    **pick(
+                        case,
+                        "incident_diffuse_irradiance",
+                        *layer_names,
+                        "canopy_reflectance_to_diffuse_irradiance",
+                        "direct_black_extinction_coefficient",
+                        "diffuse_extinction_coefficient",
+                    )
+                ),
+                sunlit_shaded_leaves.calc_absorbed_scattered_irradiance_by_sunlit_leaf_layer(
+                    **pick(
+                        case,
+                        "incident_direct_irradiance",
+                        *layer_names,
+                        "direct_extinction_coefficient",
+                        "direct_black_extinction_coefficient",
+                        "canopy_reflectance_to_direct_irradiance",
+                        "leaf_scattering_coefficient",
+                    )
+                ),
+                sunlit_shaded_leaves.calc_absorbed_diffuse_irradiance_by_shaded_leaf_layer(
+                    **pick(
+                        case,
+                        "incident_diffuse_irradiance",
+                        *layer_names,
+                        "canopy_reflectance_to_diffuse_irradiance",
+                        "direct_black_extinction_coefficient",
+                        "diffuse_extinction_coefficient",
+                    )
+                ),
+                sunlit_shaded_leaves.calc_absorbed_scattered_irradiance_by_shaded_leaf_layer(
+                    **pick(
+                        case,
+                        "incident_direct_irradiance",
+                        *layer_names,
+                        "direct_extinction_coefficient",
+                        "direct_black_extinction_coefficient",
+                        "canopy_reflectance_to_direct_irradiance",
+                        "leaf_scattering_coefficient",
+                    )
+                ),
+            )
+            testing.assert_allclose(kernel(**case), expected, rtol=1.0e-9, atol=1.0e-9)
+
+
+def test_get_kernel_falls_back_to_pure_python_kernels():
+    assert kernels.get_kernel("sunlit_shaded", jit=False) is (
+        kernels.calc_sunlit_shaded_kernel
+    )
+    if not kernels.is_jit_available():
+        assert kernels.get_kernel("beer") is kernels.calc_beer_kernel
+
+
+def test_sunlit_shaded_totals_kernel_matches_sums_of_sunlit_shaded_components():
+    for jit in (False, True):
+        kernel = kernels.get_kernel("sunlit_shaded", jit)
+        totals_kernel = kernels.get_kernel("sunlit_shaded_totals", jit)
+        for case in CASES:
+            (
+                _,
+                direct_by_sunlit,
+                diffuse_by_sunlit,
+                scattered_by_sunlit,
+                diffuse_by_shaded,
+                scattered_by_shaded,
+            ) = kernel(**case)
+            testing.assert_allclose(
+                totals_kernel(**case),
+                (
+                    direct_by_sunlit + diffuse_by_sunlit + scattered_by_sunlit,
+                    diffuse_by_shaded + scattered_by_shaded,
+                ),
+                rtol=1.0e-9,
+                atol=1.0e-9,
+            )
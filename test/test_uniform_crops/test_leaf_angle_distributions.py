@@ -0,0 +1,72 @@
+from numpy import linspace, pi, testing
+
+from crop_irradiance.uniform_crops.formalisms import (
+    leaf_angle_distributions,
+    sunlit_shaded_leaves,
+)
+
+SOLAR_INCLINATIONS = linspace(0.05, pi / 2, 20)
+
+
+def test_calc_projection_function_is_one_half_for_spherical_distributions():
+    testing.assert_allclose(
+        [
+            leaf_angle_distributions.calc_projection_function(x, "spherical")
+            for x in SOLAR_INCLINATIONS
+        ],
+        0.5,
+        rtol=1.0e-5,
+    )
+
+
+def test_ellipsoidal_distributions_match_the_approximation_of_campbell():
+    for leaf_angle_distribution_factor in (0.3, 0.9773843811168246, 1.3):
+        testing.assert_allclose(
+            [
+                sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
+                    x, leaf_angle_distribution_factor, 1, "ellipsoidal"
+                )
+                for x in SOLAR_INCLINATIONS
+            ],
+            [
+                sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
+                    x, leaf_angle_distribution_factor, 1
+                )
+                for x in SOLAR_INCLINATIONS
+            ],
+            rtol=5.0e-3,
+        )
+
+
+def test_erectophile_canopies_intercept_more_irradiance_at_low_solar_inclinations():
+    def calc_extinction_coefficients(leaf_angle_distribution):
+        return [
+            sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
+                x, None, 1, leaf_angle_distribution
+            )
+            for x in (0.2, pi / 2)
+        ]
+
+    erectophile_low, erectophile_high = calc_extinction_coefficients("erectophile")
+    planophile_low, planophile_high = calc_extinction_coefficients("planophile")
+
+    assert erectophile_low > planophile_low
+    assert erectophile_high < planophile_high
+
+
+def test_calc_projection_table_is_calculated_once_per_distribution():
+    leaf_angle_distributions.calc_projection_table.cache_clear()
+    for _ in range(3):
+        sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
+            leaf_area_index=3.0,
+            leaf_angle_distribution_factor=0.5,
+            clumping_factor=1,
+            leaf_scattering_coefficient=0.15,
+            sky_sectors_number=9,
+            leaf_angle_distribution="plagiophile",
+        )
+        sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
+            0.7, 0.9, 1, "plagiophile"
+        )
+
+    assert leaf_angle_distributions.calc_projection_table.cache_info().currsize == 1
@@ -0,0 +1,175 @@
+from numpy import array, linspace, testing
+
+from crop_irradiance.uniform_crops import cache, inputs, multisite, params, shoot
+
+SOLAR_INCLINATIONS = linspace(0.6, 0.7, 40)
+LEAF_AREA_INDEXES = (1.5, 3.0)
+
+
+def get_sites():
+    sim_params = params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+    )
+    return [
+        (
+            inputs.SunlitShadedInputs(
+                leaf_layers={2: leaf_area_index / 2, 1: leaf_area_index / 2},
+                incident_direct_irradiance=400.0,
+                incident_diffuse_irradiance=100.0,
+                solar_inclination=float(solar_inclination),
+            ),
+            sim_params,
+        )
+        for solar_inclination in SOLAR_INCLINATIONS
+        for leaf_area_index in LEAF_AREA_INDEXES
+    ]
+
+
+def calc_reference_shoot(sim_inputs, sim_params):
+    sim_params = params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+    )
+    sim_params.update(sim_inputs)
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance()
+    return canopy
+
+
+def test_evaluate_sites_matches_shoots_evaluated_one_by_one_without_tolerance():
+    sites = get_sites()
+    results = multisite.evaluate_sites("sunlit-shaded", sites)
+
+    assert results["groups_number"] == len(SOLAR_INCLINATIONS)
+    assert results["optics_number"] == len(sites)
+    assert results["max_solar_inclination_error"] == 0
+    for site, canopy in zip(sites, results["shoots"]):
+        reference = calc_reference_shoot(*site)
+        for index, layer in reference.items():
+            assert canopy[index].absorbed_irradiance == layer.absorbed_irradiance
+
+
+def test_evaluate_sites_groups_sites_of_similar_solar_inclinations():
+    sites = get_sites()
+    solar_inclination_tolerance = 0.02
+    results = multisite.evaluate_sites(
+        "sunlit-shaded", sites, solar_inclination_tolerance=solar_inclination_tolerance
+    )
+
+    assert results["groups_number"] <= 6
+    assert results["optics_number"] == 2 * results["groups_number"]
+    assert 0 < results["max_solar_inclination_error"] <= solar_inclination_tolerance
+    assert 0 < results["max_direct_black_extinction_coefficient_error"] < 0.02
+    for site, canopy in zip(sites, results["shoots"]):
+        reference = calc_reference_shoot(*site)
+        for index, layer in reference.items():
+            testing.assert_allclose(
+                list(canopy[index].absorbed_irradiance.values()),
+                list(layer.absorbed_irradiance.values()),
+                rtol=0.02,
+            )
+
+
+def test_evaluate_sites_near_the_horizon_keeps_group_inclinations_positive():
+    sim_params = get_sites()[0][1]
+    sites = [
+        (
+            inputs.SunlitShadedInputs(
+                leaf_layers={2: 1.5, 1: 1.5},
+                incident_direct_irradiance=400.0,
+                incident_diffuse_irradiance=100.0,
+                solar_inclination=solar_inclination,
+            ),
+            sim_params,
+        )
+        for solar_inclination in (0.01, 0.02)
+    ]
+    results = multisite.evaluate_sites(
+        "sunlit-shaded", sites, solar_inclination_tolerance=0.05
+    )
+
+    assert results["groups_number"] == 1
+    assert results["shoots"][0].optics.solar_inclination == 0.015
+    testing.assert_allclose(results["max_solar_inclination_error"], 0.005)
+    assert results["max_direct_black_extinction_coefficient_error"] < 0.5
+    for site, canopy in zip(sites, results["shoots"]):
+        reference = calc_reference_shoot(*site)
+        for index, layer in reference.items():
+            testing.assert_allclose(
+                list(canopy[index].absorbed_irradiance.values()),
+                list(layer.absorbed_irradiance.values()),
+                rtol=0.01,
+                atol=1.0e-6,
+            )
+
+
+def test_evaluate_sites_does_not_read_approximated_results_from_the_cache():
+    sim_params = get_sites()[0][1]
+    sites = [
+        (
+            inputs.SunlitShadedInputs(
+                leaf_layers={2: 1.5, 1: 1.5},
+                incident_direct_irradiance=400.0,
+                incident_diffuse_irradiance=100.0,
+                solar_inclination=solar_inclination,
+            ),
+            sim_params,
+        )
+        for solar_inclination in (0.52, 0.68)
+    ]
+    result_cache = cache.ResultCache()
+    approximated_results = multisite.evaluate_sites(
+        "sunlit-shaded", sites, solar_inclination_tolerance=0.2, cache=result_cache
+    )
+    results = multisite.evaluate_sites(
+        "sunlit-shaded", sites, solar_inclination_tolerance=0.0, cache=result_cache
+    )
+
+    assert approximated_results["groups_number"] == 1
+    assert result_cache.hits == 0
+    for site, canopy in zip(sites, results["shoots"]):
+        reference = calc_reference_shoot(*site)
+        for index, layer in reference.items():
+            assert canopy[index].absorbed_irradiance == layer.absorbed_irradiance
+
+
+def test_evaluate_sites_calculates_optics_of_array_valued_params_with_the_backend():
+    sites = get_sites()[:8]
+    array_params = params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+        clumping_factor=array(1.0),
+    )
+    results = multisite.evaluate_sites(
+        "sunlit-shaded",
+        [(sim_inputs, array_params) for sim_inputs, _ in sites],
+        solar_inclination_tolerance=0.02,
+        backend="numpy",
+    )
+    expected = multisite.evaluate_sites(
+        "sunlit-shaded", sites, solar_inclination_tolerance=0.02
+    )
+
+    assert results["groups_number"] == expected["groups_number"]
+    testing.assert_allclose(
+        results["max_direct_black_extinction_coefficient_error"],
+        expected["max_direct_black_extinction_coefficient_error"],
+        rtol=1.0e-10,
+    )
+    for canopy, expected_canopy in zip(results["shoots"], expected["shoots"]):
+        for index, layer in expected_canopy.items():
+            testing.assert_allclose(
+                list(canopy[index].absorbed_irradiance.values()),
+                list(layer.absorbed_irradiance.values()),
+                rtol=1.0e-10,
+            )
@@ -0,0 +1,187 @@
+import pickle
+from concurrent.futures import ThreadPoolExecutor
+from copy import deepcopy
+from math import pi
+
+import pytest
+from numpy import array, testing
+
+from crop_irradiance.uniform_crops import inputs, params, shoot
+
+LEAF_LAYERS = {3: 0.5, 2: 1.0, 1: 1.5}
+
+
+def get_sunlit_shaded_params():
+    return params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+    )
+
+
+def get_inputs(incident_direct_irradiance):
+    return inputs.SunlitShadedInputs(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=incident_direct_irradiance,
+        incident_diffuse_irradiance=80.0,
+        solar_inclination=pi / 3,
+    )
+
+
+def test_shoots_sharing_optics_match_shoots_with_updated_params():
+    shared_params = get_sunlit_shaded_params()
+    optics = params.calc_canopy_optics(shared_params, pi / 3, 3.0)
+    untouched_params = deepcopy(vars(shared_params))
+
+    for incident_direct_irradiance in (0.0, 200.0, 400.0):
+        canopy = shoot.Shoot(
+            "sunlit-shaded",
+            get_inputs(incident_direct_irradiance),
+            shared_params,
+            optics,
+        )
+        canopy.calc_absorbed_irradiance(check_energy_balance=True)
+
+        reference_params = get_sunlit_shaded_params()
+        reference_inputs = get_inputs(incident_direct_irradiance)
+        reference_params.update(reference_inputs)
+        reference = shoot.Shoot("sunlit-shaded", reference_inputs, reference_params)
+        reference.calc_absorbed_irradiance()
+
+        testing.assert_allclose(
+            canopy.transmitted_irradiance, reference.transmitted_irradiance
+        )
+        for index, layer in reference.items():
+            assert canopy[index].sunlit_fraction == layer.sunlit_fraction
+            assert canopy[index].absorbed_irradiance == layer.absorbed_irradiance
+
+    assert vars(shared_params) == untouched_params
+
+
+def test_canopy_optics_are_immutable_hashable_and_calculated_once():
+    optics = params.calc_canopy_optics(get_sunlit_shaded_params(), pi / 3, 3.0)
+
+    assert params.calc_canopy_optics(get_sunlit_shaded_params(), pi / 3, 3) is optics
+    assert {optics: 1}[pickle.loads(pickle.dumps(optics))] == 1
+    with pytest.raises(AttributeError):
+        optics.direct_black_extinction_coefficient = 0.5
+    with pytest.raises(AssertionError):
+        shoot.Shoot(
+            "sunlit-shaded",
+            get_inputs(200.0),
+            get_sunlit_shaded_params(),
+            params.calc_canopy_optics(get_sunlit_shaded_params(), pi / 4, 3.0),
+        )
+
+
+def test_canopy_optics_of_params_having_single_valued_arrays_are_cached_as_scalars():
+    optics = params.calc_canopy_optics(get_sunlit_shaded_params(), pi / 3, 3.0)
+    array_params = get_sunlit_shaded_params()
+    array_params.clumping_factor = array(1.0)
+    array_params.leaf_scattering_coefficient = array(
+        [array_params.leaf_scattering_coefficient]
+    )
+
+    assert params.calc_canopy_optics(array_params, pi / 3, 3.0) is optics
+    array_params.clumping_factor = array([1.0, 0.8])
+    with pytest.raises(AssertionError):
+        params.calc_canopy_optics(array_params, pi / 3, 3.0)
+
+
+def test_shoots_sharing_optics_are_evaluated_concurrently_and_serialized():
+    shared_params = get_sunlit_shaded_params()
+    optics = params.calc_canopy_optics(shared_params, pi / 3, 3.0)
+
+    def evaluate(incident_direct_irradiance):
+        canopy = shoot.Shoot(
+            "sunlit-shaded",
+            get_inputs(incident_direct_irradiance),
+            shared_params,
+            optics,
+        )
+        canopy.calc_absorbed_irradiance()
+        return canopy
+
+    with ThreadPoolExecutor(4) as executor:
+        canopies = list(executor.map(evaluate, range(0, 400, 10)))
+
+    for incident_direct_irradiance, canopy in zip(range(0, 400, 10), canopies):
+        expected = evaluate(incident_direct_irradiance)
+        assert [layer.absorbed_irradiance for layer in canopy.values()] == [
+            layer.absorbed_irradiance for layer in expected.values()
+        ]
+        restored = pickle.loads(pickle.dumps(canopy))
+        assert restored.optics == optics
+        assert [layer.absorbed_irradiance for layer in restored.values()] == [
+            layer.absorbed_irradiance for layer in canopy.values()
+        ]
+
+
+def test_sunlit_shaded_layers_calculate_components_only_when_read(monkeypatch):
+    sim_params = get_sunlit_shaded_params()
+    sim_inputs = get_inputs(200.0)
+    sim_params.update(sim_inputs)
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance()
+
+    calls = []
+    calc_components = shoot.SunlitShadedLeafLayer._calc_lazy_values
+
+    def count_calls(group, key):
+        calls.append(group)
+        return calc_components(group, key)
+
+    monkeypatch.setattr(
+        shoot.SunlitShadedLeafLayer, "_calc_lazy_values", staticmethod(count_calls)
+    )
+    totals = [layer.absorbed_irradiance for layer in canopy.values()]
+    assert [layer.absorbed_irradiance for layer in canopy.values()] == totals
+    assert calls == ["totals"] * len(LEAF_LAYERS)
+
+    layer = canopy[3]
+    testing.assert_allclose(
+        layer.abs_direct_by_sunlit
+        + layer.abs_diffuse_by_sunlit
+        + layer.abs_scattered_by_sunlit,
+        layer.absorbed_irradiance["sunlit"],
+    )
+    assert calls.count("components") == 1
+
+    layer.calc_absorbed_irradiance(get_inputs(400.0), sim_params)
+    assert layer.absorbed_irradiance["sunlit"] > totals[0]["sunlit"]
+
+
+def test_sunlit_shaded_layers_keep_their_values_when_shared_params_are_updated():
+    sim_params = get_sunlit_shaded_params()
+    canopies = []
+    for solar_inclination in (pi / 3, pi / 6):
+        sim_inputs = get_inputs(200.0)
+        sim_inputs.solar_inclination = solar_inclination
+        sim_params.update(sim_inputs)
+        canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+        canopy.calc_absorbed_irradiance()
+        canopies.append(canopy)
+        if len(canopies) == 1:
+            # values of the first timestep are read before the next update, except its components
+            expected = [
+                (layer.sunlit_fraction, layer.absorbed_irradiance)
+                for layer in canopy.values()
+            ]
+
+    reference_params = get_sunlit_shaded_params()
+    reference_inputs = get_inputs(200.0)
+    reference_params.update(reference_inputs)
+    reference = shoot.Shoot("sunlit-shaded", reference_inputs, reference_params)
+    reference.calc_absorbed_irradiance()
+
+    first_canopy = canopies[0]
+    first_canopy.inputs.incident_direct_irradiance = 0.0
+    assert [
+        (layer.sunlit_fraction, layer.absorbed_irradiance)
+        for layer in first_canopy.values()
+    ] == expected
+    for index, layer in reference.items():
+        assert first_canopy[index].abs_direct_by_sunlit == layer.abs_direct_by_sunlit
+        assert first_canopy[index].sunlit_fraction != canopies[1][index].sunlit_fraction
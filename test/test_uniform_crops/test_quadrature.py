@@ -0,0 +1,82 @@
+from math import pi
+
+from numpy import polynomial, testing
+
+from crop_irradiance.uniform_crops import inputs, params, shoot
+from crop_irradiance.uniform_crops.formalisms import quadrature
+
+
+def test_calc_gauss_legendre_points_returns_expected_values():
+    for points_number in range(1, 8):
+        expected_abscissas, expected_weights = polynomial.legendre.leggauss(
+            points_number
+        )
+        actual_abscissas, actual_weights = quadrature.calc_gauss_legendre_points(
+            points_number
+        )
+
+        testing.assert_almost_equal(actual_abscissas, expected_abscissas, decimal=12)
+        testing.assert_almost_equal(actual_weights, expected_weights, decimal=12)
+
+
+def test_calc_canopy_gauss_points_weights_sum_up_to_leaf_area_index():
+    depths, weights = quadrature.calc_canopy_gauss_points(
+        leaf_area_index=4.2, points_number=5
+    )
+
+    testing.assert_almost_equal(sum(weights), 4.2, decimal=12)
+    assert all([0 < depth < 4.2 for depth in depths])
+
+
+def test_gauss_points_integrate_absorbed_irradiance_as_fine_leaf_layers():
+    leaf_area_index = 5.0
+    layers_number = 50
+
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers={i: leaf_area_index / layers_number for i in range(layers_number)},
+        incident_direct_irradiance=360,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 4,
+    )
+    sim_params = params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+    )
+    sim_params.update(sim_inputs)
+
+    canopy = shoot.Shoot(
+        leaves_category="sunlit-shaded", inputs=sim_inputs, params=sim_params
+    )
+    canopy.calc_absorbed_irradiance()
+    gauss_points = canopy.calc_absorbed_irradiance_at_gauss_points(points_number=5)
+
+    sunlit_absorption = sum(
+        weight * sunlit_fraction * sunlit
+        for weight, sunlit_fraction, sunlit in zip(
+            gauss_points["weight"],
+            gauss_points["sunlit_fraction"],
+            gauss_points["sunlit"],
+        )
+    )
+    shaded_absorption = sum(
+        weight * (1 - sunlit_fraction) * shaded
+        for weight, sunlit_fraction, shaded in zip(
+            gauss_points["weight"],
+            gauss_points["sunlit_fraction"],
+            gauss_points["shaded"],
+        )
+    )
+
+    testing.assert_allclose(
+        sunlit_absorption,
+        sum(layer.absorbed_irradiance["sunlit"] for layer in canopy.values()),
+        rtol=1.0e-3,
+    )
+    testing.assert_allclose(
+        shaded_absorption,
+        sum(layer.absorbed_irradiance["shaded"] for layer in canopy.values()),
+        rtol=1.0e-3,
+    )
@@ -0,0 +1,131 @@
+import pickle
+from math import isnan, pi
+
+import numpy
+
+from crop_irradiance.uniform_crops import backends, inputs, params, shoot
+
+LEAF_LAYERS = {i: 5.0 / 40 for i in range(40)}
+
+
+def get_sunlit_shaded_shoot():
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=360,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 3,
+    )
+    sim_params = params.SunlitShadedParams(
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+    )
+    sim_params.update(sim_inputs)
+    return shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+
+
+def get_state(canopy: shoot.Shoot) -> dict:
+    return {
+        "class": type(canopy),
+        "inputs": (type(canopy.inputs), vars(canopy.inputs)),
+        "params": (type(canopy.params), vars(canopy.params)),
+        "shoot": {
+            name: value
+            for name, value in vars(canopy).items()
+            if name not in ("inputs", "params")
+        },
+        "layers": [
+            (index, type(layer), layer.__getstate__())
+            for index, layer in canopy.items()
+        ],
+    }
+
+
+def test_shoot_to_bytes_round_trips_all_attributes():
+    canopy = get_sunlit_shaded_shoot()
+    assert get_state(shoot.Shoot.from_bytes(canopy.to_bytes())) == get_state(canopy)
+
+    canopy.calc_absorbed_irradiance()
+    canopy.calc_absorbed_irradiance_jacobian()
+    assert get_state(shoot.Shoot.from_bytes(canopy.to_bytes())) == get_state(canopy)
+
+    canopy[7].thickness = 0.3
+    canopy[8].absorbed_irradiance["sunlit"] += 1.0
+    assert get_state(shoot.Shoot.from_bytes(canopy.to_bytes())) == get_state(canopy)
+
+    sim_inputs = inputs.LumpedInputs(
+        model="beer", leaf_layers=LEAF_LAYERS, incident_irradiance=400
+    )
+    sim_params = params.LumpedParams(model="beer", extinction_coefficient=0.5)
+    canopy = shoot.Shoot("lumped", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance()
+    assert get_state(pickle.loads(pickle.dumps(canopy))) == get_state(canopy)
+
+
+def test_shoot_pickle_round_trips_array_valued_params():
+    canopy = get_sunlit_shaded_shoot()
+    canopy.params.clumping_factor = numpy.array(0.8)
+    canopy.params.leaf_scattering_coefficient = numpy.array([0.15], dtype="float32")
+    canopy.params.sky_sectors_number = numpy.int64(3)
+    canopy.calc_absorbed_irradiance()
+
+    restored_canopy = pickle.loads(pickle.dumps(canopy))
+
+    restored_params = vars(restored_canopy.params)
+    for name, value in vars(canopy.params).items():
+        assert type(restored_params[name]) is type(value)
+        assert numpy.array_equal(restored_params[name], value)
+        assert getattr(restored_params[name], "dtype", None) == getattr(
+            value, "dtype", None
+        )
+    assert get_state(restored_canopy)["layers"] == get_state(canopy)["layers"]
+
+
+def test_shoot_pickle_is_smaller_than_that_of_its_attributes():
+    canopy = get_sunlit_shaded_shoot()
+    canopy.calc_absorbed_irradiance()
+
+    assert len(pickle.dumps(canopy)) < 0.5 * len(
+        pickle.dumps((dict(canopy), vars(canopy)))
+    )
+
+
+def test_shoot_to_arrays_returns_views_of_layers_quantities():
+    canopy = get_sunlit_shaded_shoot()
+    canopy.calc_absorbed_irradiance()
+
+    records = canopy.to_structured_array()
+    arrays = canopy.to_arrays()
+
+    assert len(records) == len(canopy)
+    assert list(arrays["index"]) == list(canopy.keys())
+    for position, layer in enumerate(canopy.values()):
+        for name in (
+            layer.exported_attributes + layer.absorbed_irradiance_attributes[1:]
+        ):
+            assert arrays[name][position] == getattr(layer, name)
+        for category in ("sunlit", "shaded"):
+            assert arrays[category][position] == layer.absorbed_irradiance[category]
+    assert all(array.base is not None for array in arrays.values())
+
+
+def test_shoot_to_structured_array_exports_partially_evaluated_shoots():
+    for backend in backends.get_backend_names():
+        canopy = get_sunlit_shaded_shoot()
+        canopy.calc_absorbed_irradiance(backend=backend, layer_indexes=[3, 2])
+
+        arrays = canopy.to_arrays()
+
+        assert len(arrays["index"]) == len(canopy)
+        for position, (index, layer) in enumerate(canopy.items()):
+            if index in (3, 2):
+                assert arrays["sunlit"][position] == layer.absorbed_irradiance["sunlit"]
+                assert (
+                    arrays["abs_direct_by_sunlit"][position]
+                    == layer.abs_direct_by_sunlit
+                )
+            else:
+                assert isnan(arrays["sunlit"][position])
+                assert isnan(arrays["abs_direct_by_sunlit"][position])
@@ -0,0 +1,134 @@
+import asyncio
+import json
+from math import pi
+
+from numpy import testing
+
+from crop_irradiance.uniform_crops import inputs, params, service, shoot
+
+LEAF_LAYERS = {i: 3.0 / 6 for i in range(6)}
+
+SUNLIT_SHADED_PARAMS = dict(
+    leaf_reflectance=0.08,
+    leaf_transmittance=0.07,
+    sky_sectors_number=3,
+    sky_type="soc",
+    canopy_reflectance_to_diffuse_irradiance=0.057,
+)
+
+
+def get_sunlit_shaded_request(incident_direct_irradiance: float) -> dict:
+    return {
+        "leaves_category": "sunlit-shaded",
+        "inputs": {
+            "leaf_layers": {str(index): value for index, value in LEAF_LAYERS.items()},
+            "incident_direct_irradiance": incident_direct_irradiance,
+            "incident_diffuse_irradiance": 80,
+            "solar_inclination": pi / 3,
+        },
+        "params": SUNLIT_SHADED_PARAMS,
+    }
+
+
+def get_sunlit_shaded_shoot(incident_direct_irradiance: float) -> shoot.Shoot:
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=incident_direct_irradiance,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 3,
+    )
+    sim_params = params.SunlitShadedParams(**SUNLIT_SHADED_PARAMS)
+    sim_params.update(sim_inputs)
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance()
+    return canopy
+
+
+def test_shoot_service_coalesces_concurrent_requests_into_batches():
+    beer_request = {
+        "leaves_category": "lumped",
+        "inputs": {"leaf_layers": LEAF_LAYERS, "incident_irradiance": 400},
+        "params": {"model": "beer", "extinction_coefficient": 0.5},
+    }
+    invalid_request = get_sunlit_shaded_request(300)
+    invalid_request["params"] = dict(SUNLIT_SHADED_PARAMS, sky_type=None)
+
+    async def evaluate_concurrently(shoot_service):
+        return await asyncio.gather(
+            *(
+                shoot_service.evaluate(get_sunlit_shaded_request(20.0 * i))
+                for i in range(20)
+            ),
+            shoot_service.evaluate(beer_request),
+            shoot_service.evaluate(invalid_request),
+            return_exceptions=True,
+        )
+
+    shoot_service = service.ShootService(batching_window=0.01)
+    responses = asyncio.run(evaluate_concurrently(shoot_service))
+
+    assert shoot_service.batches_number == 3
+    for i, response in enumerate(responses[:20]):
+        canopy = get_sunlit_shaded_shoot(20.0 * i)
+        for index, layer in canopy.items():
+            for category in ("sunlit", "shaded"):
+                testing.assert_allclose(
+                    response["layers"][str(index)][category],
+                    layer.absorbed_irradiance[category],
+                    rtol=1.0e-12,
+                )
+        testing.assert_allclose(
+            response["transmitted_irradiance"],
+            canopy.transmitted_irradiance,
+            rtol=1.0e-12,
+        )
+    assert set(responses[20]["layers"]["0"]) == {"lumped"}
+    assert isinstance(responses[21], Exception)
+
+
+def test_shoot_service_answers_http_requests():
+    async def request(port: int, method: str, target: str, payload=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        body = json.dumps(payload).encode() if payload is not None else b""
+        writer.write(
+            f"{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode() + body
+        )
+        status_line = await reader.readline()
+        response = await reader.read()
+        writer.close()
+        return int(status_line.split()[1]), json.loads(response.split(b"\r\n\r\n")[1])
+
+    async def run_clients():
+        shoot_service = service.ShootService(batching_window=0.005)
+        server = await service.start_server(shoot_service, port=0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            responses = await asyncio.gather(
+                *(
+                    request(port, "POST", "/evaluate", get_sunlit_shaded_request(360))
+                    for _ in range(10)
+                ),
+                request(port, "POST", "/evaluate", {"leaves_category": "unknown"}),
+            )
+            statistics = await request(port, "GET", "/stats")
+        finally:
+            server.close()
+            await server.wait_closed()
+        return shoot_service, responses, statistics
+
+    shoot_service, responses, (status, statistics) = asyncio.run(run_clients())
+
+    canopy = get_sunlit_shaded_shoot(360)
+    for status, response in responses[:10]:
+        assert status == 200
+        testing.assert_allclose(
+            response["layers"]["0"]["sunlit"],
+            canopy[0].absorbed_irradiance["sunlit"],
+            rtol=1.0e-12,
+        )
+    assert responses[10][0] == 400
+    assert status == 200
+    assert statistics["requests_number"] == 10
+    assert statistics["batches_number"] < 10
+    assert statistics["latency_p99"] >= statistics["latency_p50"] > 0
@@ -1,5 +1,6 @@
-from numpy import arange, pi, random, testing
+from numpy import arange, array, pi, random, sin, testing
 
+from crop_irradiance.uniform_crops import vectorized
 from crop_irradiance.uniform_crops.formalisms import sunlit_shaded_leaves
 
 
@@ -92,7 +93,11 @@ def test_calc_direct_extinction_coefficient_returns_expected_value():
 
 
 def test_calc_sky_sectors_weight_returns_expected_uoc_values():
-    assert sunlit_shaded_leaves.calc_sky_sectors_weight(3, "uoc") == [0.25, 0.5, 0.25]
+    testing.assert_almost_equal(
+        sunlit_shaded_leaves.calc_sky_sectors_weight(3, "uoc"),
+        [0.25, 0.5, 0.25],
+        decimal=15,
+    )
 
 
 def test_calc_sky_sectors_weight_returns_expected_soc_values():
@@ -116,6 +121,98 @@ def test_calc_sky_sectors_weight_returns_weights_which_sums_up_to_1():
         testing.assert_almost_equal(actual_value, expected_value, decimal=6)
 
 
+def test_calc_sky_sectors_weight_returns_uoc_weights_for_any_number_of_sectors():
+    for sky_sectors_number in (1, 6, 46, 145):
+        actual_values = sunlit_shaded_leaves.calc_sky_sectors_weight(
+            sky_sectors_number, "uoc"
+        )
+
+        assert len(actual_values) == sky_sectors_number
+        testing.assert_almost_equal(sum(actual_values), 1.0, decimal=12)
+    testing.assert_almost_equal(
+        sunlit_shaded_leaves.calc_sky_sectors_weight(2, "uoc"), [0.5, 0.5], decimal=12
+    )
+
+
+def test_calc_diffuse_extinction_coefficient_converges_as_sky_sectors_number_increases():
+    for sky_type in ("soc", "uoc"):
+        extinction_coefficients = [
+            sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
+                leaf_area_index=3.0,
+                leaf_angle_distribution_factor=0.9773843811168246,
+                clumping_factor=1,
+                leaf_scattering_coefficient=0.15,
+                sky_sectors_number=sky_sectors_number,
+                sky_type=sky_type,
+            )[0]
+            for sky_sectors_number in (3, 46, 145)
+        ]
+
+        assert abs(extinction_coefficients[2] - extinction_coefficients[1]) < abs(
+            extinction_coefficients[1] - extinction_coefficients[0]
+        )
+        testing.assert_almost_equal(
+            extinction_coefficients[2], extinction_coefficients[1], decimal=4
+        )
+
+
+def test_calc_diffuse_extinction_coefficient_matches_the_vectorized_sum_of_sky_sectors():
+    kwargs = dict(
+        leaf_angle_distribution_factor=0.9773843811168246,
+        clumping_factor=0.8,
+        leaf_scattering_coefficient=0.15,
+    )
+    cases = [
+        (leaf_area_index, sky_sectors_number, sky_type)
+        for leaf_area_index in (0.0, 1.0e-9, 3.0)
+        for sky_sectors_number in (3, 46, 145)
+        for sky_type in ("soc", "uoc")
+    ]
+    actual_values = [
+        sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
+            leaf_area_index, sky_sectors_number=n, sky_type=sky_type, **kwargs
+        )
+        for leaf_area_index, n, sky_type in cases
+    ]
+
+    testing.assert_allclose(
+        [values[0] for values in actual_values],
+        [
+            vectorized.calc_diffuse_extinction_coefficient(
+                leaf_area_index, sky_sectors_number=n, sky_type=sky_type, **kwargs
+            )
+            for leaf_area_index, n, sky_type in cases
+        ],
+        rtol=1.0e-12,
+    )
+    for (leaf_area_index, n, sky_type), values in zip(cases[:12], actual_values):
+        # in sparse canopies, the extinction coefficient tends to the weighted mean of those of sky sectors
+        black_leaves_extinction_coefficient = sum(
+            weight * 0.5 / sin(angle)
+            for weight, angle in zip(
+                sunlit_shaded_leaves.calc_sky_sectors_weight(n, sky_type),
+                sunlit_shaded_leaves.calc_sky_sectors_angle(n),
+            )
+        )
+        testing.assert_allclose(
+            values[1], black_leaves_extinction_coefficient, rtol=1.0e-8
+        )
+
+
+def test_calc_diffuse_extinction_coefficient_reads_single_valued_arrays_as_floats():
+    kwargs = dict(
+        leaf_area_index=3.0,
+        leaf_angle_distribution_factor=0.9773843811168246,
+        leaf_scattering_coefficient=0.15,
+    )
+
+    assert sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
+        clumping_factor=array(0.7), **kwargs
+    ) == sunlit_shaded_leaves.calc_diffuse_extinction_coefficient(
+        clumping_factor=0.7, **kwargs
+    )
+
+
 def test_calc_diffuse_extinction_coefficient_reduces_as_leaf_area_index_increases():
     leaf_scattering_coefficient = 0.15
     leaf_angle_distribution_factor = 0.9773843811168246
@@ -0,0 +1,792 @@
+import tracemalloc
+import warnings
+from math import pi
+
+import numpy
+import pytest
+from numpy import array, testing
+
+from crop_irradiance.uniform_crops import inputs, params, shoot, vectorized
+from crop_irradiance.uniform_crops.formalisms import sunlit_shaded_leaves
+
+LEAF_LAYERS = {4: 0.09, 5: 1.11, 6: 1.92, 7: 3.22}
+LEAF_LAYER_THICKNESSES = array([[0.3, 1.1, 1.9, 2.2], [0.5, 0.5, 0.5, 0.5]])
+INCIDENT_DIRECT_IRRADIANCE = array([360.0, 200.0])
+INCIDENT_DIFFUSE_IRRADIANCE = array([80.0, 120.0])
+SOLAR_INCLINATION = array([pi / 3, 0.4])
+SINGLE_PRECISION_LAYERS_NUMBER = 50
+SINGLE_PRECISION_DIRECT_IRRADIANCE = 800.0
+SINGLE_PRECISION_DIFFUSE_IRRADIANCE = 200.0
+SINGLE_PRECISION_IRRADIANCE = (
+    SINGLE_PRECISION_DIRECT_IRRADIANCE + SINGLE_PRECISION_DIFFUSE_IRRADIANCE
+)
+SINGLE_PRECISION_RTOL = 1.0e-5
+SINGLE_PRECISION_ATOL = 1.0e-6 * SINGLE_PRECISION_IRRADIANCE
+
+
+def get_sunlit_shaded_params(
+    leaf_reflectance=0.08, leaf_transmittance=0.07, clumping_factor=0.8
+):
+    return params.SunlitShadedParams(
+        leaf_reflectance=leaf_reflectance,
+        leaf_transmittance=leaf_transmittance,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+        clumping_factor=clumping_factor,
+    )
+
+
+def get_lumped_params(model, **kwargs):
+    params_kwargs = dict(
+        extinction_coefficient=0.5,
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        sky_sectors_number=3,
+        sky_type="soc",
+        canopy_reflectance_to_diffuse_irradiance=0.057,
+        clumping_factor=0.8,
+    )
+    params_kwargs.update(kwargs)
+    return params.LumpedParams(model=model, **params_kwargs)
+
+
+def test_calc_sunlit_shaded_absorbed_irradiance_returns_same_values_as_shoot():
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=360,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 3,
+    )
+    sim_params = get_sunlit_shaded_params()
+    sim_params.update(sim_inputs)
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance()
+
+    actual_values = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=360,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 3,
+        params=sim_params,
+    )
+
+    for category in ("sunlit", "shaded"):
+        testing.assert_allclose(
+            actual_values[category],
+            [layer.absorbed_irradiance[category] for layer in canopy.values()],
+            rtol=1.0e-12,
+        )
+    for name in ("sunlit_fraction",) + vectorized.SUNLIT_SHADED_COMPONENTS:
+        testing.assert_allclose(
+            actual_values[name],
+            [getattr(layer, name) for layer in canopy.values()],
+            rtol=1.0e-12,
+        )
+
+
+def test_calc_sunlit_shaded_coefficients_use_leaf_angle_distribution_tables():
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=360,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 3,
+    )
+    for leaf_angle_distribution, leaf_angle_distribution_factor in (
+        ("erectophile", 0.9773843811168246),
+        ("ellipsoidal", 1.2),
+    ):
+        sim_params = get_sunlit_shaded_params()
+        sim_params.leaf_angle_distribution = leaf_angle_distribution
+        sim_params.leaf_angle_distribution_factor = leaf_angle_distribution_factor
+        sim_params.update(sim_inputs)
+
+        coefficients = vectorized.calc_sunlit_shaded_coefficients(
+            solar_inclination=[pi / 3, pi / 3],
+            leaf_area_index=sum(LEAF_LAYERS.values()),
+            params=sim_params,
+        )
+
+        for name, value in coefficients.items():
+            testing.assert_allclose(value, getattr(sim_params, name), rtol=1.0e-12)
+
+    sim_params.leaf_angle_distribution_factor = array([[0.5], [1.2]])
+    testing.assert_allclose(
+        vectorized.calc_direct_black_extinction_coefficient(
+            pi / 3, sim_params.leaf_angle_distribution_factor, 1, "ellipsoidal"
+        )[:, 0],
+        [
+            sunlit_shaded_leaves.calc_direct_black_extinction_coefficient(
+                pi / 3, leaf_angle_distribution_factor, 1, "ellipsoidal"
+            )
+            for leaf_angle_distribution_factor in (0.5, 1.2)
+        ],
+        rtol=1.0e-12,
+    )
+
+
+def test_calc_lumped_absorbed_irradiance_returns_same_values_as_shoot():
+    for model, kwargs in (
+        ("beer", dict(incident_irradiance=400)),
+        (
+            "de_pury",
+            dict(
+                incident_direct_irradiance=360,
+                incident_diffuse_irradiance=80,
+                solar_inclination=pi / 3,
+            ),
+        ),
+    ):
+        sim_inputs = inputs.LumpedInputs(model=model, leaf_layers=LEAF_LAYERS, **kwargs)
+        sim_params = get_lumped_params(model)
+        if model == "de_pury":
+            sim_params.update(sim_inputs)
+        canopy = shoot.Shoot("lumped", sim_inputs, sim_params)
+        canopy.calc_absorbed_irradiance()
+
+        testing.assert_allclose(
+            vectorized.calc_lumped_absorbed_irradiance(
+                leaf_layers=LEAF_LAYERS, params=sim_params, **kwargs
+            )["lumped"],
+            [layer.absorbed_irradiance["lumped"] for layer in canopy.values()],
+            rtol=1.0e-12,
+        )
+
+
+def test_joint_evaluation_matches_separate_lumped_and_sunlit_shaded_evaluations():
+    forcing = dict(
+        incident_direct_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        incident_diffuse_irradiance=INCIDENT_DIFFUSE_IRRADIANCE,
+        solar_inclination=SOLAR_INCLINATION,
+    )
+    for lumped_params in (
+        get_lumped_params("de_pury"),
+        get_lumped_params("de_pury", clumping_factor=0.6),
+    ):
+        sunlit_shaded_params = get_sunlit_shaded_params()
+        results = vectorized.calc_joint_absorbed_irradiance(
+            LEAF_LAYER_THICKNESSES,
+            lumped_params=lumped_params,
+            sunlit_shaded_params=sunlit_shaded_params,
+            check_energy_balance=True,
+            **forcing,
+        )
+        expected = {
+            "lumped": vectorized.calc_lumped_absorbed_irradiance(
+                LEAF_LAYER_THICKNESSES, lumped_params, **forcing
+            ),
+            "sunlit-shaded": vectorized.calc_sunlit_shaded_absorbed_irradiance(
+                LEAF_LAYER_THICKNESSES, params=sunlit_shaded_params, **forcing
+            ),
+        }
+        for leaves_category, values in expected.items():
+            assert results[leaves_category].keys() == values.keys()
+            for name, value in values.items():
+                testing.assert_allclose(
+                    results[leaves_category][name], value, rtol=1.0e-12, atol=1e-12
+                )
+
+        shoots = shoot.calc_joint_shoots(
+            LEAF_LAYERS,
+            360.0,
+            80.0,
+            pi / 3,
+            lumped_params,
+            sunlit_shaded_params,
+            check_energy_balance=True,
+        )
+        joint_results = vectorized.calc_joint_absorbed_irradiance(
+            LEAF_LAYERS, 360.0, 80.0, pi / 3, lumped_params, sunlit_shaded_params
+        )
+        for leaves_category, categories in (
+            ("lumped", ("lumped",)),
+            ("sunlit-shaded", ("sunlit", "shaded")),
+        ):
+            for category in categories:
+                testing.assert_allclose(
+                    [
+                        layer.absorbed_irradiance[category]
+                        for layer in shoots[leaves_category].values()
+                    ],
+                    joint_results[leaves_category][category],
+                    rtol=1.0e-12,
+                )
+
+
+def test_joint_evaluation_compares_array_valued_params():
+    forcing = dict(
+        incident_direct_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        incident_diffuse_irradiance=INCIDENT_DIFFUSE_IRRADIANCE,
+        solar_inclination=SOLAR_INCLINATION,
+    )
+    sunlit_shaded_params = get_sunlit_shaded_params(clumping_factor=array([0.8, 0.6]))
+    for clumping_factor in (array([0.8, 0.6]), array([0.8, 0.5]), array(0.8)):
+        lumped_params = get_lumped_params("de_pury", clumping_factor=clumping_factor)
+        results = vectorized.calc_joint_absorbed_irradiance(
+            LEAF_LAYER_THICKNESSES,
+            lumped_params=lumped_params,
+            sunlit_shaded_params=sunlit_shaded_params,
+            **forcing,
+        )
+        testing.assert_allclose(
+            results["lumped"]["lumped"],
+            vectorized.calc_lumped_absorbed_irradiance(
+                LEAF_LAYER_THICKNESSES, lumped_params, **forcing
+            )["lumped"],
+            rtol=1.0e-12,
+        )
+        testing.assert_allclose(
+            results["sunlit-shaded"]["sunlit"],
+            vectorized.calc_sunlit_shaded_absorbed_irradiance(
+                LEAF_LAYER_THICKNESSES, params=sunlit_shaded_params, **forcing
+            )["sunlit"],
+            rtol=1.0e-12,
+        )
+
+    forcing = (LEAF_LAYERS, 360.0, 80.0, pi / 3)
+    shoots = shoot.calc_joint_shoots(
+        *forcing,
+        get_lumped_params("de_pury", clumping_factor=array(0.8)),
+        get_sunlit_shaded_params(clumping_factor=array([0.8])),
+    )
+    expected = shoot.calc_joint_shoots(
+        *forcing, get_lumped_params("de_pury"), get_sunlit_shaded_params()
+    )
+    for leaves_category, canopy in expected.items():
+        for index, layer in canopy.items():
+            assert (
+                shoots[leaves_category][index].absorbed_irradiance
+                == layer.absorbed_irradiance
+            )
+
+
+def test_calc_sunlit_shaded_absorbed_irradiance_broadcasts_over_timesteps():
+    sim_params = get_sunlit_shaded_params()
+    actual_values = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        LEAF_LAYER_THICKNESSES,
+        INCIDENT_DIRECT_IRRADIANCE,
+        INCIDENT_DIFFUSE_IRRADIANCE,
+        SOLAR_INCLINATION,
+        sim_params,
+    )
+
+    for i in range(2):
+        testing.assert_allclose(
+            actual_values["sunlit"][i],
+            vectorized.calc_sunlit_shaded_absorbed_irradiance(
+                LEAF_LAYER_THICKNESSES[i],
+                INCIDENT_DIRECT_IRRADIANCE[i],
+                INCIDENT_DIFFUSE_IRRADIANCE[i],
+                SOLAR_INCLINATION[i],
+                sim_params,
+            )["sunlit"],
+            rtol=1.0e-12,
+        )
+
+
+def test_calc_sunlit_shaded_jacobian_matches_finite_differences():
+    step = 1.0e-6
+    jacobian = vectorized.calc_sunlit_shaded_jacobian(
+        LEAF_LAYER_THICKNESSES,
+        INCIDENT_DIRECT_IRRADIANCE,
+        INCIDENT_DIFFUSE_IRRADIANCE,
+        SOLAR_INCLINATION,
+        get_sunlit_shaded_params(),
+    )
+
+    def calc_absorbed_irradiance(leaf_layer_thicknesses=LEAF_LAYER_THICKNESSES, **kw):
+        return vectorized.calc_sunlit_shaded_absorbed_irradiance(
+            leaf_layer_thicknesses,
+            INCIDENT_DIRECT_IRRADIANCE,
+            INCIDENT_DIFFUSE_IRRADIANCE,
+            SOLAR_INCLINATION,
+            get_sunlit_shaded_params(**kw),
+        )
+
+    reference = dict(
+        leaf_reflectance=0.08, leaf_transmittance=0.07, clumping_factor=0.8
+    )
+    for parameter, value in reference.items():
+        upper = calc_absorbed_irradiance(**{parameter: value + step})
+        lower = calc_absorbed_irradiance(**{parameter: value - step})
+        for category in ("sunlit", "shaded"):
+            testing.assert_allclose(
+                jacobian[category][parameter],
+                (upper[category] - lower[category]) / (2 * step),
+                atol=1.0e-6,
+            )
+
+    for layer in range(LEAF_LAYER_THICKNESSES.shape[-1]):
+        upper_thicknesses = LEAF_LAYER_THICKNESSES.copy()
+        upper_thicknesses[:, layer] += step
+        lower_thicknesses = LEAF_LAYER_THICKNESSES.copy()
+        lower_thicknesses[:, layer] -= step
+        upper = calc_absorbed_irradiance(upper_thicknesses)
+        lower = calc_absorbed_irradiance(lower_thicknesses)
+        for category in ("sunlit", "shaded"):
+            testing.assert_allclose(
+                jacobian[category]["leaf_layer_thickness"][..., layer],
+                (upper[category] - lower[category]) / (2 * step),
+                atol=1.0e-6,
+            )
+
+
+def test_calc_lumped_jacobian_matches_finite_differences():
+    step = 1.0e-6
+    kwargs = dict(
+        incident_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        incident_direct_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        incident_diffuse_irradiance=INCIDENT_DIFFUSE_IRRADIANCE,
+        solar_inclination=SOLAR_INCLINATION,
+    )
+    reference = dict(
+        extinction_coefficient=0.5,
+        leaf_reflectance=0.08,
+        leaf_transmittance=0.07,
+        clumping_factor=0.8,
+    )
+
+    for model in ("beer", "de_pury"):
+        jacobian = vectorized.calc_lumped_jacobian(
+            LEAF_LAYER_THICKNESSES, get_lumped_params(model), **kwargs
+        )["lumped"]
+        for parameter, derivatives in jacobian.items():
+            if parameter == "leaf_layer_thickness":
+                continue
+            value = reference[parameter]
+            upper = vectorized.calc_lumped_absorbed_irradiance(
+                LEAF_LAYER_THICKNESSES,
+                get_lumped_params(model, **{parameter: value + step}),
+                **kwargs,
+            )["lumped"]
+            lower = vectorized.calc_lumped_absorbed_irradiance(
+                LEAF_LAYER_THICKNESSES,
+                get_lumped_params(model, **{parameter: value - step}),
+                **kwargs,
+            )["lumped"]
+            testing.assert_allclose(
+                derivatives, (upper - lower) / (2 * step), atol=1.0e-6
+            )
+
+        parameters_jacobian = vectorized.calc_lumped_jacobian(
+            LEAF_LAYER_THICKNESSES,
+            get_lumped_params(model),
+            **kwargs,
+            with_leaf_layer_thickness=False,
+        )["lumped"]
+        assert parameters_jacobian.keys() == jacobian.keys() - {"leaf_layer_thickness"}
+        for parameter, derivatives in parameters_jacobian.items():
+            testing.assert_array_equal(derivatives, jacobian[parameter])
+
+
+def test_shoot_calc_absorbed_irradiance_jacobian_sets_layers_jacobian():
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=360,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 3,
+    )
+    sim_params = get_sunlit_shaded_params()
+    sim_params.update(sim_inputs)
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance_jacobian()
+
+    jacobian = vectorized.calc_sunlit_shaded_jacobian(
+        LEAF_LAYERS, 360, 80, pi / 3, sim_params
+    )
+    for position, layer in enumerate(canopy.values()):
+        testing.assert_almost_equal(
+            layer.absorbed_irradiance_jacobian["sunlit"]["clumping_factor"],
+            jacobian["sunlit"]["clumping_factor"][position],
+        )
+        testing.assert_almost_equal(
+            layer.absorbed_irradiance_jacobian["shaded"]["leaf_layer_thickness"][4],
+            jacobian["shaded"]["leaf_layer_thickness"][position][-1],
+        )
+
+
+def get_single_precision_canopies():
+    leaf_area_index, solar_inclination = numpy.meshgrid(
+        numpy.linspace(0, 12, 49), numpy.linspace(0.01, pi / 2, 40), indexing="ij"
+    )
+    leaf_layer_thicknesses = numpy.repeat(
+        (leaf_area_index / SINGLE_PRECISION_LAYERS_NUMBER)[..., None],
+        SINGLE_PRECISION_LAYERS_NUMBER,
+        axis=-1,
+    )
+    return leaf_layer_thicknesses, solar_inclination
+
+
+def test_calc_sunlit_shaded_absorbed_irradiance_in_single_precision_is_bounded():
+    leaf_layer_thicknesses, solar_inclination = get_single_precision_canopies()
+    args = (
+        leaf_layer_thicknesses,
+        SINGLE_PRECISION_DIRECT_IRRADIANCE,
+        SINGLE_PRECISION_DIFFUSE_IRRADIANCE,
+        solar_inclination,
+        get_sunlit_shaded_params(),
+    )
+    expected_values = vectorized.calc_sunlit_shaded_absorbed_irradiance(*args)
+    actual_values = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        *args, dtype=numpy.float32
+    )
+
+    for name, expected_value in expected_values.items():
+        assert actual_values[name].dtype == numpy.float32
+        assert numpy.isfinite(actual_values[name]).all(), name
+        assert numpy.isfinite(expected_value).all(), name
+        atol = 1.0e-5 if name.endswith("fraction") else SINGLE_PRECISION_ATOL
+        testing.assert_allclose(
+            actual_values[name],
+            expected_value,
+            rtol=SINGLE_PRECISION_RTOL,
+            atol=atol,
+            err_msg=name,
+        )
+
+
+def test_lumped_and_whole_canopy_irradiance_in_single_precision_is_bounded():
+    leaf_layer_thicknesses, solar_inclination = get_single_precision_canopies()
+    kwargs = dict(
+        incident_irradiance=SINGLE_PRECISION_IRRADIANCE,
+        incident_direct_irradiance=SINGLE_PRECISION_DIRECT_IRRADIANCE,
+        incident_diffuse_irradiance=SINGLE_PRECISION_DIFFUSE_IRRADIANCE,
+        solar_inclination=solar_inclination,
+    )
+
+    for model in ("beer", "de_pury"):
+        sim_params = get_lumped_params(model)
+        for function, key in (
+            (vectorized.calc_lumped_absorbed_irradiance, "lumped"),
+            (vectorized.calc_transmitted_irradiance, None),
+            (vectorized.calc_canopy_absorbed_irradiance, None),
+        ):
+            expected_value = function(leaf_layer_thicknesses, sim_params, **kwargs)
+            actual_value = function(
+                leaf_layer_thicknesses, sim_params, dtype="float32", **kwargs
+            )
+            if key is not None:
+                expected_value, actual_value = expected_value[key], actual_value[key]
+
+            assert actual_value.dtype == numpy.float32
+            testing.assert_allclose(
+                actual_value,
+                expected_value,
+                rtol=SINGLE_PRECISION_RTOL,
+                atol=SINGLE_PRECISION_ATOL,
+                err_msg=f"{model}: {function.__name__}",
+            )
+
+
+def test_transmitted_and_reflected_irradiance_close_energy_balance():
+    sim_inputs = inputs.SunlitShadedInputs(
+        leaf_layers=LEAF_LAYERS,
+        incident_direct_irradiance=360,
+        incident_diffuse_irradiance=80,
+        solar_inclination=pi / 3,
+    )
+    sim_params = get_sunlit_shaded_params()
+    sim_params.update(sim_inputs)
+    canopy = shoot.Shoot("sunlit-shaded", sim_inputs, sim_params)
+    canopy.calc_absorbed_irradiance(check_energy_balance=True)
+
+    actual_values = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        LEAF_LAYERS, 360, 80, pi / 3, sim_params, check_energy_balance=True
+    )
+    for name in (
+        "transmitted_irradiance",
+        "reflected_irradiance",
+        "soil_absorbed_irradiance",
+    ):
+        testing.assert_allclose(
+            actual_values[name], getattr(canopy, name), rtol=1.0e-12
+        )
+    testing.assert_allclose(
+        canopy.transmitted_irradiance,
+        vectorized.calc_transmitted_irradiance(
+            LEAF_LAYERS,
+            sim_params,
+            incident_direct_irradiance=360,
+            incident_diffuse_irradiance=80,
+            solar_inclination=pi / 3,
+        ),
+        rtol=1.0e-12,
+    )
+
+    for model, kwargs in (
+        ("beer", dict(incident_irradiance=INCIDENT_DIRECT_IRRADIANCE)),
+        (
+            "de_pury",
+            dict(
+                incident_direct_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+                incident_diffuse_irradiance=INCIDENT_DIFFUSE_IRRADIANCE,
+                solar_inclination=SOLAR_INCLINATION,
+            ),
+        ),
+    ):
+        actual_values = vectorized.calc_lumped_absorbed_irradiance(
+            LEAF_LAYER_THICKNESSES,
+            get_lumped_params(model),
+            check_energy_balance=True,
+            **kwargs,
+        )
+        assert actual_values["transmitted_irradiance"].shape == (2,)
+
+
+def test_shoot_calc_energy_budget_detects_energy_imbalance():
+    sim_inputs = inputs.LumpedInputs(
+        model="beer", leaf_layers=LEAF_LAYERS, incident_irradiance=400
+    )
+    canopy = shoot.Shoot("lumped", sim_inputs, get_lumped_params("beer"))
+    canopy.calc_absorbed_irradiance(check_energy_balance=True)
+
+    canopy[4].absorbed_irradiance["lumped"] += 1.0
+    with pytest.raises(AssertionError):
+        canopy.calc_energy_budget(check_energy_balance=True)
+
+
+def test_absorbed_irradiance_is_written_into_preallocated_buffers_without_allocations():
+    sim_params = get_sunlit_shaded_params()
+    lumped_params = params.LumpedParams(model="beer", extinction_coefficient=0.5)
+    forcing = numpy.linspace(0.0, 1.0, 200)
+    sunlit_shaded_out = {
+        name: numpy.empty_like(value)
+        for name, value in vectorized.calc_sunlit_shaded_absorbed_irradiance(
+            LEAF_LAYERS, 0.0, 0.0, 1.0, sim_params
+        ).items()
+    }
+    lumped_out = {
+        name: numpy.empty_like(value)
+        for name, value in vectorized.calc_lumped_absorbed_irradiance(
+            LEAF_LAYERS, lumped_params, incident_irradiance=0.0
+        ).items()
+    }
+
+    def step(position):
+        value = forcing[position]
+        sunlit_shaded_results = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+            LEAF_LAYERS,
+            400.0 * value,
+            100.0 * value,
+            0.2 + value,
+            sim_params,
+            out=sunlit_shaded_out,
+        )
+        lumped_results = vectorized.calc_lumped_absorbed_irradiance(
+            LEAF_LAYERS,
+            lumped_params,
+            incident_irradiance=500.0 * value,
+            out=lumped_out,
+        )
+        return sunlit_shaded_results, lumped_results
+
+    tracemalloc.start()
+    try:
+        # warm-up steps fill the internal caches of small arrays of NumPy
+        for position in range(100):
+            results = step(position)
+        allocated_memory, _ = tracemalloc.get_traced_memory()
+        for position in range(100, len(forcing)):
+            results = step(position)
+        steps_memory, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # less than the results of a single step, the small buffers cached by NumPy slightly fluctuating
+    assert steps_memory - allocated_memory < 1024
+    assert all(results[0][name] is buffer for name, buffer in sunlit_shaded_out.items())
+    assert all(results[1][name] is buffer for name, buffer in lumped_out.items())
+    expected = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        LEAF_LAYERS, 400.0, 100.0, 1.2, sim_params
+    )
+    for name, values in expected.items():
+        testing.assert_allclose(sunlit_shaded_out[name], values)
+
+
+def calc_per_layer_reference(layers_params: dict) -> dict:
+    """Calculates the components of absorbed irradiance of the leaf layers of LEAF_LAYER_THICKNESSES, each layer having
+    the coefficients of a canopy made of its leaves, from the integrals of the cumulative optical depths.
+    """
+    coefficients = {
+        name: numpy.zeros(LEAF_LAYER_THICKNESSES.shape)
+        for name in params.OPTICS_COEFFICIENTS_NAMES
+    }
+    for timestep, layer_index in numpy.ndindex(LEAF_LAYER_THICKNESSES.shape):
+        layer_params = get_sunlit_shaded_params(
+            leaf_reflectance=layers_params["leaf_reflectance"][layer_index],
+            leaf_transmittance=layers_params["leaf_transmittance"][layer_index],
+            clumping_factor=layers_params["clumping_factor"][timestep, layer_index],
+        )
+        layer_params.leaf_angle_distribution_factor = layers_params[
+            "leaf_angle_distribution_factor"
+        ][layer_index]
+        layer_params.update(
+            inputs.SunlitShadedInputs(
+                leaf_layers={0: LEAF_LAYER_THICKNESSES[timestep].sum()},
+                incident_direct_irradiance=0.0,
+                incident_diffuse_irradiance=0.0,
+                solar_inclination=SOLAR_INCLINATION[timestep],
+            ),
+            backend="python",
+        )
+        for name, values in coefficients.items():
+            values[timestep, layer_index] = getattr(layer_params, name)
+
+    def calc_depths(name):
+        optical_depth = numpy.cumsum(
+            coefficients[name] * LEAF_LAYER_THICKNESSES, axis=-1
+        )
+        return numpy.concatenate(
+            [numpy.zeros(optical_depth.shape[:-1] + (1,)), optical_depth], axis=-1
+        )
+
+    def calc_layers_difference(optical_depth):
+        return -numpy.diff(numpy.exp(-optical_depth), axis=-1)
+
+    direct_black_depth = calc_depths("direct_black_extinction_coefficient")
+    direct_depth = calc_depths("direct_extinction_coefficient")
+    diffuse_depth = calc_depths("diffuse_extinction_coefficient")
+    kb = coefficients["direct_black_extinction_coefficient"]
+    kd = coefficients["diffuse_extinction_coefficient"]
+    k_direct = coefficients["direct_extinction_coefficient"]
+    leaf_absorptance = 1 - coefficients["leaf_scattering_coefficient"]
+    direct_absorptance = (
+        1 - coefficients["canopy_reflectance_to_direct_irradiance"][..., :1]
+    )
+    diffuse_absorptance = 1 - coefficients["canopy_reflectance_to_diffuse_irradiance"]
+    direct_irradiance = INCIDENT_DIRECT_IRRADIANCE[:, None]
+    diffuse_irradiance = INCIDENT_DIFFUSE_IRRADIANCE[:, None]
+
+    reference = {
+        "abs_direct_by_sunlit": direct_irradiance
+        * leaf_absorptance
+        * calc_layers_difference(direct_black_depth),
+        "abs_diffuse_by_sunlit": diffuse_irradiance
+        * diffuse_absorptance
+        * kd
+        / (kd + kb)
+        * calc_layers_difference(diffuse_depth + direct_black_depth),
+        "abs_scattered_by_sunlit": direct_irradiance
+        * (
+            direct_absorptance
+            * k_direct
+            / (k_direct + kb)
+            * calc_layers_difference(direct_depth + direct_black_depth)
+            - leaf_absorptance / 2 * calc_layers_difference(2 * direct_black_depth)
+        ),
+    }
+    reference["abs_diffuse_by_shaded"] = (
+        diffuse_irradiance * diffuse_absorptance * calc_layers_difference(diffuse_depth)
+        - reference["abs_diffuse_by_sunlit"]
+    )
+    reference["abs_scattered_by_shaded"] = (
+        direct_irradiance
+        * (
+            direct_absorptance * calc_layers_difference(direct_depth)
+            - leaf_absorptance * calc_layers_difference(direct_black_depth)
+        )
+        - reference["abs_scattered_by_sunlit"]
+    )
+    reference["sunlit_fraction"] = calc_layers_difference(direct_black_depth) / (
+        kb * LEAF_LAYER_THICKNESSES
+    )
+    return reference
+
+
+def test_per_layer_params_are_evaluated_with_cumulative_optical_depth():
+    layers_number = LEAF_LAYER_THICKNESSES.shape[-1]
+    uniform_layers_params = {
+        "leaf_reflectance": numpy.full(layers_number, 0.08),
+        "leaf_transmittance": numpy.full(layers_number, 0.07),
+        "clumping_factor": numpy.full(layers_number, 0.8),
+        "leaf_angle_distribution_factor": numpy.full(
+            layers_number, get_sunlit_shaded_params().leaf_angle_distribution_factor
+        ),
+    }
+    layers_params = {
+        "leaf_reflectance": array([0.06, 0.08, 0.1, 0.12]),
+        "leaf_transmittance": array([0.05, 0.07, 0.09, 0.11]),
+        "clumping_factor": array([[0.9, 0.8, 0.7, 0.6], [0.6, 0.7, 0.8, 0.9]]),
+        "leaf_angle_distribution_factor": array([0.5, 1.0, 1.5, 2.0]),
+    }
+    forcing = (
+        LEAF_LAYER_THICKNESSES,
+        INCIDENT_DIRECT_IRRADIANCE,
+        INCIDENT_DIFFUSE_IRRADIANCE,
+        SOLAR_INCLINATION,
+        get_sunlit_shaded_params(),
+    )
+
+    expected = vectorized.calc_sunlit_shaded_absorbed_irradiance(*forcing)
+    actual = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        *forcing, layers_params=uniform_layers_params
+    )
+    for name, values in expected.items():
+        testing.assert_allclose(actual[name], values, rtol=1.0e-12)
+
+    results = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+        *forcing, check_energy_balance=True, layers_params=layers_params
+    )
+    assert not numpy.allclose(results["sunlit"], expected["sunlit"])
+    for name, values in calc_per_layer_reference(layers_params).items():
+        testing.assert_allclose(results[name], values, rtol=1.0e-12, atol=1.0e-12)
+    assert numpy.all(
+        (0 < results["sunlit_fraction"]) & (results["sunlit_fraction"] < 1)
+    )
+    vectorized.calc_lumped_absorbed_irradiance(
+        LEAF_LAYER_THICKNESSES,
+        get_lumped_params("de_pury"),
+        incident_direct_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        incident_diffuse_irradiance=INCIDENT_DIFFUSE_IRRADIANCE,
+        solar_inclination=SOLAR_INCLINATION,
+        check_energy_balance=True,
+        layers_params=layers_params,
+    )
+
+    extinction_coefficient = array([0.9, 0.7, 0.5, 0.3])
+    beer_results = vectorized.calc_lumped_absorbed_irradiance(
+        LEAF_LAYER_THICKNESSES,
+        get_lumped_params("beer"),
+        incident_irradiance=INCIDENT_DIRECT_IRRADIANCE,
+        check_energy_balance=True,
+        layers_params={"extinction_coefficient": extinction_coefficient},
+    )
+    optical_depth = numpy.cumsum(
+        extinction_coefficient * LEAF_LAYER_THICKNESSES, axis=-1
+    )
+    testing.assert_allclose(
+        beer_results["transmitted_irradiance"],
+        INCIDENT_DIRECT_IRRADIANCE * numpy.exp(-optical_depth[..., -1]),
+    )
+    testing.assert_allclose(
+        beer_results["lumped"][..., 1:],
+        INCIDENT_DIRECT_IRRADIANCE[..., None]
+        * -numpy.diff(numpy.exp(-optical_depth), axis=-1),
+    )
+    with pytest.raises(AssertionError):
+        vectorized.calc_sunlit_shaded_absorbed_irradiance(
+            *forcing,
+            layers_params={"leaf_reflectance": layers_params["leaf_reflectance"]},
+        )
+
+
+def test_sunlit_fraction_of_leaf_layers_without_leaves_is_that_at_their_top():
+    sim_params = get_sunlit_shaded_params()
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        results = vectorized.calc_sunlit_shaded_absorbed_irradiance(
+            array([[1.0, 0.0, 1.0], [0.0, 0.0, 0.0]]), 400.0, 100.0, 0.6, sim_params
+        )
+
+    direct_black_extinction_coefficient = vectorized.calc_sunlit_shaded_coefficients(
+        0.6, 2.0, sim_params
+    )["direct_black_extinction_coefficient"]
+    testing.assert_allclose(
+        results["sunlit_fraction"][0, 1],
+        numpy.exp(-direct_black_extinction_coefficient),
+    )
+    testing.assert_array_equal(results["sunlit_fraction"][1], 1.0)
+    testing.assert_array_equal(results["shaded_fraction"][1], 0.0)
+    for name in ("sunlit", "shaded"):
+        assert numpy.isfinite(results[name]).all()
+        testing.assert_array_equal(results[name][:, 1], 0.0)